@@ -11,20 +11,24 @@
 #
 ###################################################################################
 
-import requests
-import time
+import argparse
 import csv
-import math
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import os
-from mpl_toolkits.basemap import Basemap
-from geopy.distance import geodesic
-import folium
+from functools import lru_cache
+
+# NumPy and requests are only imported inside the functions that need them, so the CLI's
+# subcommands load just their own dependencies
+from api_keys import API_KEY_FILEPATH, KeyPool, key_share, load_api_keys
+from api_metrics import ApiMetrics, estimate_crawl_cost, print_cost_estimate
+from geocoding_client import geocode_zip_code, geocode_zip_codes
+from gym_records import GymRecordWriter
+from map_rendering import read_gyms, render_map
+from progress_journal import ProgressJournal
+from query_planner import SAMPLE_SIZE, candidate_queries, choose_queries, make_plan, print_plan, query_yields, sample_circles, write_plan
+from response_cache import DEFAULT_CACHE_FILEPATH, ResponseCache
 
 
 # Configuration/Constants
-API_KEY = open('secret.txt', 'r').read()
 SEARCH_QUERY = 'jiu jitsu gym'
 KEYWORDS = ['jiu-jitsu', 'jiu jitsu', 'bjj','mma', 'grappling', 'submission']
 POPULATION_MIN = 140916
@@ -34,189 +38,246 @@ ZIP_CODE_COORDINATES_FILEPATH = 'zip_code_coordinates.json'
 RADIUS_MODIFIER = 2.5
 OVERLAP_THRESHOLD = 0.80
 MAX_RADIUS = 15 * 1609.34 # miles to meters
-
+GEOCODING_QPS = 10 # starting requests per second per key, across all workers; adapts from there
+GEOCODING_MAX_QPS = 50
+GEOCODING_WORKERS = 8
+PLACES_QPS = 10
+PLACES_MAX_QPS = 50
+PLACES_MAX_IN_FLIGHT = 8
+API_ENDPOINTS = ('geocode', 'textsearch')
+KEY_SHARE = None # (index, count) to use only this process's share of the keys in a sharded crawl
+RESPONSE_CACHE_FILEPATH = DEFAULT_CACHE_FILEPATH
+RESPONSE_CACHE_TTL = 30 * 24 * 60 * 60 # seconds
+API_METRICS_FILEPATH = 'api_metrics.json'
+RAW_ARCHIVE_FILEPATH = 'raw_places.jsonl.gz'
+QUERY_PLAN_FILEPATH = 'query_plan.json'
+
+
+# Shared resources are opened on first use, so importing this module stays cheap
+@lru_cache(maxsize=None)
+def response_cache():
+    return ResponseCache(RESPONSE_CACHE_FILEPATH, ttl=RESPONSE_CACHE_TTL)
+
+@lru_cache(maxsize=None)
+def api_metrics():
+    return ApiMetrics()
+
+@lru_cache(maxsize=None)
+def key_pool(endpoint):
+    # One pool per API, since Google limits each API's usage separately
+    keys = load_api_keys(API_KEY_FILEPATH)
+    return KeyPool(key_share(keys, *KEY_SHARE) if KEY_SHARE else keys)
+
+@lru_cache(maxsize=None)
+def zip_index():
+    from zip_index import ZipIndex
+    return ZipIndex.load()
 
 def get_zip_code_bounding_box(zip_code):
-    geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={zip_code}&key={API_KEY}"
-    response = requests.get(geocode_url)
-    results = response.json().get('results')
-    if results:
-        viewport = results[0]['geometry']['viewport']
-        northeast = viewport['northeast']
-        southwest = viewport['southwest']
-        center_lat = results[0]['geometry']['location']['lat']
-        center_lng = results[0]['geometry']['location']['lng']
-        print("Got: " + zip_code)
-        return center_lat, center_lng, northeast, southwest
-    print("No results for zip code:", zip_code)
-    print("response:", response.json().get('status'))
-    return None, None, None, None
+    return geocode_zip_code(zip_code, key_pool('geocode'), cache=response_cache(), metrics=api_metrics())
 
 def calculate_radius(northeast, southwest):
-    # Calculate the center point
-    center_lat = (northeast['lat'] + southwest['lat']) / 2
-    center_lng = (northeast['lng'] + southwest['lng']) / 2
-
-    # Calculate the radius using the Haversine formula
-    R = 6371000  # Earth radius in meters
-
-    lat1 = math.radians(center_lat)
-    lon1 = math.radians(center_lng)
-    lat2 = math.radians(northeast['lat'])
-    lon2 = math.radians(northeast['lng'])
-
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+    """Approximate radius (meters) of a viewport, from its center to the northeast corner."""
+    import geodesy
+    return float(geodesy.radii_from_viewports(northeast['lat'], northeast['lng'],
+                                              southwest['lat'], southwest['lng']))
 
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    radius = R * c
-    return radius
-
-def form_places_query_url(location, radius):
+def form_places_query(keywords=KEYWORDS):
     #unpack keywords
-    keywords = '|'.join(KEYWORDS)
-
-    #form query
-    base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    query = f"jiu+jitsu+gym+({keywords})"
-    url = f"{base_url}?query={query}&location={location}&radius={radius}&key={API_KEY}"
-    return url
-
-# Function to find gyms using the Google Places API
-def find_gyms(location, radius):
-    gyms = []
-
-    # Form the query URL
-    url = form_places_query_url(location, radius)
+    keywords = '|'.join(keywords)
+    return f"jiu jitsu gym ({keywords})"
 
-    while url:
-        response = requests.get(url)
-        data = response.json()
+def query_circle_id(zip_code, query_index):
+    # The first query keeps the plain zip code, so single query output looks as it always has
+    return zip_code if query_index == 0 else f"{zip_code}#{query_index}"
 
-
-        #ToDo: Extract results properly
-
-        gyms.extend(data.get('results', []))
-        
-        # Check for next page token
-        next_page_token = data.get('next_page_token')
-        if next_page_token:
-            url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken={next_page_token}&key={API_KEY}"
-            time.sleep(.75)  # To avoid hitting rate limits
-        else:
-            url = None
-    
-    return gyms
-
-# Function to extract coordinates from the results and write to CSV
-def extract_and_write_coordinates(results, writer):
-    for place in results:
-        name = place.get('name')
-        lat = place['geometry']['location']['lat']
-        lng = place['geometry']['location']['lng']
-        #ToDo: I'd also like to write zipcode, city (any anything else that could be interesting)
-        writer.writerow({'Name': name, 'Latitude': lat, 'Longitude': lng})
-
-# Function to collect gyms for a given coordinate and write results to CSV
-def collect_and_write_gyms(lat_lng, radius, city, writer):
-    location = f"{lat_lng[0]},{lat_lng[1]}"
-    gyms = find_gyms(location, radius)
-    extract_and_write_coordinates(gyms, writer)
-
-def make_google_places_requests(zip_codes_to_coordinates):
-    with open(ORIGINAL_FILEPATH, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=KEYWORDS)
-        
-        writer.writeheader()
-        
-        # Collect gyms data and write to CSV without parallel processing
-        for lat_lng, radius, city in zip_codes_to_coordinates:
-            try:
-                collect_and_write_gyms(lat_lng, radius, city, writer)
-            except Exception as exc:
-                print(f"An error occurred: {exc}")
+def make_google_places_requests(zip_codes_to_coordinates, resume=False, output_filepath=ORIGINAL_FILEPATH, keywords=KEYWORDS,
+                                archive_filepath=None, queries=None):
+    """
+    Search every circle once per query in queries (default: the single packed query for keywords).
+    Returns the crawl stats; circles that failed are counted in stats['errors'] and left for a --resume run.
+    """
+    from places_crawler import crawl_places
+
+    queries = queries or [form_places_query(keywords)]
+    # Rows go to a partial file and finished circles to a journal, so a crash can be resumed
+    journal = ProgressJournal(output_filepath, resume)
+
+    # Crawl many circles at once; a single buffered writer streams finished circles to the CSV in batches
+    stats = {'circles': 0, 'requests': 0, 'errors': 0, 'request_retries': 0, 'elapsed': 0.0, 'qps': 0.0}
+    stopped = False
+    with GymRecordWriter(journal.partial_filepath, journal, archive_filepath) as gym_writer:
+        for query_index, query in enumerate(queries):
+            circles = [(query_circle_id(zip_code, query_index), lat, lng, radius)
+                       for zip_code, ((lat, lng), radius, *_) in zip_codes_to_coordinates.items()
+                       if not journal.is_done(query_circle_id(zip_code, query_index))]
+            if stopped:
+                # Out of quota or the API is down; leave the remaining queries for a --resume run
+                stats['errors'] += len(circles)
+                continue
+            query_stats = crawl_places(circles, key_pool('textsearch'), query, gym_writer.write_circle,
+                                       qps=PLACES_QPS * len(key_pool('textsearch')), max_in_flight=PLACES_MAX_IN_FLIGHT,
+                                       cache=response_cache(), metrics=api_metrics(),
+                                       max_qps=PLACES_MAX_QPS * len(key_pool('textsearch')))
+            for name in ('circles', 'requests', 'errors', 'request_retries', 'elapsed'):
+                stats[name] += query_stats[name]
+            stats['qps'] = query_stats['qps']
+            stopped = query_stats['stopped']
+
+    if stats['errors']:
+        # Leave the partial output and journal in place for a --resume run
+        journal.close()
+        print(f"{stats['errors']} circles failed, rerun with --resume to retry them")
+    else:
+        journal.finalize()
+    print(f"Crawled {stats['circles']} circles with {stats['requests']} requests in {stats['elapsed']:.1f}s, "
+          f"{stats['request_retries']} requests retried, ending at {stats['qps']:.1f} requests/s")
+    return stats
+
+def make_adaptive_google_places_requests(zip_codes_to_coordinates, output_filepath=ORIGINAL_FILEPATH, keywords=KEYWORDS,
+                                         archive_filepath=None, queries=None):
+    """
+    Like make_google_places_requests, but splits circles whose results hit the 60 result cap.
+    Returns {'errors': circles that failed}; with any, the output is left as a .partial file for a rerun,
+    which gets the circles already searched from the response cache.
+    """
+    from adaptive_search import adaptive_search, crawl_round
+
+    results = {}
+    errors = 0
+    for query_index, query in enumerate(queries or [form_places_query(keywords)]):
+        circles = [(query_circle_id(zip_code, query_index), lat, lng, radius)
+                   for zip_code, ((lat, lng), radius, *_) in zip_codes_to_coordinates.items()]
+        search_round = crawl_round(key_pool('textsearch'), query,
+                                   qps=PLACES_QPS * len(key_pool('textsearch')), max_in_flight=PLACES_MAX_IN_FLIGHT,
+                                   cache=response_cache(), metrics=api_metrics(),
+                                   max_qps=PLACES_MAX_QPS * len(key_pool('textsearch')))
+        query_results, stats = adaptive_search(circles, search_round)
+        results.update(query_results)
+        errors += len(stats['failed'])
+        print(f"Adaptive search for {query!r}: {stats['searched']} circles searched, {stats['saturated']} split, "
+              f"{stats['skipped']} skipped, {stats['truncated']} still saturated at the minimum radius, "
+              f"{len(stats['failed'])} failed")
+
+    partial_filepath = output_filepath + '.partial'
+    if os.path.exists(partial_filepath):
+        os.remove(partial_filepath)
+    with GymRecordWriter(partial_filepath, archive_filepath=archive_filepath) as gym_writer:
+        for circle_id in sorted(results):
+            gym_writer.write_circle(circle_id, results[circle_id])
+    if errors:
+        print(f"{errors} circles failed, leaving {partial_filepath} unfinished; rerun to retry them")
+    else:
+        os.replace(partial_filepath, output_filepath)
+    return {'errors': errors}
+
+def plan_queries(zip_codes_to_coordinates, keywords=KEYWORDS, sample_size=SAMPLE_SIZE, output_filepath=QUERY_PLAN_FILEPATH):
+    """
+    Search a sample of circles with each candidate query, pick the queries worth their calls and save the plan.
+    Returns the plan.
+    """
+    from adaptive_search import crawl_round
+
+    circles = sample_circles([(zip_code, lat, lng, radius) for zip_code, ((lat, lng), radius, *_)
+                              in zip_codes_to_coordinates.items()], sample_size)
+    results = {}
+    for query in candidate_queries(form_places_query(keywords), keywords):
+        results[query] = crawl_round(key_pool('textsearch'), query,
+                                     qps=PLACES_QPS * len(key_pool('textsearch')), max_in_flight=PLACES_MAX_IN_FLIGHT,
+                                     cache=response_cache(), metrics=api_metrics(),
+                                     max_qps=PLACES_MAX_QPS * len(key_pool('textsearch')))(circles)
+
+    yields = query_yields(results)
+    plan = make_plan(yields, choose_queries(yields), len(circles), keywords)
+    print_plan(plan)
+    write_plan(plan, output_filepath)
+    return plan
+
+def print_key_pools():
+    # Only the pools this run actually used
+    for endpoint in API_ENDPOINTS:
+        if endpoint in api_metrics().calls:
+            print(f"API keys for {endpoint}:")
+            key_pool(endpoint).print_report()
 
 def get_city_name_to_zip_codes():
-    city_name_to_zip_codes = {}
-    with open('uscities.csv', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Filter us cities list for only cities with populations greater than 50,000
-            if int(row['population']) < POPULATION_MIN and int(row['population']) > 50000: #should go til around Murray, UT ~#946
-                zip_codes = row['zips'].split(' ')
-                if row['city'] not in city_name_to_zip_codes:
-                    city_name_to_zip_codes[row['city']] = zip_codes
-                else:
-                    city_name_to_zip_codes[row['city']].extend(zip_codes)
-    return city_name_to_zip_codes
+    # Filter us cities list for only cities with populations greater than 50,000
+    return zip_index().city_name_to_zip_codes(min_population=50001, max_population=POPULATION_MIN) #should go til around Murray, UT ~#946
 
 def visualize_coordinates_and_radiuses(city_name_to_zip_codes_coordinates, filename):
-    # Create a folium map centered on the US
-    m = folium.Map(location=[37.0902, -95.7129], zoom_start=4)
-
-    # Extract coordinates and radii for each city
-    for zip_code in city_name_to_zip_codes_coordinates:
-        (center_lat, center_lng), radius, city = city_name_to_zip_codes_coordinates[zip_code]
-
-        # Add a circle to the map
-        folium.Circle(
-            location=(center_lat, center_lng),
-            radius=radius,
-            color='blue',
-            fill=True,
-            fill_opacity=0.3,
-            popup=f"{city} ({zip_code})"
-        ).add_to(m)
-
-    # Save the map to an HTML file
-    m.save(filename)
-
-def get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes):
+    # All circles go into one canvas layer, so the map stays small and quick to open
+    render_map(city_name_to_zip_codes_coordinates, filename, title=os.path.splitext(os.path.basename(filename))[0])
+
+def get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes, resume=False, output_filepath=ZIP_CODE_COORDINATES_FILEPATH):
+    """
+    Geocode every zip and write them to output_filepath. Returns (zip_codes_to_coordinates, number of failed zips).
+    Zips the API has no results for are skipped. Failed zips leave the output unfinalized for a resume run.
+    """
+    from offline_geocoder import OfflineGeocoder
+
+    # Rows go to a partial file and finished zips to a journal, so a crash can be resumed
+    journal = ProgressJournal(output_filepath, resume)
+    city_name_to_zip_codes = {city: [zip_code for zip_code in zip_codes if not journal.is_done(zip_code)]
+                              for city, zip_codes in city_name_to_zip_codes.items()}
+
+    # Serve what we can from the local zip table; only the misses cost a Geocoding API call
+    all_zip_codes = [zip_code for zip_codes in city_name_to_zip_codes.values() for zip_code in zip_codes]
+    offline_geocoder = OfflineGeocoder(zip_index())
+    offline_results = {zip_code: offline_geocoder.geocode(zip_code) for zip_code in all_zip_codes}
+    api_zip_codes = [zip_code for zip_code in all_zip_codes if offline_results.get(zip_code) is None]
+    print(f"Geocoded {len(all_zip_codes) - len(api_zip_codes)} zip codes offline, {len(api_zip_codes)} left for the API")
+
+    # Geocode the rest concurrently; results come back in the same city/zip order
+    results = geocode_zip_codes(api_zip_codes, key_pool('geocode'), qps=GEOCODING_QPS * len(key_pool('geocode')),
+                                max_workers=GEOCODING_WORKERS, cache=response_cache(), metrics=api_metrics(),
+                                max_qps=GEOCODING_MAX_QPS * len(key_pool('geocode')))
+
+    zip_codes_to_coordinates = {} # zip_code_name -> [(lat, lng), radius, city]
+    failed = 0
     for city in city_name_to_zip_codes:
-        zip_codes_to_coordinates = {} # zip_code_name -> [(lat, lng), radius, city]
+        city_zip_codes_to_coordinates = {}
+        no_results = [] # zips the API has no answer for; done, but nothing to write
         for zip_code in city_name_to_zip_codes[city]:
-            center_lat, center_lng, northeast, southwest = get_zip_code_bounding_box(zip_code)
+            if offline_results.get(zip_code):
+                center_lat, center_lng, radius = offline_results[zip_code]
+                city_zip_codes_to_coordinates[zip_code] = [(center_lat, center_lng), radius, city]
+                continue
+
+            _, result = next(results)
+            if result is None:
+                failed += 1
+                print(f"Failed to get zip code info for {city}: {zip_code}")
+                continue
+            center_lat, center_lng, northeast, southwest = result
             if northeast and southwest:
                 # Calculate an approximate radius based on viewport object
                 radius = calculate_radius(northeast, southwest)
-                zip_codes_to_coordinates[zip_code] = [(center_lat, center_lng), radius, city]
+                city_zip_codes_to_coordinates[zip_code] = [(center_lat, center_lng), radius, city]
             else:
-                print(f"Failed to get zip code info for {city}: {zip_code}")
-            time.sleep(.75) # To avoid hitting rate limits
-
-        # after each city, write to the document
-        write_zip_code_coordinates(zip_codes_to_coordinates)
-    return zip_codes_to_coordinates
-
-def remove_duplicates():
-    seen = set()
-    unique_entries = []
-
-    # Read the original file and collect unique entries
-    with open(ORIGINAL_FILEPATH, 'r', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Create a unique identifier for each entry (e.g., a tuple of name, latitude, and longitude)
-            identifier = (row['Zip_Code'], row['Latitude'], row['Longitude'])
-            if identifier not in seen:
-                seen.add(identifier)
-                unique_entries.append(row)
-
-    # Write the unique entries to the deduplicated file
-    with open(DEDUP_FILEPATH, 'w', newline='') as csvfile:
-        fieldnames = ['Zip_Code', 'Latitude', 'Longitude']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for entry in unique_entries:
-            writer.writerow(entry)
-
-def write_zip_code_coordinates(zip_codes_to_coordinates):
-    file_exists = os.path.isfile(ZIP_CODE_COORDINATES_FILEPATH)
-
-    with open(ZIP_CODE_COORDINATES_FILEPATH, 'a', newline='') as csvfile:
+                no_results.append(zip_code)
+
+        # after each city, write to the document. Failed zips stay unjournaled and are retried on resume
+        write_zip_code_coordinates(city_zip_codes_to_coordinates, journal.partial_filepath)
+        journal.record(list(city_zip_codes_to_coordinates) + no_results)
+        zip_codes_to_coordinates.update(city_zip_codes_to_coordinates)
+
+    if failed:
+        # Leave the partial output and journal in place for a --resume run
+        journal.close()
+        print(f"{failed} zip codes failed, rerun with --resume to retry them")
+    else:
+        journal.finalize()
+    return zip_codes_to_coordinates, failed
+
+def remove_duplicates(input_filepath=ORIGINAL_FILEPATH, output_filepath=DEDUP_FILEPATH):
+    # Streaming place_id dedup plus a fuzzy pass for the same gym under slightly different names
+    from deduplicate_gyms import deduplicate
+    deduplicate(input_filepath, output_filepath)
+
+def write_zip_code_coordinates(zip_codes_to_coordinates, filepath=ZIP_CODE_COORDINATES_FILEPATH):
+    file_exists = os.path.isfile(filepath) and os.path.getsize(filepath) > 0
+
+    with open(filepath, 'a', newline='') as csvfile:
         fieldnames = ['Zip_Code', 'Latitude', 'Longitude', 'Radius', 'City']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         
@@ -249,67 +310,38 @@ def radius_modifier(zip_codes_to_coordinates):
     return zip_codes_to_coordinates
 
 def calculate_distance(coord1, coord2):
-    """Calculate the distance between two coordinates (latitude, longitude)."""
-    lat1, lng1 = coord1
-    lat2, lng2 = coord2
-    # Haversine formula to calculate the distance between two points on the Earth
-    R = 6371  # Radius of the Earth in kilometers
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
+    """Calculate the distance between two coordinates (latitude, longitude), in kilometers."""
+    import geodesy
+    (lat1, lng1), (lat2, lng2) = coord1, coord2
+    return float(geodesy.haversine_distance(lat1, lng1, lat2, lng2, radius=geodesy.EARTH_RADIUS_KILOMETERS))
 
 def calculate_overlap_area(r1, r2, d):
     """Calculate the area of overlap between two circles with radii r1 and r2 and distance d between centers."""
-    if d >= r1 + r2:
-        return 0  # No overlap
-    if d <= abs(r1 - r2):
-        return math.pi * min(r1, r2) ** 2  # One circle is completely inside the other
-
-    r1_sq = r1 ** 2
-    r2_sq = r2 ** 2
-    d_sq = d ** 2
-
-    part1 = r1_sq * math.acos((d_sq + r1_sq - r2_sq) / (2 * d * r1))
-    part2 = r2_sq * math.acos((d_sq + r2_sq - r1_sq) / (2 * d * r2))
-    part3 = 0.5 * math.sqrt((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2))
-
-    return part1 + part2 - part3
+    import geodesy
+    return float(geodesy.overlap_areas(r1, r2, d))
 
-def remove_redundant_circles(zip_codes_to_coordinates):
+def remove_redundant_circles(zip_codes_to_coordinates, overlap_threshold=OVERLAP_THRESHOLD):
     """
-    Remove circles overlap by OVERLAP_THRESHOLD amount. (remove the smaller of the two circles)
+    Remove circles whose area is at least overlap_threshold covered by the union of the other circles.
+    Smaller circles are considered first, each against the circles still kept.
 
     zip_codes_to_coordinates is a dictionary. zip_code -> (lat,lng), radius, city
     """
-    num_removed = 0
-    num_kept = 0
-    filtered_coordinates = {}
+    from coverage import remove_covered_circles
 
     zip_codes_list = list(zip_codes_to_coordinates.items())
+    circles = [(lat, lng, radius) for _, ((lat, lng), radius, *_) in zip_codes_list]
+    lats, lngs, radii = zip(*circles) if circles else ((), (), ())
 
-    for i, (zip_code1, ((lat1, lng1), radius1, city1)) in enumerate(zip_codes_list):
-        is_redundant = False
-        for j, (zip_code2, ((lat2, lng2), radius2, city2)) in enumerate(zip_codes_list):
-            if i != j:
-                distance_meters = calculate_distance((lat1, lng1), (lat2, lng2)) * 1000  # Convert to meters
-                # Check if circle1 is fully enveloped by circle2
-                if distance_meters + radius1 <= radius2:
-                    is_redundant = True
-                    break
-        if not is_redundant:
-            filtered_coordinates[zip_code1] = [(lat1, lng1), radius1, city1]
-            num_kept += 1
-        else:
-            num_removed += 1
+    kept, area_before, area_after, cell_size = remove_covered_circles(lats, lngs, radii, overlap_threshold)
+    filtered_coordinates = {zip_code: entry for (zip_code, entry), keep in zip(zip_codes_list, kept) if keep}
 
-    print("Number of redundant circles removed: ", num_removed)
-    print("Number of circles kept: ", num_kept)
+    print("Number of redundant circles removed: ", len(zip_codes_list) - len(filtered_coordinates))
+    print("Number of circles kept: ", len(filtered_coordinates))
+    print(f"Area covered: {area_before / 1e6:.0f} km^2 before, {area_after / 1e6:.0f} km^2 after ({cell_size:.0f} m grid)")
     return filtered_coordinates
 
-    
+
 
 def remove_excessive_circles(zip_codes_to_coordinates):
     """Remove circles that have a radius greater than MAX_RADIUS."""
@@ -329,58 +361,82 @@ def remove_excessive_circles(zip_codes_to_coordinates):
 
 #############################################################################################
 
-
-#if not os.path.exists(ZIP_CODE_COORDINATES_FILEPATH):
-print("Zip coordinates file not found, retrieving zip code coordinates. Press enter to continue")
-input()
-
-# Gather list of coordinates 
-city_name_to_zip_codes = get_city_name_to_zip_codes()
-print('Number of Cities: ', len(city_name_to_zip_codes))
-print('Number of Zip Codes: ', sum([len(zip_codes) for zip_codes in city_name_to_zip_codes.values()]))
-
-# Retrive coordinates and viewport object via google reverse geocoding api, calculate radii
-zip_codes_to_coordinates = get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes)
-
-city_name_to_zip_codes = None # Deallocate memory where possible
-print("Completed retrieving zip code coordinates")
-
-
-print("Zip coordinates file exists. Next up, vizualization.")
-
-# Reading in zip code coordinates and radiuses
-zip_codes_to_coordinates = read_zip_code_coordinates()
-
-# Modify radii size
-zip_codes_to_coordinates = radius_modifier(zip_codes_to_coordinates)
-visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_radius_modification.html")
-
-# Remove circles with excessively large radius
-zip_codes_to_coordinates = remove_excessive_circles(zip_codes_to_coordinates)
-visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_excessive_circle_removal.html")
-
-
-# remove redundant circles
-zip_codes_to_coordinates = remove_redundant_circles(zip_codes_to_coordinates)
-visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_redundant_circle_removal.html")
-
-
-
-
-
-
-
-print("Next up, google places api. Press Enter to continue...")
-input() 
-
-# Search each zip code coordinates + radius pair using google places api with keywords
-make_google_places_requests(zip_codes_to_coordinates)
-print("Data collection complete. Results saved to jiu_jitsu_gyms.csv")
-
-
-# Make new file with duplicates removed
-remove_duplicates()
-print("Duplicates removed. Results saved to jiu_jitsu_gyms_dedup.csv")
-
-
-
+def main(args):
+    def confirm(message):
+        print(message)
+        if not args.yes:
+            input()
+
+    #if not os.path.exists(ZIP_CODE_COORDINATES_FILEPATH):
+    confirm("Zip coordinates file not found, retrieving zip code coordinates. Press enter to continue")
+
+    # Gather list of coordinates 
+    city_name_to_zip_codes = get_city_name_to_zip_codes()
+    print('Number of Cities: ', len(city_name_to_zip_codes))
+    print('Number of Zip Codes: ', sum([len(zip_codes) for zip_codes in city_name_to_zip_codes.values()]))
+
+    # Retrive coordinates and viewport object via google reverse geocoding api, calculate radii
+    zip_codes_to_coordinates, failed = get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes, resume=args.resume)
+    if failed:
+        # The output is not finalized, and reading it would pick up an earlier run's file
+        print("Stopping until every zip code is geocoded; rerun with --resume")
+        return
+
+    city_name_to_zip_codes = None # Deallocate memory where possible
+    print("Completed retrieving zip code coordinates")
+
+
+    print("Zip coordinates file exists. Next up, vizualization.")
+
+    # Reading in zip code coordinates and radiuses
+    zip_codes_to_coordinates = read_zip_code_coordinates()
+
+    # Modify radii size
+    zip_codes_to_coordinates = radius_modifier(zip_codes_to_coordinates)
+    if args.maps:
+        visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_radius_modification.html")
+
+    # Remove circles with excessively large radius
+    zip_codes_to_coordinates = remove_excessive_circles(zip_codes_to_coordinates)
+    if args.maps:
+        visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_excessive_circle_removal.html")
+
+    # remove redundant circles
+    zip_codes_to_coordinates = remove_redundant_circles(zip_codes_to_coordinates)
+    visualize_coordinates_and_radiuses(zip_codes_to_coordinates, "map_after_redundant_circle_removal.html")
+
+    if args.dry_run:
+        print_cost_estimate(estimate_crawl_cost(zip_codes_to_coordinates, form_places_query(), response_cache()))
+        return
+
+    confirm("Next up, google places api. Press Enter to continue...")
+
+    # Search each zip code coordinates + radius pair using google places api with keywords
+    archive_filepath = RAW_ARCHIVE_FILEPATH if args.archive else None
+    if args.adaptive:
+        make_adaptive_google_places_requests(zip_codes_to_coordinates, archive_filepath=archive_filepath)
+    else:
+        make_google_places_requests(zip_codes_to_coordinates, resume=args.resume, archive_filepath=archive_filepath)
+    print("Data collection complete. Results saved to jiu_jitsu_gyms.csv")
+
+
+    # Make new file with duplicates removed
+    remove_duplicates()
+    print("Duplicates removed. Results saved to jiu_jitsu_gyms_dedup.csv")
+    if args.maps:
+        render_map(zip_codes_to_coordinates, "map_of_gyms.html", gyms=read_gyms(DEDUP_FILEPATH), title='Gyms')
+    print("API response cache:", response_cache().stats())
+    api_metrics().print_report()
+    print_key_pools()
+    api_metrics().save(API_METRICS_FILEPATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Jiu Jitsu Gym Finder')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run, skipping finished zips and circles')
+    parser.add_argument('--adaptive', action='store_true', help='split circles whose searches come back saturated')
+    parser.add_argument('--maps', action='store_true', help='also draw the intermediate diagnostic maps and a gym map')
+    parser.add_argument('--archive', action='store_true', help=f"also keep every raw Places response in {RAW_ARCHIVE_FILEPATH}")
+    parser.add_argument('--dry-run', action='store_true', help='estimate the Places calls and cost instead of crawling')
+    parser.add_argument('--yes', action='store_true', help="don't stop for confirmation before the paid API stages")
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+"""
+Adaptive quadtree search for Places text search.
+
+One text search returns at most 60 results, so a circle that comes back with 60 is
+saturated and probably missed gyms. Saturated circles are split into four child
+circles, one per quadrant, and searched again, down to MIN_RADIUS. A circle that
+lies entirely inside an earlier search that was not saturated is skipped, since
+that search already returned everything in it.
+
+Searching happens in rounds (the input circles, then their children, and so on).
+Each round is handed to search_round as one batch so it can be crawled concurrently,
+and all skip/split decisions are made between rounds, so the outcome does not
+depend on the order results arrive in. A circle whose search failed is neither
+complete nor split; it is returned in stats['failed'] so the run can be retried.
+"""
+import math
+
+import geodesy
+from places_crawler import crawl_places
+from spatial_index import CircleGridIndex
+
+MAX_RESULTS = 60 # text search cap: 3 pages of 20
+MIN_RADIUS = 500 # meters
+METERS_PER_DEGREE = 111320
+
+
+def split_circle(circle_id, lat, lng, radius):
+    """Four child circles, one per quadrant, that together cover the parent."""
+    offset = radius / 2
+    dlat = offset / METERS_PER_DEGREE
+    dlng = offset / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    child_radius = radius / math.sqrt(2)
+    return [(f"{circle_id}.{k}", lat + sign_lat * dlat, lng + sign_lng * dlng, child_radius)
+            for k, (sign_lat, sign_lng) in enumerate([(1, 1), (1, -1), (-1, 1), (-1, -1)])]
+
+
+def is_covered(lat, lng, radius, complete_index):
+    """True if the circle lies inside one of the complete (unsaturated) searches in complete_index."""
+    for j in complete_index.query(lat, lng):
+        lat2, lng2, radius2 = complete_index.circles[j]
+        if radius2 >= radius and geodesy.haversine_distance(lat, lng, lat2, lng2) + radius <= radius2:
+            return True
+    return False
+
+
+def adaptive_search(circles, search_round, min_radius=MIN_RADIUS, max_results=MAX_RESULTS):
+    """
+    Search circles, splitting saturated ones until every result set is complete or min_radius is hit.
+
+    circles is a list of (circle_id, lat, lng, radius). search_round(circles) returns {circle_id: gyms},
+    leaving out the circles whose search failed.
+    Returns ({circle_id: gyms} for every circle searched, stats); stats['failed'] lists the circles that failed.
+    """
+    results = {}
+    complete = []
+    stats = {'searched': 0, 'saturated': 0, 'skipped': 0, 'truncated': 0, 'rounds': 0, 'failed': []}
+
+    pending = list(circles)
+    while pending:
+        if complete:
+            complete_index = CircleGridIndex(complete)
+            to_search = []
+            for circle in pending:
+                if is_covered(circle[1], circle[2], circle[3], complete_index):
+                    stats['skipped'] += 1
+                else:
+                    to_search.append(circle)
+        else:
+            to_search = pending
+
+        round_results = search_round(to_search)
+        stats['rounds'] += 1
+        stats['searched'] += len(to_search)
+
+        pending = []
+        for circle_id, lat, lng, radius in to_search:
+            gyms = round_results.get(circle_id)
+            if gyms is None:
+                # Not an empty search: it covers nothing and its area stays unsearched until a rerun
+                stats['failed'].append((circle_id, lat, lng, radius))
+                continue
+            results[circle_id] = gyms
+            if len(gyms) < max_results:
+                complete.append((lat, lng, radius))
+            elif radius / math.sqrt(2) < min_radius:
+                stats['truncated'] += 1
+            else:
+                stats['saturated'] += 1
+                pending.extend(split_circle(circle_id, lat, lng, radius))
+    return results, stats
+
+
+def crawl_round(api_key, query, **crawl_kwargs):
+    """A search_round for adaptive_search that crawls each round with places_crawler.crawl_places."""
+    def search_round(circles):
+        round_results = {}
+        crawl_places(circles, api_key, query, round_results.__setitem__, **crawl_kwargs)
+        return round_results
+    return search_round
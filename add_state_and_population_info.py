@@ -3,7 +3,7 @@ Adds state and population info to zip code coordinates.
 
 Input: data/initial_coordinates.csv
     - Zip_Code,Latitude,Longitude,Radius,City
-Output: data/inital_coordinates2.csv
+Output: data/inital_coordinates2.csv (+ initial_coordinates2.cols columnar table)
     - Zip_Code,Latitude,Longitude,Radius,City,State,Population
 
 
@@ -11,14 +11,16 @@ Output: data/inital_coordinates2.csv
 
 """
 import csv 
-import os
+
+from columnar_store import COORDINATES_SCHEMA, coordinates_to_columns, table_path, write_table
+from zip_index import ZipIndex
 
 INITIAL_COORDINATES_FILEPATH = 'data/initial_coordinates.csv'
 INITIAL_COORDINATES_FILEPATH2 = 'data/initial_coordinates2.csv'
 
-def read_zip_code_coordinates():
+def read_zip_code_coordinates(filepath=INITIAL_COORDINATES_FILEPATH):
     city_name_to_zip_codes_coordinates = {}
-    with open(INITIAL_COORDINATES_FILEPATH, 'r', newline='') as csvfile:
+    with open(filepath, 'r', newline='') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             zip_code = row['Zip_Code']
@@ -29,57 +31,45 @@ def read_zip_code_coordinates():
             city_name_to_zip_codes_coordinates[zip_code] = [(lat, lng), radius, city]
     return city_name_to_zip_codes_coordinates
 
-def write_zip_code_coordinates(zip_codes_to_coordinates):
-    file_exists = os.path.isfile(INITIAL_COORDINATES_FILEPATH2)
-
-    with open(INITIAL_COORDINATES_FILEPATH2, 'a', newline='') as csvfile:
+def write_zip_code_coordinates(zip_codes_to_coordinates, filepath=INITIAL_COORDINATES_FILEPATH2):
+    # Overwrite rather than append, so a rerun replaces the previous result instead of duplicating it
+    with open(filepath, 'w', newline='') as csvfile:
         fieldnames = ['Zip_Code', 'Latitude', 'Longitude', 'Radius', 'City', 'State', 'Population']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader()
+        writer.writeheader()
 
         for zip_code in zip_codes_to_coordinates:
-            (lat, lng), radius, city, state, population = zip_codes_to_coordinates[zip_code]
+            # Zips missing from uszips.csv have no state/population entries
+            (lat, lng), radius, city, state, population = (zip_codes_to_coordinates[zip_code] + ['', ''])[:5]
             writer.writerow({'Zip_Code': zip_code, 'Latitude': lat, 'Longitude': lng,
-                              'Radius': radius, 'City': city, 'State': '', 'Population': ''})
+                              'Radius': radius, 'City': city, 'State': state, 'Population': population})
 
-def add_state_info(zip_codes_to_coordinates):
-    zip_to_state = {}
+    # Typed copy for the next stage to load as arrays
+    write_table(table_path(filepath), coordinates_to_columns(zip_codes_to_coordinates), COORDINATES_SCHEMA, source=filepath)
 
-    # Read the uszips.csv file and create a mapping of zip code to state name
-    with open('data/uszips.csv', 'r', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            zip_code = row['zip']
-            state_name = row['state_name']
-            zip_to_state[zip_code] = state_name
+def add_state_info(zip_codes_to_coordinates, zip_index):
+    # Look every zip up in the shared zip index at once
+    zip_codes = list(zip_codes_to_coordinates)
+    rows = zip_index.lookup(zip_codes)
 
     # Add state information to the zip_codes_to_coordinates dictionary
-    for zip_code in zip_codes_to_coordinates:
-        if zip_code in zip_to_state:
-            state_name = zip_to_state[zip_code]
+    for zip_code, row in zip(zip_codes, rows):
+        if row >= 0:
+            state_name = zip_index.state(row)
             (lat, lng), radius, city = zip_codes_to_coordinates[zip_code]
             zip_codes_to_coordinates[zip_code] = [(lat, lng), radius, city, state_name]
 
     return zip_codes_to_coordinates
     
 
-def add_population_info(zip_codes_to_coordinates):
-    zip_to_population = {}
-
-    # Read the uszips.csv file and create a mapping of zip code to population
-    with open('data/uszips.csv', 'r', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            zip_code = row['zip']
-            population = row['population']
-            zip_to_population[zip_code] = population
+def add_population_info(zip_codes_to_coordinates, zip_index):
+    zip_codes = list(zip_codes_to_coordinates)
+    rows = zip_index.lookup(zip_codes)
 
     # Add population information to the zip_codes_to_coordinates dictionary
-    for zip_code in zip_codes_to_coordinates:
-        if zip_code in zip_to_population:
-            population = zip_to_population[zip_code]
+    for zip_code, row in zip(zip_codes, rows):
+        if row >= 0:
+            population = int(zip_index.populations[row])
             (lat, lng), radius, city, state = zip_codes_to_coordinates[zip_code]
             zip_codes_to_coordinates[zip_code] = [(lat, lng), radius, city, state, population]
 
@@ -87,14 +77,20 @@ def add_population_info(zip_codes_to_coordinates):
 
 ###########################################################################################
 
-zip_codes_to_coordinates = read_zip_code_coordinates()
+def main():
+    zip_codes_to_coordinates = read_zip_code_coordinates()
+    zip_index = ZipIndex.load()
+
+
+    # Add State into to entries
+    zip_codes_to_coordinates = add_state_info(zip_codes_to_coordinates, zip_index)
 
+    # Add population info to entries
+    zip_codes_to_coordinates = add_population_info(zip_codes_to_coordinates, zip_index)
 
-# Add State into to entries
-zip_codes_to_coordinates = add_state_info(zip_codes_to_coordinates)
+    # Write to file
+    write_zip_code_coordinates(zip_codes_to_coordinates)
 
-# Add population info to entries
-zip_codes_to_coordinates = add_population_info(zip_codes_to_coordinates)
 
-# Write to file
-write_zip_code_coordinates(zip_codes_to_coordinates)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Google API key loading and the key pool.
+
+Keys are read on first use rather than at import, so modules that talk to the API
+can be imported (and their offline parts used) without a secret.txt present.
+secret.txt holds one key per line; a single key works as before.
+
+KeyPool spreads requests over all the keys. Each key tracks the requests made
+with it against an optional per-run quota, and can have its own rate limit. A lone
+quota error only fails its request. A key that gets COOLDOWN_AFTER of them in a row
+rests for a cooldown that doubles with every further error in a row, and is then
+held to 90% of the rate it had reached when the error came back. A key the API
+denies is retired. Clients raise KeyQuotaError on a quota
+response so the unit of work is retried on another key rather than lost, and get
+QuotaExhausted once no usable key is left.
+"""
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from rate_limiter import TokenBucket
+
+API_KEY_FILEPATH = 'secret.txt'
+COOLDOWN = 10.0 # seconds a key rests once it is over its limit
+COOLDOWN_AFTER = 2 # quota errors in a row that put a key in cooldown
+MAX_COOLDOWN = 15 * 60
+LIMIT_BACKOFF = 0.9 # share of the observed rate a key is held to after a quota error
+MAX_QUOTA_RETRIES = 20 # quota errors one unit of work may hit before it is given up on
+QUOTA_STATUSES = ('OVER_QUERY_LIMIT', 'OVER_DAILY_LIMIT')
+DENIED_STATUSES = ('REQUEST_DENIED',)
+
+
+class KeyQuotaError(RuntimeError):
+    """A response said the key hit a rate limit or quota; the request can be retried on another key."""
+
+
+class QuotaExhausted(RuntimeError):
+    """Every key in the pool is out of quota or has been denied."""
+
+
+@lru_cache(maxsize=None)
+def load_api_keys(filepath=API_KEY_FILEPATH):
+    """All keys in filepath, one per line, skipping blank lines and # comments."""
+    with open(filepath, 'r') as key_file:
+        keys = tuple(line.strip() for line in key_file if line.strip() and not line.strip().startswith('#'))
+    if not keys:
+        raise ValueError(f"No API keys in {filepath}")
+    return keys
+
+
+def load_api_key(filepath=API_KEY_FILEPATH):
+    return load_api_keys(filepath)[0]
+
+
+def key_share(keys, index, count):
+    """
+    The keys process index of count should use, so parallel processes don't share keys: every count-th key
+    from index on, or a single key in turn when there are fewer keys than processes.
+    """
+    return keys[index::count] or (keys[index % len(keys)],)
+
+
+class ApiKey:
+    def __init__(self, key, quota=None, qps=None):
+        self.key = key
+        self.quota = quota
+        self.bucket = TokenBucket(qps) if qps else None
+        self.used = 0
+        self.quota_errors = 0
+        self.errors_in_a_row = 0
+        self.cooldown_until = 0.0
+        self.denied = False
+        self.recent = deque() # times of the requests booked in the last second
+        self.observed_limit = None # requests in the second before the last quota error
+
+    def usable(self):
+        return not self.denied and (self.quota is None or self.used < self.quota)
+
+    def label(self):
+        """The key with all but its last 4 characters hidden, for printing."""
+        return '...' + self.key[-4:]
+
+
+class KeyPool:
+    def __init__(self, keys, quota=None, qps=None, cooldown=COOLDOWN):
+        """
+        keys is a list of API key strings. quota caps the requests made with each key in this run,
+        qps rate limits each key on its own (None for neither).
+        """
+        self.keys = {key: ApiKey(key, quota, qps) for key in keys}
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def reserve(self, key=None):
+        """
+        Book one request and return (key, delay): the caller waits delay seconds, then sends it with key.
+        Picks the least used key that is not cooling down, or only key when given (to page through a search
+        on the key that started it). Raises QuotaExhausted when no usable key is left, or KeyQuotaError
+        when the given key is no longer usable but others are.
+        """
+        with self.lock:
+            now = time.monotonic()
+            candidates = [api_key for api_key in self.keys.values() if api_key.usable()]
+            if not candidates:
+                raise QuotaExhausted('No API key with quota left')
+            if key:
+                if self.keys[key] not in candidates:
+                    raise KeyQuotaError(f"API key {self.keys[key].label()} is out of quota")
+                candidates = [self.keys[key]]
+            api_key = min(candidates, key=lambda api_key: (max(api_key.cooldown_until - now, 0), api_key.used))
+            api_key.used += 1
+            delay = max(api_key.cooldown_until - now, 0)
+            if api_key.bucket:
+                # The bucket is paused for any cooldown, so this also spaces out requests waiting on one
+                delay = max(delay, api_key.bucket.reserve())
+            api_key.recent.append(now + delay)
+            while api_key.recent and api_key.recent[0] < now - 1:
+                api_key.recent.popleft()
+            return api_key.key, delay
+
+    def record(self, key, status):
+        """Update key's state from the status of a response sent with it."""
+        with self.lock:
+            api_key = self.keys[key]
+            now = time.monotonic()
+            if status in QUOTA_STATUSES:
+                api_key.quota_errors += 1
+                if api_key.cooldown_until > now:
+                    return # sent before the cooldown began; it says nothing new about the key
+                api_key.errors_in_a_row += 1
+                if api_key.errors_in_a_row < COOLDOWN_AFTER:
+                    return
+                api_key.observed_limit = sum(1 for booked in api_key.recent if now - 1 <= booked <= now)
+                rate = max(1.0, api_key.observed_limit * LIMIT_BACKOFF)
+                if api_key.bucket is None:
+                    api_key.bucket = TokenBucket(rate)
+                api_key.bucket.rate = min(api_key.bucket.rate, rate)
+                cooldown = min(self.cooldown * 2 ** (api_key.errors_in_a_row - COOLDOWN_AFTER), MAX_COOLDOWN)
+                api_key.cooldown_until = now + cooldown
+                api_key.bucket.pause(cooldown)
+                print(f"API key {api_key.label()} got {status}, cooling down for {cooldown:.0f}s")
+            elif status in DENIED_STATUSES:
+                if not api_key.denied:
+                    print(f"API key {api_key.label()} was denied, no longer using it")
+                api_key.denied = True
+            else:
+                api_key.errors_in_a_row = 0
+
+    def report(self):
+        with self.lock:
+            now = time.monotonic()
+            return {api_key.label(): {
+                'used': api_key.used,
+                'quota': api_key.quota,
+                'quota_errors': api_key.quota_errors,
+                'observed_limit': api_key.observed_limit,
+                'cooling_down': max(api_key.cooldown_until - now, 0),
+                'denied': api_key.denied,
+            } for api_key in self.keys.values()}
+
+    def print_report(self):
+        for label, state in self.report().items():
+            quota = f" of {state['quota']}" if state['quota'] is not None else ''
+            limit = f", limited at {state['observed_limit']} requests/s" if state['observed_limit'] is not None else ''
+            denied = ', denied' if state['denied'] else ''
+            print(f"  key {label}: {state['used']}{quota} requests, {state['quota_errors']} quota errors{limit}{denied}")
+
+
+def as_key_pool(api_key):
+    """api_key as a KeyPool: a pool is returned as is, a single key string becomes a pool of one."""
+    return api_key if isinstance(api_key, KeyPool) else KeyPool([api_key])
@@ -0,0 +1,181 @@
+"""
+Instrumentation and cost accounting for Google API calls.
+
+Every outbound Geocoding and Places request goes through instrumented_get(), which
+sends it on the shared http_client session, times it and records its status,
+result count and response size in an ApiMetrics. The
+crawlers also record cache hits and pages per circle. At the end of a run,
+print_report() shows call counts, status counts, a latency histogram and the
+dollar cost. save() keeps the same report as JSON next to the data.
+
+estimate_crawl_cost() sizes a crawl before any money is spent. Circles already in
+the response cache cost nothing. For the rest, the estimate lies between one page
+per circle and the 3 page maximum. The expected value uses the page counts seen
+for the cached circles, or one page per circle when nothing is cached yet.
+"""
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0] # seconds, upper bounds; one more bucket past the last
+PRICES = {'geocode': 0.005, 'textsearch': 0.032} # dollars per request
+MONTHLY_CREDIT = 200.0 # dollars of free Maps Platform usage per month
+PAGE_SIZE = 20
+MAX_PAGES = 3
+
+
+class ApiMetrics:
+    """Thread-safe counters for one run. Endpoints are named like the cache keys: 'geocode', 'textsearch'."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.cache_hits = Counter()
+        self.latency_histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.latency_totals = Counter()
+        self.wire_bytes = Counter()
+        self.body_bytes = Counter()
+        self.results_per_page = defaultdict(Counter)
+        self.pages_per_circle = defaultdict(Counter)
+
+    def record_call(self, endpoint, latency, status, num_results, wire_bytes=0, body_bytes=0):
+        with self.lock:
+            self._record_latency(endpoint, latency)
+            self.wire_bytes[endpoint] += wire_bytes
+            self.body_bytes[endpoint] += body_bytes
+            self.calls[endpoint] += 1
+            self.statuses[endpoint][status] += 1
+            self.results_per_page[endpoint][num_results] += 1
+
+    def record_error(self, endpoint, latency):
+        """A request that raised (connection error, bad JSON). Google may still have billed it."""
+        with self.lock:
+            self._record_latency(endpoint, latency)
+            self.calls[endpoint] += 1
+            self.errors[endpoint] += 1
+
+    def _record_latency(self, endpoint, latency):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))
+        self.latency_histograms[endpoint][bucket] += 1
+        self.latency_totals[endpoint] += latency
+
+    def record_cache_hit(self, endpoint):
+        with self.lock:
+            self.cache_hits[endpoint] += 1
+
+    def record_pages(self, endpoint, pages):
+        with self.lock:
+            self.pages_per_circle[endpoint][pages] += 1
+
+    def cost(self):
+        return sum(PRICES.get(endpoint, 0.0) * calls for endpoint, calls in self.calls.items())
+
+    def report(self):
+        with self.lock:
+            endpoints = sorted(set(self.calls) | set(self.cache_hits))
+            return {
+                'cost': round(self.cost(), 2),
+                'endpoints': {endpoint: {
+                    'calls': self.calls[endpoint],
+                    'cache_hits': self.cache_hits[endpoint],
+                    'errors': self.errors[endpoint],
+                    'statuses': dict(self.statuses[endpoint]),
+                    'cost': round(PRICES.get(endpoint, 0.0) * self.calls[endpoint], 2),
+                    'wire_bytes': self.wire_bytes[endpoint],
+                    'body_bytes': self.body_bytes[endpoint],
+                    'mean_latency': self.latency_totals[endpoint] / self.calls[endpoint] if self.calls[endpoint] else None,
+                    'latency_histogram': dict(zip(latency_bucket_labels(), self.latency_histograms[endpoint])),
+                    'results_per_page': dict(sorted(self.results_per_page[endpoint].items())),
+                    'pages_per_circle': dict(sorted(self.pages_per_circle[endpoint].items())),
+                } for endpoint in endpoints},
+            }
+
+    def print_report(self):
+        report = self.report()
+        print("API calls:")
+        for endpoint, metrics in report['endpoints'].items():
+            print(f"  {endpoint}: {metrics['calls']} calls (${metrics['cost']:.2f}), {metrics['cache_hits']} cache hits, "
+                  f"{metrics['errors']} errors, statuses {metrics['statuses']}")
+            if metrics['calls']:
+                print(f"    latency: mean {metrics['mean_latency']:.3f}s, histogram {metrics['latency_histogram']}")
+                print(f"    received {metrics['wire_bytes'] / 1e6:.2f} MB ({metrics['body_bytes'] / 1e6:.2f} MB decoded)")
+            if metrics['pages_per_circle']:
+                print(f"    pages per circle: {metrics['pages_per_circle']}")
+        print(f"  total cost: ${report['cost']:.2f} of the ${MONTHLY_CREDIT:.0f} monthly credit")
+
+    def save(self, filepath):
+        with open(filepath, 'w') as metrics_file:
+            json.dump(self.report(), metrics_file, indent=2)
+
+
+def latency_bucket_labels():
+    return [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+
+
+def instrumented_get(url, params=None, endpoint='', metrics=None, **kwargs):
+    """http_client.get_json(url, params) data, timed and recorded in metrics under endpoint."""
+    # requests is only loaded once a run actually calls an API
+    from http_client import get_json
+
+    start = time.perf_counter()
+    try:
+        data, wire_bytes, body_bytes = get_json(url, params, **kwargs)
+    except Exception:
+        if metrics:
+            metrics.record_error(endpoint, time.perf_counter() - start)
+        raise
+    if metrics:
+        metrics.record_call(endpoint, time.perf_counter() - start, data.get('status', 'UNKNOWN'),
+                            len(data.get('results', [])), wire_bytes, body_bytes)
+    return data
+
+
+def pages_for(num_results):
+    """Text Search pages needed to return num_results results (always at least one request)."""
+    return min(MAX_PAGES, max(1, math.ceil(num_results / PAGE_SIZE)))
+
+
+def cached_pages(zip_codes_to_coordinates, query, cache=None):
+    """zip_code -> the pages its cached search took, or None for circles not in the cache."""
+    pages = {}
+    for zip_code, ((lat, lng), radius, *_) in zip_codes_to_coordinates.items():
+        gyms = cache.peek('textsearch', {'query': query, 'location': f"{lat},{lng}", 'radius': radius}) if cache else None
+        pages[zip_code] = None if gyms is None else pages_for(len(gyms))
+    return pages
+
+
+def mean_pages(pages):
+    """Mean of the known page counts in a cached_pages() dict, or one page when none are known."""
+    known = [count for count in pages.values() if count is not None]
+    return sum(known) / len(known) if known else 1.0
+
+
+def estimate_crawl_cost(zip_codes_to_coordinates, query, cache=None):
+    """
+    Estimated Text Search requests and dollars to crawl every circle, without making any calls.
+    Returns a dict with circle counts and low/expected/high request and cost figures.
+    """
+    pages = cached_pages(zip_codes_to_coordinates, query, cache)
+    num_uncached = sum(1 for count in pages.values() if count is None)
+    expected_pages = mean_pages(pages)
+    requests_estimate = {'low': num_uncached, 'expected': round(num_uncached * expected_pages),
+                         'high': num_uncached * MAX_PAGES}
+    return {
+        'circles': len(zip_codes_to_coordinates),
+        'cached_circles': len(pages) - num_uncached,
+        'expected_pages_per_circle': expected_pages,
+        'requests': requests_estimate,
+        'cost': {name: round(count * PRICES['textsearch'], 2) for name, count in requests_estimate.items()},
+    }
+
+
+def print_cost_estimate(estimate):
+    requests_estimate, cost = estimate['requests'], estimate['cost']
+    print(f"Dry run: {estimate['circles']} circles, {estimate['cached_circles']} already cached")
+    print(f"  requests: {requests_estimate['low']} to {requests_estimate['high']}, expected {requests_estimate['expected']} "
+          f"({estimate['expected_pages_per_circle']:.2f} pages per circle)")
+    print(f"  cost: ${cost['low']:.2f} to ${cost['high']:.2f}, expected ${cost['expected']:.2f} "
+          f"of the ${MONTHLY_CREDIT:.0f} monthly credit")
@@ -0,0 +1,177 @@
+"""
+Timed benchmarks for the pipeline's heavy stages, on synthetic data and a local mock API.
+
+    python benchmark.py                     # 1k/10k/50k, compared against benchmark_baseline.json
+    python benchmark.py --sizes 1000 --save # record a new baseline
+
+Each benchmark runs at every size and reports its best wall time over --repeat runs.
+Results are compared against the baseline file, and anything slower than the baseline
+by more than --tolerance is flagged as a regression (exit status 1). Baselines are
+machine specific, so record one before comparing on a new machine.
+
+The crawl benchmark runs against mock_google_api.py with latency and error injection,
+on one circle for every CRAWL_CIRCLES_PER_ZIP zips, so it exercises paging and the
+rate limiter without taking hours.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic_data
+
+BASELINE_FILEPATH = 'benchmark_baseline.json'
+SIZES = [1000, 10000, 50000]
+TOLERANCE = 1.25 # slower than baseline by more than this factor is a regression
+CRAWL_CIRCLES_PER_ZIP = 20
+CRAWL_LATENCY = 0.01 # seconds per mock response
+CRAWL_ERROR_RATE = 0.02
+CRAWL_QPS = 1000
+
+
+def bench_remove_redundant_circles(size, workdir):
+    from adjust_search_area import remove_redundant_circles
+    from columnar_store import coordinates_to_columns
+
+    columns = coordinates_to_columns(synthetic_data.make_zip_circles(size))
+    return lambda: remove_redundant_circles(columns)
+
+
+def bench_remove_duplicates(size, workdir):
+    from deduplicate_gyms import deduplicate
+
+    input_filepath = os.path.join(workdir, 'gyms.csv')
+    synthetic_data.write_gym_csv(input_filepath, synthetic_data.make_gym_rows(size))
+    return lambda: deduplicate(input_filepath, os.path.join(workdir, 'dedup_gyms.csv'))
+
+
+def bench_visualize(size, workdir):
+    from adjust_search_area import visualize_coordinates_and_radiuses
+    from columnar_store import coordinates_to_columns
+
+    columns = coordinates_to_columns(synthetic_data.make_zip_circles(size))
+    return lambda: visualize_coordinates_and_radiuses(columns, os.path.join(workdir, 'map.html'))
+
+
+def bench_enrichment(size, workdir):
+    """Build the zip index from the reference tables, then add state and population to every zip."""
+    from add_state_and_population_info import add_population_info, add_state_info
+    from zip_index import ZipIndex
+
+    zip_codes_to_coordinates = synthetic_data.make_zip_circles(size)
+    zip_table, city_table = os.path.join(workdir, 'uszips.csv'), os.path.join(workdir, 'uscities.csv')
+    synthetic_data.write_zip_tables(zip_codes_to_coordinates, zip_table, city_table)
+    initial = {zip_code: entry[:3] for zip_code, entry in zip_codes_to_coordinates.items()}
+
+    def run():
+        index = ZipIndex.build(zip_table, city_table)
+        entries = {zip_code: list(entry) for zip_code, entry in initial.items()}
+        add_population_info(add_state_info(entries, index), index)
+    return run
+
+
+def bench_crawl(size, workdir):
+    """End-to-end crawl of the circles against the mock API, through the cacheless async crawler."""
+    from mock_google_api import TEXT_SEARCH_PATH, start_mock_server
+    from places_crawler import crawl_places
+
+    circles = [(zip_code, lat, lng, radius) for zip_code, ((lat, lng), radius, *_)
+               in list(synthetic_data.make_zip_circles(size).items())[::CRAWL_CIRCLES_PER_ZIP]]
+    gyms = synthetic_data.make_places_gyms(size)
+
+    def run():
+        server, base_url = start_mock_server(gyms=gyms, latency=CRAWL_LATENCY, error_rate=CRAWL_ERROR_RATE)
+        try:
+            crawl_places(circles, 'benchmark-key', 'jiu jitsu gym', lambda circle_id, gyms: None, qps=CRAWL_QPS,
+                         max_in_flight=16, base_url=base_url + TEXT_SEARCH_PATH, page_token_delay=0.05)
+        finally:
+            server.shutdown()
+            server.server_close()
+    return run
+
+
+BENCHMARKS = {
+    'remove_redundant_circles': bench_remove_redundant_circles,
+    'remove_duplicates': bench_remove_duplicates,
+    'visualize_coordinates_and_radiuses': bench_visualize,
+    'enrichment': bench_enrichment,
+    'crawl': bench_crawl,
+}
+
+
+def time_benchmark(setup, size, repeat):
+    """Best wall time of repeat runs. Setup (data generation) is not timed, nor is the stages' printing."""
+    with tempfile.TemporaryDirectory() as workdir:
+        run = setup(size, workdir)
+        timings = []
+        for _ in range(repeat):
+            stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+            try:
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+        return min(timings)
+
+
+def run_benchmarks(names, sizes, repeat=1):
+    results = {}
+    for name in names:
+        for size in sizes:
+            key = f"{name}@{size}"
+            results[key] = time_benchmark(BENCHMARKS[name], size, repeat)
+            print(f"{key}: {results[key]:.3f}s")
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print each result against the baseline. Returns the keys that regressed."""
+    regressions = []
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        ratio = seconds / baseline[key] if baseline[key] else float('inf')
+        flag = ''
+        if ratio > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print(f"{key}: {seconds:.3f}s vs {baseline[key]:.3f}s baseline ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_FILEPATH)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.sizes, args.repeat)
+
+    if args.save:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                       'results': results}, baseline_file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+        return 0
+    with open(args.baseline, 'r') as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Command line entry point for the pipeline stages.
+
+Each stage is a subcommand and runs without prompts, so the pipeline can be
+scripted end to end:
+
+    python cli.py geocode --resume
+    python cli.py enrich
+    python cli.py plan [--set-cover] [--maps]
+    python cli.py queries [--sample 50]     # pick the text search queries worth their calls
+    python cli.py crawl [--adaptive] [--resume] [--dry-run] [--archive] [--keys secret.txt] [--query-plan [FILE]]
+    python cli.py shard 8 [--crawl]         # split the crawl into geohash regions
+    python cli.py crawl-shards [--shard 3]  # crawl the unfinished shards in parallel processes
+    python cli.py merge                     # combine the shard outputs, deduplicated
+    python cli.py dedup
+    python cli.py count
+    python cli.py run [--set MAX_RADIUS=20000] [--until adjust]   # only the out-of-date stages
+    python cli.py render data/finalized_coordinates.csv visualizations/finalized.html [--gyms data/dedup_jiu_jitsu_gyms.csv]
+
+Stage modules are imported inside the handlers, so `--help` and the cheap stages
+don't pay for NumPy or requests until they are actually needed.
+"""
+import argparse
+import json
+import os
+import sys
+
+INITIAL_COORDINATES_FILEPATH = 'data/initial_coordinates.csv'
+FINALIZED_COORDINATES_FILEPATH = 'data/finalized_coordinates.csv'
+ORIGINAL_FILEPATH = 'data/jiu_jitsu_gyms.csv'
+DEDUP_FILEPATH = 'data/dedup_jiu_jitsu_gyms.csv'
+POPULATION_MIN = 50000
+API_METRICS_FILEPATH = 'data/api_metrics.json'
+RAW_ARCHIVE_FILEPATH = 'data/raw_places.jsonl.gz'
+SHARD_DIR = 'data/shards'
+QUERY_PLAN_FILEPATH = 'data/query_plan.json'
+
+
+def geocode(args):
+    import GymFinder
+
+    city_name_to_zip_codes = GymFinder.zip_index().city_name_to_zip_codes(min_population=args.population_min)
+    print('Number of Cities: ', len(city_name_to_zip_codes))
+    print('Number of Zip Codes: ', sum([len(zip_codes) for zip_codes in city_name_to_zip_codes.values()]))
+    _, failed = GymFinder.get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes, resume=args.resume,
+                                                                 output_filepath=args.output)
+    GymFinder.api_metrics().print_report()
+    GymFinder.print_key_pools()
+    GymFinder.api_metrics().save(API_METRICS_FILEPATH)
+    return 1 if failed else None
+
+
+def enrich(args):
+    import add_state_and_population_info
+    add_state_and_population_info.main()
+
+
+def plan(args):
+    if args.set_cover:
+        import plan_search_area
+        plan_search_area.main()
+    else:
+        import adjust_search_area
+        adjust_search_area.main(maps=args.maps)
+
+
+def queries(args):
+    import GymFinder
+    from columnar_store import read_coordinates
+
+    GymFinder.plan_queries(read_coordinates(args.input), sample_size=args.sample, output_filepath=args.output)
+    GymFinder.api_metrics().print_report()
+    GymFinder.api_metrics().save(API_METRICS_FILEPATH)
+
+
+def crawl(args):
+    import GymFinder
+    from columnar_store import read_coordinates
+
+    GymFinder.API_KEY_FILEPATH = args.keys
+    GymFinder.KEY_SHARE = args.key_share
+    zip_codes_to_coordinates = read_coordinates(args.input)
+    search_queries = [GymFinder.form_places_query()]
+    if args.query_plan:
+        from query_planner import read_plan_queries
+        search_queries = read_plan_queries(args.query_plan, GymFinder.KEYWORDS)
+        print(f"Using the queries planned in {args.query_plan}: {search_queries}")
+    if args.dry_run:
+        from api_metrics import estimate_crawl_cost, print_cost_estimate
+        for query in search_queries:
+            print(f"Query {query!r}:")
+            print_cost_estimate(estimate_crawl_cost(zip_codes_to_coordinates, query, GymFinder.response_cache()))
+        return
+
+    print(f"Crawling {len(zip_codes_to_coordinates)} circles from {args.input}")
+    archive_filepath = RAW_ARCHIVE_FILEPATH if args.archive else None
+    if args.adaptive:
+        errors = GymFinder.make_adaptive_google_places_requests(zip_codes_to_coordinates, output_filepath=args.output,
+                                                                archive_filepath=archive_filepath, queries=search_queries)['errors']
+    else:
+        errors = GymFinder.make_google_places_requests(zip_codes_to_coordinates, resume=args.resume, output_filepath=args.output,
+                                                       archive_filepath=archive_filepath, queries=search_queries)['errors']
+    print("API response cache:", GymFinder.response_cache().stats())
+    GymFinder.api_metrics().print_report()
+    GymFinder.print_key_pools()
+    GymFinder.api_metrics().save(args.metrics)
+    return 1 if errors else None
+
+
+def shard(args):
+    import GymFinder
+    import sharding
+    from columnar_store import read_coordinates
+
+    zip_codes_to_coordinates = read_coordinates(args.input)
+    weights = sharding.circle_weights(zip_codes_to_coordinates, GymFinder.form_places_query(), GymFinder.response_cache())
+    manifest = sharding.write_shards(zip_codes_to_coordinates, args.shards, args.shard_dir, weights)
+    print(f"Split {len(zip_codes_to_coordinates)} circles into {len(manifest['shards'])} shards in {args.shard_dir}")
+    sharding.print_manifest(manifest)
+    if args.crawl:
+        return crawl_shards(args)
+
+
+def crawl_shards(args):
+    import sharding
+
+    failed = sharding.run_shards(args.shard_dir, args.shard)
+    return 1 if failed else None
+
+
+def merge(args):
+    import sharding
+
+    input_filepaths = args.inputs or [entry['output_filepath'] for entry in sharding.read_manifest(args.shard_dir)['shards']]
+    sharding.merge_shards(input_filepaths, args.output, args.dedup_output)
+
+
+def dedup(args):
+    from deduplicate_gyms import deduplicate
+    deduplicate(args.input, args.output)
+
+
+def count(args):
+    import count_gyms_by_city
+    import count_gyms_by_zip_code
+
+    count_gyms_by_zip_code.main(args.input, args.by_zip_code)
+    count_gyms_by_city.main(args.input, args.by_city)
+
+
+def render(args):
+    from columnar_store import read_coordinates
+    from map_rendering import read_gyms, render_map
+
+    gyms = read_gyms(args.gyms) if args.gyms else ()
+    render_map(read_coordinates(args.input), args.output, gyms=gyms)
+
+
+def parse_share(share):
+    """INDEX/COUNT, as an (index, count) tuple."""
+    index, _, count = share.partition('/')
+    return int(index), int(count)
+
+
+def parse_parameter(assignment):
+    """NAME=VALUE, with VALUE read as JSON when it parses (numbers, lists) and as a string otherwise."""
+    name, _, value = assignment.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def run(args):
+    import pipeline
+    pipeline.run(dict(args.set), until=args.until, force=args.force)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Jiu Jitsu Gym Finder pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparser = subparsers.add_parser('geocode', help='zip code centers and radii for every large enough city')
+    subparser.add_argument('--population-min', type=int, default=POPULATION_MIN)
+    subparser.add_argument('--output', default=INITIAL_COORDINATES_FILEPATH)
+    subparser.add_argument('--resume', action='store_true', help='skip zips an interrupted run already finished')
+    subparser.set_defaults(handler=geocode)
+
+    subparser = subparsers.add_parser('enrich', help='add state and population to the geocoded zips')
+    subparser.set_defaults(handler=enrich)
+
+    subparser = subparsers.add_parser('plan', help='pick the circles to search')
+    subparser.add_argument('--set-cover', action='store_true', help='use the greedy set cover planner')
+    subparser.add_argument('--maps', action='store_true', help='also draw the intermediate diagnostic maps')
+    subparser.set_defaults(handler=plan)
+
+    subparser = subparsers.add_parser('queries', help='measure candidate queries on a sample of circles and plan the crawl\'s queries')
+    subparser.add_argument('--input', default=FINALIZED_COORDINATES_FILEPATH)
+    subparser.add_argument('--output', default=QUERY_PLAN_FILEPATH)
+    subparser.add_argument('--sample', type=int, default=50, help='circles to search with every candidate query')
+    subparser.set_defaults(handler=queries)
+
+    subparser = subparsers.add_parser('crawl', help='search every circle with the Places API')
+    subparser.add_argument('--input', default=FINALIZED_COORDINATES_FILEPATH)
+    subparser.add_argument('--output', default=ORIGINAL_FILEPATH)
+    subparser.add_argument('--resume', action='store_true', help='skip circles an interrupted run already finished')
+    subparser.add_argument('--adaptive', action='store_true', help='split circles whose searches come back saturated')
+    subparser.add_argument('--dry-run', action='store_true', help='estimate the calls and cost without making any')
+    subparser.add_argument('--archive', action='store_true', help=f"also keep every raw Places response in {RAW_ARCHIVE_FILEPATH}")
+    subparser.add_argument('--keys', default='secret.txt', help='file with the API keys to use, one per line')
+    subparser.add_argument('--key-share', type=parse_share, metavar='INDEX/COUNT',
+                           help='use only this share of the keys, for parallel crawls on one machine')
+    subparser.add_argument('--metrics', default=API_METRICS_FILEPATH, help='where to save the API call report')
+    subparser.add_argument('--query-plan', metavar='FILE', nargs='?', const=QUERY_PLAN_FILEPATH,
+                           help=f"search with the queries planned by `queries` (default file: {QUERY_PLAN_FILEPATH})")
+    subparser.set_defaults(handler=crawl)
+
+    subparser = subparsers.add_parser('shard', help='split the circles into geohash regions of about equal expected requests')
+    subparser.add_argument('shards', type=int)
+    subparser.add_argument('--input', default=FINALIZED_COORDINATES_FILEPATH)
+    subparser.add_argument('--shard-dir', default=SHARD_DIR)
+    subparser.add_argument('--crawl', action='store_true', help='then crawl every shard in parallel processes')
+    subparser.set_defaults(handler=shard, shard=None)
+
+    subparser = subparsers.add_parser('crawl-shards', help='crawl shards in parallel processes, resuming unfinished ones')
+    subparser.add_argument('--shard-dir', default=SHARD_DIR)
+    subparser.add_argument('--shard', type=int, action='append', help='only this shard (default: every unfinished shard)')
+    subparser.set_defaults(handler=crawl_shards)
+
+    subparser = subparsers.add_parser('merge', help='combine shard outputs into one deduplicated gym dataset')
+    subparser.add_argument('inputs', nargs='*', help='shard gym CSVs (default: every shard in the manifest)')
+    subparser.add_argument('--shard-dir', default=SHARD_DIR)
+    subparser.add_argument('--output', default=ORIGINAL_FILEPATH)
+    subparser.add_argument('--dedup-output', default=DEDUP_FILEPATH)
+    subparser.set_defaults(handler=merge)
+
+    subparser = subparsers.add_parser('dedup', help='remove duplicate gyms from the crawl output')
+    subparser.add_argument('--input', default=ORIGINAL_FILEPATH)
+    subparser.add_argument('--output', default=DEDUP_FILEPATH)
+    subparser.set_defaults(handler=dedup)
+
+    subparser = subparsers.add_parser('count', help='count gyms by zip code and city')
+    subparser.add_argument('--input', default=DEDUP_FILEPATH)
+    subparser.add_argument('--by-zip-code', default='data/gyms_by_zip_code.csv')
+    subparser.add_argument('--by-city', default='data/gyms_by_city.csv')
+    subparser.set_defaults(handler=count)
+
+    subparser = subparsers.add_parser('run', help='run the stages whose inputs or parameters changed since the last run')
+    subparser.add_argument('--set', type=parse_parameter, action='append', default=[], metavar='NAME=VALUE',
+                           help='override POPULATION_MIN, RADIUS_MODIFIER, MAX_RADIUS, KEYWORDS or USE_QUERY_PLAN')
+    subparser.add_argument('--until', choices=['geocode', 'enrich', 'adjust', 'crawl', 'dedup', 'count'], help='stop after this stage')
+    subparser.add_argument('--force', action='append', default=[], metavar='STAGE', help='rerun this stage regardless')
+    subparser.set_defaults(handler=run)
+
+    subparser = subparsers.add_parser('render', help='draw a coordinates file as an html map')
+    subparser.add_argument('input')
+    subparser.add_argument('output')
+    subparser.add_argument('--gyms', help='gym CSV to draw as clustered markers')
+    subparser.set_defaults(handler=render)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
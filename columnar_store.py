@@ -0,0 +1,192 @@
+"""
+Typed columnar tables for passing data between pipeline stages.
+
+A table is a directory holding one .npy file per column plus schema.json, which
+lists the columns in order with their NumPy dtypes. Columns can be read whole or
+memory-mapped, so a stage gets ready-to-use arrays without parsing every field of
+every row the way csv.DictReader + float() does. export_csv() writes the same data
+as a plain CSV for the article workflow.
+
+A table written next to a stage CSV records the CSV's sha256 in schema.json. Readers
+only use the table while the CSV still has that hash, so a hand-edited or
+regenerated CSV is read instead of a stale table.
+
+    write_table('data/finalized_coordinates.cols', columns, COORDINATES_SCHEMA)
+    columns = read_table('data/finalized_coordinates.cols')   # {'Latitude': array([...]), ...}
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+SCHEMA_FILENAME = 'schema.json'
+COORDINATES_SCHEMA = {
+    'Zip_Code': 'U5',
+    'Latitude': 'f8',
+    'Longitude': 'f8',
+    'Radius': 'f8',
+    'City': 'U',
+    'State': 'U',
+    'Population': 'f8',
+}
+
+
+def table_path(csv_filepath):
+    """The columnar table that sits next to a stage's CSV output."""
+    return os.path.splitext(csv_filepath)[0] + '.cols'
+
+
+def file_sha256(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_table(path, columns, schema, source=None):
+    """
+    Write columns (name -> sequence) as a table, replacing any table already at path.
+    String dtypes given as bare 'U' are sized to the longest value.
+    source is the CSV holding the same data; its hash is recorded so a later change to it is noticed.
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    stored_schema = {}
+    for name, dtype in schema.items():
+        values = np.asarray(columns[name], dtype=None if dtype == 'U' else dtype)
+        if dtype == 'U':
+            values = values.astype(str)
+        np.save(os.path.join(tmp_path, name + '.npy'), values, allow_pickle=False)
+        stored_schema[name] = values.dtype.str
+    metadata = {'columns': stored_schema}
+    if source:
+        metadata['source_sha256'] = file_sha256(source)
+    with open(os.path.join(tmp_path, SCHEMA_FILENAME), 'w') as schema_file:
+        json.dump(metadata, schema_file, indent=2)
+
+    # Swap the finished table into place so readers never see a half-written one
+    old_path = path + '.old'
+    if os.path.isdir(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def read_metadata(path):
+    with open(os.path.join(path, SCHEMA_FILENAME), 'r') as schema_file:
+        return json.load(schema_file)
+
+
+def read_schema(path):
+    return read_metadata(path)['columns']
+
+
+def is_fresh(csv_filepath):
+    """Whether the table next to csv_filepath exists and was written from the CSV as it is now."""
+    path = table_path(csv_filepath)
+    if not os.path.isdir(path):
+        return False
+    if not os.path.isfile(csv_filepath):
+        return True
+    return read_metadata(path).get('source_sha256') == file_sha256(csv_filepath)
+
+
+def read_table(path, columns=None, mmap=True):
+    """Read a table as name -> array. Only the named columns are loaded if columns is given."""
+    schema = read_schema(path)
+    mmap_mode = 'r' if mmap else None
+    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in (columns or schema)}
+
+
+def columns_from_csv(csv_filepath, schema):
+    """Parse a stage CSV into schema's columns as arrays. Missing or empty numeric fields become NaN."""
+    with open(csv_filepath, 'r', newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    columns = {}
+    for name, dtype in schema.items():
+        values = [row.get(name) or '' for row in rows]
+        if np.dtype(dtype).kind == 'f':
+            columns[name] = np.array([float(value) if value != '' else np.nan for value in values], dtype=dtype)
+        else:
+            columns[name] = np.array(values, dtype=str)
+    return columns
+
+
+def table_from_csv(csv_filepath, path, schema):
+    """Convert a stage CSV into a table."""
+    write_table(path, columns_from_csv(csv_filepath, schema), schema, source=csv_filepath)
+
+
+def read_columns(csv_filepath, schema):
+    """A stage's output as name -> array, from its table while that is fresh and from the CSV otherwise."""
+    if is_fresh(csv_filepath):
+        return read_table(table_path(csv_filepath), mmap=False)
+    if os.path.isdir(table_path(csv_filepath)):
+        print(f"{csv_filepath} changed since its columnar table was written, reading the CSV")
+    return columns_from_csv(csv_filepath, schema)
+
+
+def select(columns, rows):
+    """The given rows (a boolean mask or indices) of every column."""
+    return {name: values[rows] for name, values in columns.items()}
+
+
+def export_csv(path, csv_filepath):
+    """Write a table as CSV, with NaN written as an empty field like the stage CSVs do."""
+    columns = read_table(path)
+    names = list(columns)
+    values = [['' if value != value else value for value in columns[name].tolist()] for name in names]
+    with open(csv_filepath, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(names)
+        writer.writerows(zip(*values))
+
+
+def coordinates_to_columns(zip_codes_to_coordinates):
+    """zip_code -> [(lat, lng), radius, city, state, population] dictionary to COORDINATES_SCHEMA columns as arrays."""
+    entries = list(zip_codes_to_coordinates.items())
+    return {
+        'Zip_Code': np.array([zip_code for zip_code, _ in entries], dtype=str),
+        'Latitude': np.array([lat for _, ((lat, _), *_) in entries], dtype='f8'),
+        'Longitude': np.array([lng for _, ((_, lng), *_) in entries], dtype='f8'),
+        'Radius': np.array([entry[1] for _, entry in entries], dtype='f8'),
+        'City': np.array([entry[2] for _, entry in entries], dtype=str),
+        'State': np.array([entry[3] if len(entry) > 3 else '' for _, entry in entries], dtype=str),
+        'Population': np.array([entry[4] if len(entry) > 4 and entry[4] != '' else np.nan for _, entry in entries],
+                               dtype='f8'),
+    }
+
+
+def columns_to_coordinates(columns):
+    """Inverse of coordinates_to_columns, for stages still working on the dictionary form."""
+    return {zip_code: [(lat, lng), radius, city, state, population]
+            for zip_code, lat, lng, radius, city, state, population in zip(
+                columns['Zip_Code'].tolist(), columns['Latitude'].tolist(), columns['Longitude'].tolist(),
+                columns['Radius'].tolist(), columns['City'].tolist(), columns['State'].tolist(),
+                columns['Population'].tolist())}
+
+
+def read_coordinates(csv_filepath):
+    """
+    A stage's coordinates as the zip_code -> [(lat, lng), radius, city, state, population] dictionary,
+    for the per-circle stages (crawl, rendering). Array stages use read_columns.
+    """
+    return columns_to_coordinates(read_columns(csv_filepath, COORDINATES_SCHEMA))
+
+
+def write_coordinates(columns, csv_filepath):
+    """Write COORDINATES_SCHEMA columns as a stage CSV plus its columnar table."""
+    names = list(COORDINATES_SCHEMA)
+    values = [['' if value != value else value for value in np.asarray(columns[name]).tolist()] for name in names]
+    with open(csv_filepath, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(names)
+        writer.writerows(zip(*values))
+    write_table(table_path(csv_filepath), columns, COORDINATES_SCHEMA, source=csv_filepath)
@@ -0,0 +1,61 @@
+"""
+Counts gyms per city-state pair.
+
+Each gym is assigned to its nearest zip centroid (see count_gyms_by_zip_code.py) and
+from there to the zip's city and state. Counts are one bincount over integer
+(city, state) keys. Population comes from uscities.csv where the city is listed
+there, and otherwise from the sum of its zips' populations.
+
+Input: data/dedup_jiu_jitsu_gyms.csv
+    - Place_Id,Name,Latitude,Longitude
+Output: data/gyms_by_city.csv
+    - city,state,population,num_gyms,gyms_per_100k
+"""
+import numpy as np
+
+from count_gyms_by_zip_code import DEDUP_FILEPATH, assign_gyms_to_zip_codes, per_100k, read_gym_coordinates, write_table
+from zip_index import ZipIndex
+
+GYMS_BY_CITY_FILEPATH = 'data/gyms_by_city.csv'
+
+
+def city_keys(city_codes, state_codes, zip_index):
+    return city_codes.astype(np.int64) * len(zip_index.state_names) + state_codes
+
+
+def count_gyms_by_city(gym_rows, zip_index):
+    """(city codes, state codes, populations, num_gyms) for every city-state pair in the zip table."""
+    zip_keys = city_keys(zip_index.city_codes, zip_index.state_codes, zip_index)
+    keys, zip_groups = np.unique(zip_keys, return_inverse=True)
+
+    num_gyms = np.bincount(zip_groups[gym_rows[gym_rows >= 0]], minlength=len(keys))
+    populations = np.bincount(zip_groups, weights=zip_index.populations, minlength=len(keys))
+
+    # Prefer the city's own population figure from uscities.csv
+    table_keys = city_keys(zip_index.city_table_names, zip_index.city_table_states, zip_index)
+    if len(keys):
+        positions = np.minimum(np.searchsorted(keys, table_keys), len(keys) - 1)
+        listed = keys[positions] == table_keys
+        populations[positions[listed]] = zip_index.city_table_populations[listed]
+
+    return keys // len(zip_index.state_names), keys % len(zip_index.state_names), populations, num_gyms
+
+
+def main(input_filepath=DEDUP_FILEPATH, output_filepath=GYMS_BY_CITY_FILEPATH):
+    zip_index = ZipIndex.load()
+    lats, lngs = read_gym_coordinates(input_filepath)
+    gym_rows = assign_gyms_to_zip_codes(lats, lngs, zip_index)
+    city_codes, state_codes, populations, num_gyms = count_gyms_by_city(gym_rows, zip_index)
+
+    # Cities with the most gyms first, ties broken by population
+    order = np.lexsort((-populations, -num_gyms))
+    write_table(output_filepath, ['city', 'state', 'population', 'num_gyms', 'gyms_per_100k'],
+                [zip_index.city_names[city_codes[order]], zip_index.state_names[state_codes[order]],
+                 populations[order].astype(np.int64), num_gyms[order], per_100k(num_gyms, populations)[order]])
+
+    print("Number of gyms: ", len(gym_rows))
+    print("Number of cities with gyms: ", int(np.count_nonzero(num_gyms)))
+
+
+if __name__ == '__main__':
+    main()
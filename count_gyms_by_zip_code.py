@@ -0,0 +1,80 @@
+"""
+Counts gyms per zip code.
+
+Gym rows carry no zip, so each gym is assigned to the nearest zip centroid in
+uszips.csv (through ZipIndex and a PointGridIndex over the centroids) and counted
+with one bincount. No reverse geocoding calls are made.
+
+Input: data/dedup_jiu_jitsu_gyms.csv
+    - Place_Id,Name,Latitude,Longitude
+Output: data/gyms_by_zip_code.csv
+    - zip_code,population,num_gyms,gyms_per_100k
+"""
+import csv
+
+import numpy as np
+
+from spatial_index import PointGridIndex
+from zip_index import ZipIndex
+
+DEDUP_FILEPATH = 'data/dedup_jiu_jitsu_gyms.csv'
+GYMS_BY_ZIP_CODE_FILEPATH = 'data/gyms_by_zip_code.csv'
+MAX_ZIP_DISTANCE = 50000 # meters; gyms further than this from every centroid are left out (bad coordinates, outside the US)
+
+
+def read_gym_coordinates(filepath=DEDUP_FILEPATH):
+    """Latitude and longitude arrays of every gym in a gym CSV."""
+    with open(filepath, 'r', newline='') as csvfile:
+        coordinates = [(row['Latitude'], row['Longitude']) for row in csv.DictReader(csvfile)]
+    coordinates = np.array(coordinates, dtype=np.float64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def assign_gyms_to_zip_codes(lats, lngs, zip_index, max_distance=MAX_ZIP_DISTANCE):
+    """Zip index row of the nearest zip centroid to each gym, -1 where none is within max_distance."""
+    rows, distances = PointGridIndex(zip_index.lats, zip_index.lngs).nearest(lats, lngs)
+    rows[distances > max_distance] = -1
+    return rows
+
+
+def per_100k(num_gyms, populations):
+    """Gyms per 100k residents, NaN where the population is unknown."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(populations > 0, num_gyms / populations * 100000, np.nan)
+
+
+def write_table(filepath, fieldnames, columns):
+    """Write columns as a CSV, rounding the rates and leaving NaN empty."""
+    with open(filepath, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        for row in zip(*[column.tolist() for column in columns]):
+            writer.writerow(['' if value != value else round(value, 3) if isinstance(value, float) else value
+                             for value in row])
+
+
+def count_gyms_by_zip_code(gym_rows, zip_index):
+    """num_gyms for every zip index row."""
+    return np.bincount(gym_rows[gym_rows >= 0], minlength=len(zip_index))
+
+
+def main(input_filepath=DEDUP_FILEPATH, output_filepath=GYMS_BY_ZIP_CODE_FILEPATH):
+    zip_index = ZipIndex.load()
+    lats, lngs = read_gym_coordinates(input_filepath)
+    gym_rows = assign_gyms_to_zip_codes(lats, lngs, zip_index)
+    num_gyms = count_gyms_by_zip_code(gym_rows, zip_index)
+
+    # Zips with the most gyms first, ties broken by population
+    order = np.lexsort((-zip_index.populations, -num_gyms))
+    zip_codes = np.char.zfill(zip_index.zip_codes[order].astype(str), 5)
+    write_table(output_filepath, ['zip_code', 'population', 'num_gyms', 'gyms_per_100k'],
+                [zip_codes, zip_index.populations[order].astype(np.int64), num_gyms[order],
+                 per_100k(num_gyms, zip_index.populations)[order]])
+
+    print("Number of gyms: ", len(gym_rows))
+    print("Number of gyms too far from any zip code: ", int(np.sum(gym_rows < 0)))
+    print("Number of zip codes with gyms: ", int(np.count_nonzero(num_gyms)))
+
+
+if __name__ == '__main__':
+    main()
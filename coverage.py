@@ -0,0 +1,147 @@
+"""
+Coverage of a set of search circles, rasterized onto an equal-area grid.
+
+Circles are projected with a Lambert cylindrical equal-area projection whose
+standard parallel is the circles' median latitude. Longitudes are first unwrapped
+to within 180 degrees of the circles' mean direction, so circles on either side of
+the antimeridian land next to each other on the grid. Every square grid cell then
+covers the same area of the Earth's surface, so counting cells measures area. A
+cell belongs to a circle when its center is within the circle's radius (a great
+circle test, so the projection's stretching away from the standard parallel does
+not bias it). Each grid row crossing a circle is one run of cells, so the cells are
+generated with vectorized run expansion, and only occupied cells are stored: a count
+per cell of the circles that cover it.
+
+A circle is covered by the others where the count of its cells is at least 2.
+Removing a circle just decrements its cells, so pruning needs no pairwise loops.
+
+The cell grows past CELL_SIZE when the circles' total area would need more than
+MAX_CELLS cells, which bounds time and memory on large inputs.
+"""
+import math
+
+import numpy as np
+
+from spatial_index import EARTH_RADIUS_METERS
+
+CELL_SIZE = 250 # meters, finest grid cell
+MAX_CELLS = 12_000_000 # circle cells stored across all circles
+CHUNK_CELLS = 2_000_000 # circle cells expanded per vectorized batch
+
+
+def unwrap_longitudes(lngs):
+    """
+    Longitudes (radians) shifted by whole turns to within pi of their circular mean.
+    A plain median would not do: for circles at +179.99 and -179.99 degrees it is 0.
+    """
+    if not len(lngs):
+        return lngs
+    center = math.atan2(np.sum(np.sin(lngs)), np.sum(np.cos(lngs)))
+    return center + (lngs - center + np.pi) % (2 * np.pi) - np.pi
+
+
+class CoverageGrid:
+    def __init__(self, lats, lngs, radii, cell_size=CELL_SIZE, max_cells=MAX_CELLS):
+        """lats, lngs and radii (meters) describe the circles; indices below refer to their order."""
+        lats, lngs, radii = (np.asarray(values, dtype=np.float64) for values in (lats, lngs, radii))
+        self.num_circles = len(radii)
+        self.cell_size = max(cell_size, math.sqrt(np.sum(np.pi * radii ** 2) / max_cells))
+        self.cell_area = self.cell_size ** 2
+        self.scale = math.cos(math.radians(np.median(lats))) if self.num_circles else 1.0
+
+        keys, circle_counts = self._rasterize(np.radians(lats), unwrap_longitudes(np.radians(lngs)),
+                                              radii / EARTH_RADIUS_METERS)
+        self.offsets = np.concatenate([[0], np.cumsum(circle_counts)])
+
+        # Number the occupied cells; cell_ids maps each circle cell to its occupied cell
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        is_new = np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else np.zeros(0, dtype=bool)
+        self.cell_ids = np.empty(len(keys), dtype=np.int32)
+        self.cell_ids[order] = np.cumsum(is_new) - 1
+        self.counts = np.bincount(self.cell_ids).astype(np.int32)
+
+    def _rasterize(self, lats, lngs, angles):
+        """
+        Keys of the cells inside each circle, grouped by circle, and the number of cells per circle.
+        Each grid row crossing a circle is a run of cells, found from the row's latitude.
+        """
+        radius = EARTH_RADIUS_METERS
+        to_x = radius * self.scale / self.cell_size # grid columns per radian of longitude
+        to_y = radius / self.scale / self.cell_size # grid rows per unit of sin(latitude)
+
+        y0 = np.floor(np.sin(np.maximum(lats - angles, -np.pi / 2)) * to_y).astype(np.int64)
+        y1 = np.floor(np.sin(np.minimum(lats + angles, np.pi / 2)) * to_y).astype(np.int64)
+        heights = y1 - y0 + 1
+        row_circles = np.repeat(np.arange(self.num_circles), heights)
+        row_y = y0[row_circles] + np.arange(len(row_circles)) - np.repeat(np.cumsum(heights) - heights, heights)
+
+        # Half width in longitude of the circle at each row's center latitude
+        row_lats = np.arcsin(np.clip((row_y + 0.5) / to_y, -1, 1))
+        circle_lats = lats[row_circles]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_half_widths = ((np.cos(angles[row_circles]) - np.sin(circle_lats) * np.sin(row_lats))
+                               / (np.cos(circle_lats) * np.cos(row_lats)))
+        half_widths = np.arccos(np.clip(np.nan_to_num(cos_half_widths, nan=2.0), -1, 1))
+        row_x0 = np.ceil((lngs[row_circles] - half_widths) * to_x - 0.5).astype(np.int64)
+        row_x1 = np.floor((lngs[row_circles] + half_widths) * to_x - 0.5).astype(np.int64)
+        lengths = np.where(cos_half_widths <= 1, np.maximum(row_x1 - row_x0 + 1, 0), 0)
+
+        # A circle smaller than a cell still gets the cell under its center
+        empty = np.bincount(row_circles, weights=lengths, minlength=self.num_circles) == 0
+        center_rows = empty[row_circles] & (row_y == np.floor(np.sin(circle_lats) * to_y).astype(np.int64))
+        row_x0[center_rows] = np.floor(lngs[row_circles[center_rows]] * to_x).astype(np.int64)
+        lengths[center_rows] = 1
+
+        # Expand the runs into cell keys, a batch of rows at a time
+        run_starts = (row_y << 32) + row_x0
+        ends = np.cumsum(lengths)
+        keys = []
+        start = 0
+        while start < len(lengths):
+            stop = max(start + 1, int(np.searchsorted(ends, ends[start] - lengths[start] + CHUNK_CELLS, side='right')))
+            batch = lengths[start:stop]
+            offsets_in_run = np.arange(batch.sum()) - np.repeat(np.cumsum(batch) - batch, batch)
+            keys.append(np.repeat(run_starts[start:stop], batch) + offsets_in_run)
+            start = stop
+        circle_counts = np.bincount(row_circles, weights=lengths, minlength=self.num_circles).astype(np.int64)
+        return (np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)), circle_counts
+
+    def cells(self, i):
+        return self.cell_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def union_area(self):
+        """Area in square meters covered by at least one remaining circle."""
+        return np.count_nonzero(self.counts) * self.cell_area
+
+    def covered_fraction(self, i):
+        """Share of remaining circle i's area that the other remaining circles also cover."""
+        cells = self.cells(i)
+        return np.count_nonzero(self.counts[cells] >= 2) / len(cells)
+
+    def remove(self, i):
+        self.counts[self.cells(i)] -= 1
+
+    def prune(self, threshold, order=None):
+        """
+        Remove, in order, every circle at least threshold covered by the circles still remaining.
+        Returns a boolean array of the circles kept.
+        """
+        kept = np.ones(self.num_circles, dtype=bool)
+        for i in range(self.num_circles) if order is None else order:
+            if self.covered_fraction(i) >= threshold:
+                self.remove(i)
+                kept[i] = False
+        return kept
+
+
+def remove_covered_circles(lats, lngs, radii, threshold):
+    """
+    Boolean mask of the circles to keep, dropping circles at least threshold covered by the rest.
+    Smaller circles are tried first, so a small circle goes before the large one that covers it.
+    Returns (kept, union area before, union area after, cell size), areas in square meters.
+    """
+    grid = CoverageGrid(lats, lngs, radii)
+    area_before = grid.union_area()
+    kept = grid.prune(threshold, np.argsort(np.asarray(radii, dtype=np.float64), kind='stable'))
+    return kept, area_before, grid.union_area(), grid.cell_size
@@ -0,0 +1,132 @@
+"""
+Removes duplicate gyms from the raw crawl output.
+
+Overlapping circles return the same gym many times. Rows are streamed through two
+passes backed by a temporary SQLite file, so memory stays flat however large the
+crawl is:
+
+1) Exact: the first row for each Place_Id is kept (rows without one fall back to
+   name + coordinates).
+2) Fuzzy: a row is merged into an earlier kept row when their names are nearly
+   identical and they are within MERGE_DISTANCE meters. Candidates come from a
+   spatial hash over 3D unit vectors. The 27 cells around a row are looked up by
+   exact key (9 packed (x, y) columns, each with its 3 z cells), so each lookup is
+   a few index probes whatever the size of the crawl.
+
+Input: data/jiu_jitsu_gyms.csv
+    - Place_Id,Name,Latitude,Longitude and the other gym_records.GYM_FIELDNAMES columns
+Output: data/dedup_jiu_jitsu_gyms.csv
+    - same columns as the input
+"""
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from difflib import SequenceMatcher
+
+import geodesy
+from spatial_index import EARTH_RADIUS_METERS, to_unit_vector
+
+ORIGINAL_FILEPATH = 'data/jiu_jitsu_gyms.csv'
+DEDUP_FILEPATH = 'data/dedup_jiu_jitsu_gyms.csv'
+MERGE_DISTANCE = 5 # meters; the same listing twice sits at (nearly) the same point
+NAME_SIMILARITY = 0.9
+
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[^a-z0-9 ]', ' ', (name or '').lower()).split())
+
+
+def names_match(name1, name2):
+    return name1 == name2 or SequenceMatcher(None, name1, name2).ratio() >= NAME_SIMILARITY
+
+
+def spatial_cell(lat, lng, cell_size):
+    return tuple(int(coordinate // cell_size) for coordinate in to_unit_vector(lat, lng))
+
+
+def column_key(x, y):
+    # Cells are at least a meter, so |x|, |y| < 2**23 and the pair fits a 64 bit integer
+    return (x << 24) + y
+
+
+def neighbor_column_keys(x, y):
+    """Keys of the 9 (x, y) columns around (x, y)."""
+    return [column_key(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def remove_exact_duplicates(input_filepath, db):
+    """Pass 1: stream the CSV into the gyms table, one row per place id. Returns (fieldnames, rows read)."""
+    db.execute('CREATE TABLE gyms (id INTEGER PRIMARY KEY, key TEXT UNIQUE, name TEXT, lat REAL, lng REAL, row TEXT)')
+    num_rows = 0
+    with open(input_filepath, 'r', newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            num_rows += 1
+            key = row.get('Place_Id') or f"{row['Name']}|{row['Latitude']}|{row['Longitude']}"
+            db.execute('INSERT OR IGNORE INTO gyms (key, name, lat, lng, row) VALUES (?, ?, ?, ?, ?)',
+                       (key, normalize_name(row['Name']), float(row['Latitude']), float(row['Longitude']),
+                        json.dumps(row)))
+        fieldnames = reader.fieldnames
+    db.commit()
+    return fieldnames, num_rows
+
+
+def iterate_gyms(db, batch_size=10000):
+    """Yield (id, name, lat, lng) from the gyms table in id order, batch_size rows in memory at a time."""
+    last_id = 0
+    while True:
+        batch = db.execute('SELECT id, name, lat, lng FROM gyms WHERE id > ? ORDER BY id LIMIT ?',
+                           (last_id, batch_size)).fetchall()
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1][0]
+
+
+def merge_near_duplicates(db, merge_distance=MERGE_DISTANCE):
+    """Pass 2: copy gyms into kept, skipping any that match a nearby kept gym by name. Returns the merge count."""
+    db.execute('CREATE TABLE kept (id INTEGER PRIMARY KEY, name TEXT, lat REAL, lng REAL, xy INTEGER, z INTEGER)')
+    db.execute('CREATE INDEX kept_cell ON kept (xy, z)')
+    cell_size = merge_distance / EARTH_RADIUS_METERS
+    num_merged = 0
+
+    for gym_id, name, lat, lng in iterate_gyms(db):
+        x, y, z = spatial_cell(lat, lng, cell_size)
+        neighbors = db.execute('SELECT name, lat, lng FROM kept WHERE xy IN (?, ?, ?, ?, ?, ?, ?, ?, ?) AND z BETWEEN ? AND ?',
+                               (*neighbor_column_keys(x, y), z - 1, z + 1)).fetchall()
+        if any(names_match(name, other_name) and geodesy.haversine_distance(lat, lng, other_lat, other_lng) <= merge_distance
+               for other_name, other_lat, other_lng in neighbors):
+            num_merged += 1
+            continue
+        db.execute('INSERT INTO kept VALUES (?, ?, ?, ?, ?, ?)', (gym_id, name, lat, lng, column_key(x, y), z))
+    db.commit()
+    return num_merged
+
+
+def deduplicate(input_filepath=ORIGINAL_FILEPATH, output_filepath=DEDUP_FILEPATH, merge_distance=MERGE_DISTANCE):
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_filepath))) as tmpdir:
+        db = sqlite3.connect(os.path.join(tmpdir, 'dedup.sqlite'))
+        try:
+            fieldnames, num_rows = remove_exact_duplicates(input_filepath, db)
+            num_unique = db.execute('SELECT COUNT(*) FROM gyms').fetchone()[0]
+            num_merged = merge_near_duplicates(db, merge_distance)
+
+            with open(output_filepath, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer.writeheader()
+                for (row,) in db.execute('SELECT gyms.row FROM kept JOIN gyms ON gyms.id = kept.id ORDER BY kept.id'):
+                    writer.writerow(json.loads(row))
+        finally:
+            db.close()
+
+    print("Number of rows read: ", num_rows)
+    print("Number of exact duplicates removed: ", num_rows - num_unique)
+    print("Number of near duplicates merged: ", num_merged)
+    print("Number of gyms kept: ", num_unique - num_merged)
+
+
+if __name__ == '__main__':
+    deduplicate()
@@ -0,0 +1,119 @@
+"""
+Concurrent, rate-limited client for the Google Geocoding API.
+
+Zip codes are geocoded on a thread pool. The overall request rate starts at `qps`
+and is tuned by an AIMD rate limiter, which climbs while requests succeed and
+halves on quota errors. Results always come back in input order. Requests are
+spread over an api_keys.KeyPool (a single key string works too). A zip that fails
+is retried after a jittered exponential backoff, up to MAX_ATTEMPTS times, or
+MAX_QUOTA_RETRIES times for quota errors, before it is given up on. Sustained
+failures trip a circuit breaker that pauses every worker.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_keys import MAX_QUOTA_RETRIES, QUOTA_STATUSES, KeyQuotaError, QuotaExhausted, as_key_pool
+from api_metrics import instrumented_get
+from rate_limiter import AdaptiveRateLimiter, CircuitBreaker, CircuitOpen, backoff_delay
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+CACHEABLE_STATUSES = ('OK', 'ZERO_RESULTS')
+MAX_ATTEMPTS = 3
+
+
+def parse_geocode_response(data):
+    """Return center_lat, center_lng, northeast, southwest from a Geocoding response (Nones if empty)."""
+    results = data.get('results')
+    if results:
+        geometry = results[0]['geometry']
+        viewport = geometry['viewport']
+        return geometry['location']['lat'], geometry['location']['lng'], viewport['northeast'], viewport['southwest']
+    return None, None, None, None
+
+
+def geocode_zip_code(zip_code, api_key, base_url=GEOCODE_URL, cache=None, bucket=None, metrics=None):
+    """
+    Geocode one zip code, checking cache first and waiting on bucket (an AdaptiveRateLimiter) before a network call.
+    api_key is a key or a KeyPool. Calls and cache hits are recorded in metrics (an ApiMetrics) when given.
+    Returns Nones when the API definitively has no results for the zip (ZERO_RESULTS).
+    Raises KeyQuotaError when the key is over its limit, and RuntimeError on any other failed status,
+    so the caller can retry.
+    """
+    params = {'address': zip_code}
+    data = cache.get('geocode', params) if cache else None
+    if data is not None and metrics:
+        metrics.record_cache_hit('geocode')
+    if data is None:
+        key_pool = as_key_pool(api_key)
+        key, delay = key_pool.reserve()
+        time.sleep(max(delay, bucket.reserve() if bucket else 0))
+        data = instrumented_get(base_url, {**params, 'key': key}, 'geocode', metrics)
+        key_pool.record(key, data.get('status'))
+        if data.get('status') in QUOTA_STATUSES:
+            if bucket:
+                bucket.on_throttle()
+            raise KeyQuotaError(f"geocoding returned {data.get('status')}")
+        if data.get('status') not in CACHEABLE_STATUSES:
+            # Denied or server side errors are not an answer about the zip; let the caller retry
+            raise RuntimeError(f"geocoding returned {data.get('status')}")
+        if bucket:
+            bucket.on_success()
+        # Only cache definitive answers, never quota or server errors
+        if cache and data.get('status') in CACHEABLE_STATUSES:
+            cache.set('geocode', params, data)
+    center_lat, center_lng, northeast, southwest = parse_geocode_response(data)
+    if northeast:
+        print("Got: " + zip_code)
+    else:
+        print("No results for zip code:", zip_code)
+        print("response:", data.get('status'))
+    return center_lat, center_lng, northeast, southwest
+
+
+def geocode_zip_codes(zip_codes, api_key, qps=10, max_workers=8, base_url=GEOCODE_URL, cache=None, metrics=None,
+                      max_qps=float('inf'), breaker=None):
+    """
+    Geocode many zip codes at once, starting at qps and adapting up to max_qps.
+
+    Yields (zip_code, (center_lat, center_lng, northeast, southwest)) in the order of zip_codes.
+    A zip the API has no results for yields Nones. A zip that still fails after its retries, or once every
+    key is out of quota, yields None in place of the tuple instead of stopping the run. Zips found in cache (a ResponseCache) skip the network and the rate limit.
+    """
+    bucket = AdaptiveRateLimiter(qps, max_rate=max_qps)
+    breaker = breaker or CircuitBreaker()
+    key_pool = as_key_pool(api_key)
+
+    def geocode(zip_code):
+        errors = quota_errors = 0
+        while True:
+            try:
+                # Ask again after every wait, so only the single half-open trial goes out
+                while (delay := breaker.wait_time()) > 0:
+                    time.sleep(delay)
+                result = geocode_zip_code(zip_code, key_pool, base_url, cache, bucket, metrics)
+            except (QuotaExhausted, CircuitOpen) as exc:
+                print(f"Could not geocode {zip_code}: {exc}")
+                return None
+            except KeyQuotaError as exc:
+                breaker.record_failure()
+                quota_errors += 1
+                if quota_errors == MAX_QUOTA_RETRIES:
+                    print(f"An error occurred geocoding {zip_code}: {exc}")
+                    return None
+                time.sleep(backoff_delay(quota_errors - 1))
+            except Exception as exc:
+                breaker.record_failure()
+                if getattr(getattr(exc, 'response', None), 'status_code', None) == 429:
+                    bucket.on_throttle()
+                errors += 1
+                if errors == MAX_ATTEMPTS:
+                    print(f"An error occurred geocoding {zip_code}: {exc}")
+                    return None
+                time.sleep(backoff_delay(errors - 1))
+            else:
+                breaker.record_success()
+                return result
+
+    zip_codes = list(zip_codes)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from zip(zip_codes, executor.map(geocode, zip_codes))
@@ -0,0 +1,68 @@
+"""
+Vectorized geodesy helpers.
+
+All functions take scalars or NumPy arrays (broadcast against each other) and
+return arrays, so whole sets of circles can be handled in one call. The scalar
+calculate_* functions in the pipeline scripts are thin wrappers around these.
+"""
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371000
+EARTH_RADIUS_KILOMETERS = 6371
+
+
+def haversine_distance(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS_METERS):
+    """Great circle distance between (lat1, lng1) and (lat2, lng2), in the units of radius."""
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lng1 = np.asarray(lng1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lng2 = np.asarray(lng2, dtype=np.float64)
+
+    dlat = np.radians(lat2 - lat1)
+    dlng = np.radians(lng2 - lng1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlng / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return radius * c
+
+
+def distance_matrix(lats1, lngs1, lats2=None, lngs2=None, radius=EARTH_RADIUS_METERS):
+    """Pairwise distances, shape (len(lats1), len(lats2)). Defaults to the first set against itself."""
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lngs1 = np.asarray(lngs1, dtype=np.float64)
+    if lats2 is None:
+        lats2, lngs2 = lats1, lngs1
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lngs2 = np.asarray(lngs2, dtype=np.float64)
+    return haversine_distance(lats1[:, None], lngs1[:, None], lats2[None, :], lngs2[None, :], radius)
+
+
+def radii_from_viewports(ne_lats, ne_lngs, sw_lats, sw_lngs):
+    """Approximate search radius (meters) from viewport corners: center to northeast corner."""
+    ne_lats = np.asarray(ne_lats, dtype=np.float64)
+    ne_lngs = np.asarray(ne_lngs, dtype=np.float64)
+    center_lats = (ne_lats + np.asarray(sw_lats, dtype=np.float64)) / 2
+    center_lngs = (ne_lngs + np.asarray(sw_lngs, dtype=np.float64)) / 2
+    return haversine_distance(center_lats, center_lngs, ne_lats, ne_lngs)
+
+
+def overlap_areas(r1, r2, d):
+    """Area of overlap between circles with radii r1 and r2 whose centers are d apart."""
+    r1, r2, d = np.broadcast_arrays(np.asarray(r1, dtype=np.float64),
+                                    np.asarray(r2, dtype=np.float64),
+                                    np.asarray(d, dtype=np.float64))
+    disjoint = d >= r1 + r2
+    nested = d <= np.abs(r1 - r2)
+    partial = ~(disjoint | nested)
+
+    areas = np.where(nested, np.pi * np.minimum(r1, r2) ** 2, 0.0)
+
+    # Lens area, only evaluated where the circles partially overlap
+    r1p, r2p, dp = r1[partial], r2[partial], d[partial]
+    r1_sq = r1p ** 2
+    r2_sq = r2p ** 2
+    d_sq = dp ** 2
+    part1 = r1_sq * np.arccos(np.clip((d_sq + r1_sq - r2_sq) / (2 * dp * r1p), -1, 1))
+    part2 = r2_sq * np.arccos(np.clip((d_sq + r2_sq - r1_sq) / (2 * dp * r2p), -1, 1))
+    part3 = 0.5 * np.sqrt(np.maximum((-dp + r1p + r2p) * (dp + r1p - r2p) * (dp - r1p + r2p) * (dp + r1p + r2p), 0))
+    areas[partial] = part1 + part2 - part3
+    return areas
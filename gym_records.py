@@ -0,0 +1,116 @@
+"""
+Gym record schema and the buffered writer for crawl output.
+
+Text Search already returns the address, rating, review count, types and business
+status with every place. gym_record() keeps all of it, so later stages can work
+offline from the CSV instead of querying the API again. The first four columns are
+the ones the pipeline has always written, so existing readers keep working.
+
+GymRecordWriter buffers rows and writes them in batches. Each batch is fsynced,
+either through the ProgressJournal (which fsyncs before journaling the batch's
+circles) or directly, every batch_size rows or fsync_interval seconds, whichever
+comes first. With archive_filepath set, every circle's raw Places results are also
+appended to a gzip-compressed JSONL archive, one {"circle_id", "results"} object
+per line, for anything the CSV leaves out. Each batch goes into the archive as one
+complete gzip member, fsynced before its circles are journaled, so a crash can only
+leave the batch being written cut short at the end, and read_archive() skips it.
+"""
+import csv
+import gzip
+import json
+import os
+import time
+
+GYM_FIELDNAMES = ['Place_Id', 'Name', 'Latitude', 'Longitude', 'Address', 'Rating', 'User_Ratings_Total',
+                  'Types', 'Business_Status', 'Circle_Id']
+BATCH_SIZE = 500 # rows
+FSYNC_INTERVAL = 5.0 # seconds
+
+
+def gym_record(place, circle_id=''):
+    """One GYM_FIELDNAMES row from a Places result."""
+    location = place['geometry']['location']
+    return {
+        'Place_Id': place.get('place_id'),
+        'Name': place.get('name'),
+        'Latitude': location['lat'],
+        'Longitude': location['lng'],
+        'Address': place.get('formatted_address', place.get('vicinity', '')),
+        'Rating': place.get('rating', ''),
+        'User_Ratings_Total': place.get('user_ratings_total', ''),
+        'Types': '|'.join(place.get('types', [])),
+        'Business_Status': place.get('business_status', ''),
+        'Circle_Id': circle_id,
+    }
+
+
+class GymRecordWriter:
+    def __init__(self, filepath, journal=None, archive_filepath=None, batch_size=BATCH_SIZE, fsync_interval=FSYNC_INTERVAL):
+        """
+        Append gym rows to the CSV at filepath (writing the header if it is new).
+        With a ProgressJournal, each flushed batch's circles are journaled once their rows are on disk.
+        """
+        self.journal = journal
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.csvfile = open(filepath, 'a', newline='')
+        self.writer = csv.DictWriter(self.csvfile, fieldnames=GYM_FIELDNAMES)
+        if self.csvfile.tell() == 0:
+            self.writer.writeheader()
+        self.archive_filepath = archive_filepath
+        self.archive_lines = []
+        self.rows = []
+        self.circle_ids = []
+        self.last_flush = time.monotonic()
+
+    def write_circle(self, circle_id, places):
+        self.rows.extend(gym_record(place, circle_id) for place in places)
+        self.circle_ids.append(circle_id)
+        if self.archive_filepath:
+            self.archive_lines.append(json.dumps({'circle_id': circle_id, 'results': places}) + '\n')
+        if len(self.rows) >= self.batch_size or time.monotonic() - self.last_flush >= self.fsync_interval:
+            self.flush()
+
+    def flush(self):
+        self.writer.writerows(self.rows)
+        self.csvfile.flush()
+        if self.archive_lines:
+            self.write_archive()
+        if self.journal:
+            self.journal.record(self.circle_ids) # fsyncs the CSV before journaling
+        else:
+            os.fsync(self.csvfile.fileno())
+        self.rows = []
+        self.circle_ids = []
+        self.last_flush = time.monotonic()
+
+    def write_archive(self):
+        with open(self.archive_filepath, 'ab') as archive:
+            archive.write(gzip.compress(''.join(self.archive_lines).encode()))
+            archive.flush()
+            os.fsync(archive.fileno())
+        self.archive_lines = []
+
+    def close(self):
+        self.flush()
+        self.csvfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_archive(filepath):
+    """
+    Yield (circle_id, results) from a raw response archive. A circle redone after a crash can appear twice.
+    A batch cut short by a crash is the archive's last gzip member; it is read up to where it ends.
+    """
+    with gzip.open(filepath, 'rt') as archive:
+        try:
+            for line in archive:
+                record = json.loads(line)
+                yield record['circle_id'], record['results']
+        except EOFError:
+            return
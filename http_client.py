@@ -0,0 +1,51 @@
+"""
+Shared HTTP client for all Google API calls.
+
+One requests.Session with a pooled HTTPAdapter is reused by every thread. Repeat
+calls to the same host then ride on open keep-alive connections instead of paying
+a TCP + TLS handshake each. Responses are requested gzip-compressed. Every call
+has a connect and read timeout, so a hung socket fails the request instead of
+stalling the run forever. get_json() reports the bytes read off the wire next to
+the decoded body size, for the metrics report.
+"""
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 5 # seconds
+READ_TIMEOUT = 30
+POOL_SIZE = 16 # keep-alive connections kept per host; at least the largest worker pool
+
+
+@lru_cache(maxsize=None)
+def shared_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip'
+    return session
+
+
+def get_json(url, params=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=None):
+    """
+    GET url on the shared session and decode the JSON body.
+    Returns (data, wire_bytes, body_bytes); raises on a timeout, connection error or HTTP error status.
+    """
+    response = (session or shared_session()).get(url, params=params, timeout=timeout)
+    body = response.content
+    if not response.ok:
+        # Not raise_for_status(): its message carries the full URL, API key included
+        raise requests.HTTPError(f"{response.status_code} {response.reason} from {url.split('?')[0]}", response=response)
+    # tell() counts the bytes pulled off the socket, before gzip decoding
+    wire_bytes = response.raw.tell() if hasattr(response.raw, 'tell') else len(body)
+    return response.json(), wire_bytes, len(body)
+
+
+def is_transient(exc):
+    """True for request failures worth retrying: timeouts, dropped connections, 429 and 5xx responses."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, 'response', None)
+    return isinstance(exc, requests.HTTPError) and response is not None and (response.status_code == 429 or response.status_code >= 500)
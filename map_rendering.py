@@ -0,0 +1,109 @@
+"""
+Writes search circles and gyms as a single lightweight Leaflet map.
+
+folium emits a block of JavaScript per circle, so a map of a few thousand zips is
+megabytes of HTML that browsers struggle to open. Here the circles are one compact
+JSON array drawn on a shared canvas renderer, and gyms go into one clustered marker
+layer, so file size is a few dozen bytes per circle or gym and the page stays
+responsive at 50k+ of each. Writing the file is just a json.dumps, no folium needed.
+Names come from the Places API and are shown as plain text, never parsed as HTML.
+
+    render_map(zip_codes_to_coordinates, 'visualizations/map.html', gyms=[(name, lat, lng), ...])
+"""
+import csv
+import html
+import json
+import os
+
+LEAFLET_URL = 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist'
+MARKERCLUSTER_URL = 'https://cdn.jsdelivr.net/npm/leaflet.markercluster@1.5.3/dist'
+MAP_CENTER = [37.0902, -95.7129] # center of the US
+MAP_ZOOM = 4
+COORDINATE_DIGITS = 5 # ~1 m, plenty for a map
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<title>%(title)s</title>
+<link rel="stylesheet" href="%(leaflet)s/leaflet.css" />
+<link rel="stylesheet" href="%(markercluster)s/MarkerCluster.css" />
+<link rel="stylesheet" href="%(markercluster)s/MarkerCluster.Default.css" />
+<script src="%(leaflet)s/leaflet.js"></script>
+<script src="%(markercluster)s/leaflet.markercluster.js"></script>
+<style>html, body, #map {width: 100%%; height: 100%%; margin: 0; padding: 0;}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var circles = %(circles)s; // [lat, lng, radius, label]
+var gyms = %(gyms)s; // [lat, lng, name]
+
+// Popups are built on open, with the name set as text so it can't inject markup
+function textPopup(text) {
+    return function () {
+        var popup = document.createElement('div');
+        popup.textContent = text;
+        return popup;
+    };
+}
+
+var map = L.map('map', {preferCanvas: true}).setView(%(center)s, %(zoom)s);
+L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: 19, attribution: '&copy; OpenStreetMap contributors'
+}).addTo(map);
+
+var renderer = L.canvas({padding: 0.5});
+var circleLayer = L.layerGroup();
+circles.forEach(function (c) {
+    L.circle([c[0], c[1]], {radius: c[2], color: 'blue', weight: 1, fillOpacity: 0.3, renderer: renderer})
+        .bindPopup(textPopup(c[3])).addTo(circleLayer);
+});
+circleLayer.addTo(map);
+
+var gymLayer = L.markerClusterGroup({chunkedLoading: true});
+gymLayer.addLayers(gyms.map(function (g) { return L.marker([g[0], g[1]]).bindPopup(textPopup(g[2])); }));
+gymLayer.addTo(map);
+
+L.control.layers(null, {'Search circles': circleLayer, 'Gyms': gymLayer}).addTo(map);
+</script>
+</body>
+</html>
+"""
+
+
+def circle_rows(zip_codes_to_coordinates):
+    """[lat, lng, radius, label] for each entry of a zip_code -> [(lat, lng), radius, city, ...] dictionary."""
+    return [[round(lat, COORDINATE_DIGITS), round(lng, COORDINATE_DIGITS), round(radius), f"{city} ({zip_code})"]
+            for zip_code, ((lat, lng), radius, city, *_) in zip_codes_to_coordinates.items()]
+
+
+def gym_rows(gyms):
+    """[lat, lng, name] for each (name, lat, lng) gym."""
+    return [[round(float(lat), COORDINATE_DIGITS), round(float(lng), COORDINATE_DIGITS), name] for name, lat, lng in gyms]
+
+
+def read_gyms(filepath):
+    """(name, lat, lng) for each row of a gym CSV (crawl or dedup output)."""
+    with open(filepath, 'r', newline='') as csvfile:
+        return [(row['Name'], row['Latitude'], row['Longitude']) for row in csv.DictReader(csvfile)]
+
+
+def render_map(zip_codes_to_coordinates, filename, gyms=(), title='Search area'):
+    """Write an html map of the circles in zip_codes_to_coordinates, plus clustered markers for gyms."""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    page = PAGE_TEMPLATE % {
+        'title': html.escape(title),
+        'leaflet': LEAFLET_URL,
+        'markercluster': MARKERCLUSTER_URL,
+        # </ is escaped so a name can never close the script tag
+        'circles': json.dumps(circle_rows(zip_codes_to_coordinates), separators=(',', ':')).replace('</', '<\\/'),
+        'gyms': json.dumps(gym_rows(gyms), separators=(',', ':')).replace('</', '<\\/'),
+        'center': json.dumps(MAP_CENTER),
+        'zoom': MAP_ZOOM,
+    }
+    with open(filename, 'w') as html_file:
+        html_file.write(page)
@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Google Geocoding and Places text-search APIs, for exercising
+the clients without spending quota.
+
+Responses are deterministic and follow the real JSON shape. Text search serves a
+fixed set of synthetic gyms: those within the requested radius, nearest first,
+capped at 60 and paged 20 at a time through next_page_token. make_synthetic_gyms
+spreads them evenly and make_clustered_gyms builds dense metros around sparse
+countryside. `latency` adds a delay to every response, and `error_rate` makes that
+share of requests fail (seeded), half as HTTP 500 and half as OVER_QUERY_LIMIT.
+
+Per-key limits are enforced like the real API: with key_qps, a key sending more than
+that many requests in a second gets OVER_QUERY_LIMIT, and with key_quota, so does
+every request past the key's total quota. Either can be a {key: limit} dict to limit
+keys differently (keys not in it are unlimited). With keys set, any other key gets
+REQUEST_DENIED. key_requests counts the requests served for each key. With
+page_token_delay, a next_page_token used sooner than that gets INVALID_REQUEST, as
+the real API does, and stays valid for a later try.
+
+    server, base_url = start_mock_server(latency=0.05, error_rate=0.01)
+    geocode_zip_codes(zips, 'test-key', base_url=base_url + GEOCODE_PATH)
+    server.shutdown()
+"""
+import gzip
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GEOCODE_PATH = '/maps/api/geocode/json'
+TEXT_SEARCH_PATH = '/maps/api/place/textsearch/json'
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+US_BOUNDS = ((25.0, -124.0), (49.0, -67.0))
+GYM_CELL_DEGREES = 0.25 # bucket size of the gym lookup grid
+
+
+def fake_zip_code_location(zip_code):
+    """Deterministic lat/lng inside the continental US for any zip code string."""
+    digest = hashlib.sha256(zip_code.encode()).digest()
+    lat = 25 + digest[0] / 255 * 23
+    lng = -124 + digest[1] / 255 * 57
+    return lat, lng
+
+
+def make_synthetic_gyms(count, seed=0, bounds=US_BOUNDS):
+    """count gyms placed uniformly at random (seeded) inside bounds, shaped like Places results."""
+    rng = random.Random(seed)
+    (south, west), (north, east) = bounds
+    gyms = []
+    for i in range(count):
+        gyms.append({
+            'place_id': f"mock-{seed}-{i}",
+            'name': f"Mock Jiu Jitsu Academy {i}",
+            'geometry': {'location': {'lat': rng.uniform(south, north), 'lng': rng.uniform(west, east)}},
+        })
+    return gyms
+
+
+def make_clustered_gyms(clusters, seed=0):
+    """
+    Gyms with uneven density, for exercising saturation.
+
+    clusters is a list of (lat, lng, count, spread_meters); each cluster is a normal
+    distribution around its center, so metros can be dense and the countryside sparse.
+    """
+    rng = random.Random(seed)
+    gyms = []
+    for cluster, (lat, lng, count, spread) in enumerate(clusters):
+        for i in range(count):
+            gym_lat = lat + rng.gauss(0, spread) / 111320
+            gym_lng = lng + rng.gauss(0, spread) / (111320 * math.cos(math.radians(lat)))
+            gyms.append({
+                'place_id': f"mock-{seed}-{cluster}-{i}",
+                'name': f"Mock Jiu Jitsu Academy {cluster}-{i}",
+                'geometry': {'location': {'lat': gym_lat, 'lng': gym_lng}},
+            })
+    return gyms
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 6371000 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def geocode_response(zip_code):
+    if not zip_code.isdigit():
+        return {'results': [], 'status': 'ZERO_RESULTS'}
+    lat, lng = fake_zip_code_location(zip_code)
+    half_size = 0.02
+    return {
+        'results': [{
+            'geometry': {
+                'location': {'lat': lat, 'lng': lng},
+                'viewport': {
+                    'northeast': {'lat': lat + half_size, 'lng': lng + half_size},
+                    'southwest': {'lat': lat - half_size, 'lng': lng - half_size},
+                },
+            },
+        }],
+        'status': 'OK',
+    }
+
+
+def gym_cell(lat, lng):
+    return math.floor(lat / GYM_CELL_DEGREES), math.floor(lng / GYM_CELL_DEGREES)
+
+
+def key_setting(setting, key):
+    """key's value of a per-key limit given as one value for every key or a {key: value} dict."""
+    return setting.get(key) if isinstance(setting, dict) else setting
+
+
+class MockGoogleServer(ThreadingHTTPServer):
+    def __init__(self, address, gyms=None, latency=0.0, error_rate=0.0, seed=0, key_qps=None, key_quota=None, keys=None,
+                 page_token_delay=0.0):
+        super().__init__(address, MockGoogleHandler)
+        self.gyms = make_synthetic_gyms(2000) if gyms is None else gyms
+        self.latency = latency
+        self.error_rate = error_rate
+        self.key_qps = key_qps
+        self.key_quota = key_quota
+        self.keys = set(keys) if keys is not None else None
+        self.key_recent = defaultdict(deque) # key -> request times in the last second
+        self.key_requests = Counter()
+        self.rng = random.Random(seed)
+        self.page_token_delay = page_token_delay
+        self.page_tokens = {} # token -> (time it becomes valid, results not served yet)
+        self.request_count = 0
+        self.error_count = 0
+        self.lock = threading.Lock()
+
+        # Bucket gyms by lat/lng cell so a search only scans the cells its circle touches
+        self.gym_cells = {}
+        for gym in self.gyms:
+            location = gym['geometry']['location']
+            self.gym_cells.setdefault(gym_cell(location['lat'], location['lng']), []).append(gym)
+
+    def key_limit(self, key):
+        """None if key may make this request, else the status to refuse it with."""
+        with self.lock:
+            if self.keys is not None and key not in self.keys:
+                return 'REQUEST_DENIED'
+            now = time.monotonic()
+            recent = self.key_recent[key]
+            while recent and recent[0] <= now - 1:
+                recent.popleft()
+            quota, qps = key_setting(self.key_quota, key), key_setting(self.key_qps, key)
+            if quota is not None and self.key_requests[key] >= quota:
+                return 'OVER_QUERY_LIMIT'
+            if qps is not None and len(recent) >= qps:
+                return 'OVER_QUERY_LIMIT'
+            recent.append(now)
+            self.key_requests[key] += 1
+            return None
+
+    def injected_error(self):
+        """None, or which failure to serve for this request: 'http' or 'quota'."""
+        with self.lock:
+            if self.rng.random() >= self.error_rate:
+                return None
+            self.error_count += 1
+            return 'http' if self.rng.random() < 0.5 else 'quota'
+
+    def gyms_near(self, lat, lng, radius):
+        north, east = radius / 111320, radius / (111320 * max(math.cos(math.radians(lat)), 1e-6))
+        (south_cell, west_cell), (north_cell, east_cell) = gym_cell(lat - north, lng - east), gym_cell(lat + north, lng + east)
+        for lat_cell in range(south_cell, north_cell + 1):
+            for lng_cell in range(west_cell, east_cell + 1):
+                yield from self.gym_cells.get((lat_cell, lng_cell), ())
+
+    def text_search(self, params):
+        with self.lock:
+            self.request_count += 1
+            if 'pagetoken' in params:
+                valid_from, remaining = self.page_tokens.get(params['pagetoken'], (None, None))
+                if remaining is None or time.monotonic() < valid_from:
+                    return {'results': [], 'status': 'INVALID_REQUEST'}
+                del self.page_tokens[params['pagetoken']]
+            else:
+                remaining = None
+
+        if remaining is None:
+            lat, lng = (float(value) for value in params['location'].split(','))
+            radius = float(params['radius'])
+            nearby = []
+            for gym in self.gyms_near(lat, lng, radius):
+                location = gym['geometry']['location']
+                distance = distance_meters(lat, lng, location['lat'], location['lng'])
+                if distance <= radius:
+                    nearby.append((distance, gym['place_id'], gym))
+            remaining = [gym for _, _, gym in sorted(nearby, key=lambda item: item[:2])][:MAX_RESULTS]
+
+        page, remaining = remaining[:PAGE_SIZE], remaining[PAGE_SIZE:]
+        response = {'results': page, 'status': 'OK' if page else 'ZERO_RESULTS'}
+        if remaining:
+            token = uuid.uuid4().hex
+            with self.lock:
+                self.page_tokens[token] = time.monotonic() + self.page_token_delay, remaining
+            response['next_page_token'] = token
+        return response
+
+
+class MockGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real API
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path not in (GEOCODE_PATH, TEXT_SEARCH_PATH):
+            self.send_error(404)
+            return
+
+        status = self.server.key_limit(params.get('key'))
+        error = self.server.injected_error() if status is None else None
+        if status:
+            self.send_json({'results': [], 'status': status, 'error_message': f"Key limit: {status}"})
+        elif error == 'http':
+            self.send_error(500)
+        elif error == 'quota':
+            self.send_json({'results': [], 'status': 'OVER_QUERY_LIMIT',
+                            'error_message': 'You have exceeded your rate-limit for this API.'})
+        elif url.path == GEOCODE_PATH:
+            self.send_json(geocode_response(params.get('address', '')))
+        elif url.path == TEXT_SEARCH_PATH:
+            self.send_json(self.server.text_search(params))
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port=0, gyms=None, latency=0.0, error_rate=0.0, seed=0, key_qps=None, key_quota=None, keys=None,
+                      page_token_delay=0.0):
+    """Serve the mock API on a background thread. Returns (server, base_url)."""
+    server = MockGoogleServer(('127.0.0.1', port), gyms=gyms, latency=latency, error_rate=error_rate, seed=seed,
+                              key_qps=key_qps, key_quota=key_quota, keys=keys, page_token_delay=page_token_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
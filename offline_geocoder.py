@@ -0,0 +1,41 @@
+"""
+Offline zip code geocoder backed by the simplemaps uszips.csv table (through ZipIndex).
+
+The table already has a centroid for every zip, so no Geocoding API call is needed
+for the center. The search radius stands in for the viewport radius (center to the
+corner of the bounding box): for a zip of land area A treated as a square, that is
+sqrt(A / 2). Land area comes from population / density. Where that is unknown the
+zip is assumed to fill the space up to its nearest neighbour, whose distance d gives
+a square of side d and a radius of d / sqrt(2).
+"""
+import math
+
+import numpy as np
+
+from spatial_index import PointGridIndex
+
+
+class OfflineGeocoder:
+    def __init__(self, zip_index):
+        self.zip_index = zip_index
+        populations, densities = zip_index.populations, zip_index.densities
+        known = (populations > 0) & (densities > 0)
+        areas = np.where(known, populations / np.where(known, densities, 1) * 1e6, 0.0) # km² to m²
+        self.radii = np.sqrt(areas / 2)
+
+        unknown = np.flatnonzero(~known)
+        if len(unknown):
+            self.radii[unknown] = self.nearest_neighbor_distances(unknown) / math.sqrt(2)
+
+    def nearest_neighbor_distances(self, rows):
+        """Distance in meters from each zip in rows to the nearest other zip (0 if there is none)."""
+        lats, lngs = self.zip_index.lats, self.zip_index.lngs
+        nearest, distances = PointGridIndex(lats, lngs).nearest(lats[rows], lngs[rows], exclude=rows)
+        return np.where(nearest >= 0, distances, 0.0)
+
+    def geocode(self, zip_code):
+        """Return (center_lat, center_lng, radius) for zip_code, or None if it is not in the table."""
+        i = self.zip_index.lookup(zip_code)[0]
+        if i < 0:
+            return None
+        return float(self.zip_index.lats[i]), float(self.zip_index.lngs[i]), float(self.radii[i])
@@ -0,0 +1,183 @@
+"""
+Incremental runner for the geocode → enrich → adjust → crawl → dedup → count chain.
+
+Each stage declares the files it reads, the files it writes and the parameters it
+depends on. Its fingerprint is a hash of those parameters and the contents of its
+input files. A stage only reruns when its fingerprint differs from the last
+successful run, or when one of its outputs is missing. Because inputs are hashed by
+content, a stage whose upstream reran but produced identical output is still
+skipped. Changing only MAX_RADIUS reruns adjust. The crawl then reruns too, but
+unchanged circles are answered from the response cache, so only new or resized
+circles cost API calls.
+
+    run()                                       # everything that is out of date
+    run({'MAX_RADIUS': 20000}, until='adjust')  # a quick parameter sweep
+
+File hashes are cached by size and mtime in the state file, so an up-to-date
+pipeline is checked without rereading the large CSVs.
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import GymFinder
+import adjust_search_area
+import get_search_area
+import zip_index
+
+STATE_FILEPATH = 'data/pipeline_state.json'
+INITIAL_COORDINATES_FILEPATH = 'data/initial_coordinates.csv'
+INITIAL_COORDINATES_FILEPATH2 = 'data/initial_coordinates2.csv'
+FINALIZED_COORDINATES_FILEPATH = 'data/finalized_coordinates.csv'
+ORIGINAL_FILEPATH = 'data/jiu_jitsu_gyms.csv'
+DEDUP_FILEPATH = 'data/dedup_jiu_jitsu_gyms.csv'
+GYMS_BY_ZIP_CODE_FILEPATH = 'data/gyms_by_zip_code.csv'
+GYMS_BY_CITY_FILEPATH = 'data/gyms_by_city.csv'
+QUERY_PLAN_FILEPATH = 'data/query_plan.json'
+
+DEFAULT_PARAMETERS = {
+    'POPULATION_MIN': get_search_area.POPULATION_MIN,
+    'RADIUS_MODIFIER': adjust_search_area.RADIUS_MODIFIER,
+    'MAX_RADIUS': adjust_search_area.MAX_RADIUS,
+    'OVERLAP_THRESHOLD': adjust_search_area.OVERLAP_THRESHOLD,
+    'KEYWORDS': GymFinder.KEYWORDS,
+    'USE_QUERY_PLAN': False,
+}
+
+Stage = namedtuple('Stage', ['name', 'inputs', 'outputs', 'parameters', 'run'])
+
+
+def geocode(parameters):
+    city_name_to_zip_codes = GymFinder.zip_index().city_name_to_zip_codes(min_population=parameters['POPULATION_MIN'])
+    _, failed = GymFinder.get_city_name_to_zip_codes_coordinates(city_name_to_zip_codes,
+                                                                 output_filepath=INITIAL_COORDINATES_FILEPATH)
+    if failed:
+        # Not recorded as done, so the next run retries the zips
+        raise RuntimeError(f"geocode: {failed} zip codes failed")
+
+
+def enrich(parameters):
+    import add_state_and_population_info as enrich_stage
+
+    index = zip_index.ZipIndex.load()
+    zip_codes_to_coordinates = enrich_stage.read_zip_code_coordinates(INITIAL_COORDINATES_FILEPATH)
+    zip_codes_to_coordinates = enrich_stage.add_state_info(zip_codes_to_coordinates, index)
+    zip_codes_to_coordinates = enrich_stage.add_population_info(zip_codes_to_coordinates, index)
+    enrich_stage.write_zip_code_coordinates(zip_codes_to_coordinates, INITIAL_COORDINATES_FILEPATH2)
+
+
+def adjust(parameters):
+    columns = adjust_search_area.read_zip_code_coordinates(INITIAL_COORDINATES_FILEPATH2)
+    columns = adjust_search_area.radius_modifier(columns, parameters['RADIUS_MODIFIER'])
+    columns = adjust_search_area.remove_excessive_circles(columns, parameters['MAX_RADIUS'])
+    columns = adjust_search_area.remove_redundant_circles(columns, parameters['OVERLAP_THRESHOLD'])
+    adjust_search_area.write_zip_code_coordinates(columns, FINALIZED_COORDINATES_FILEPATH)
+
+
+def crawl(parameters):
+    from columnar_store import read_coordinates
+    from query_planner import read_plan_queries
+
+    # Opted into with USE_QUERY_PLAN, a query plan from `cli.py queries` replaces the single query built from
+    # KEYWORDS; a plan made from other KEYWORDS is refused
+    queries = read_plan_queries(QUERY_PLAN_FILEPATH, parameters['KEYWORDS']) if parameters['USE_QUERY_PLAN'] else None
+    stats = GymFinder.make_google_places_requests(read_coordinates(FINALIZED_COORDINATES_FILEPATH),
+                                                  output_filepath=ORIGINAL_FILEPATH, keywords=parameters['KEYWORDS'],
+                                                  queries=queries)
+    if stats['errors']:
+        # Not recorded as done, so the next run retries the crawl
+        raise RuntimeError(f"crawl: {stats['errors']} circles failed")
+
+
+def dedup(parameters):
+    GymFinder.remove_duplicates(ORIGINAL_FILEPATH, DEDUP_FILEPATH)
+
+
+def count(parameters):
+    import count_gyms_by_city
+    import count_gyms_by_zip_code
+
+    count_gyms_by_zip_code.main(DEDUP_FILEPATH, GYMS_BY_ZIP_CODE_FILEPATH)
+    count_gyms_by_city.main(DEDUP_FILEPATH, GYMS_BY_CITY_FILEPATH)
+
+
+STAGES = [
+    Stage('geocode', [zip_index.ZIP_TABLE_FILEPATH, zip_index.CITY_TABLE_FILEPATH], [INITIAL_COORDINATES_FILEPATH],
+          ['POPULATION_MIN'], geocode),
+    Stage('enrich', [INITIAL_COORDINATES_FILEPATH, zip_index.ZIP_TABLE_FILEPATH], [INITIAL_COORDINATES_FILEPATH2],
+          [], enrich),
+    Stage('adjust', [INITIAL_COORDINATES_FILEPATH2], [FINALIZED_COORDINATES_FILEPATH],
+          ['RADIUS_MODIFIER', 'MAX_RADIUS', 'OVERLAP_THRESHOLD'], adjust),
+    Stage('crawl', [FINALIZED_COORDINATES_FILEPATH, QUERY_PLAN_FILEPATH], [ORIGINAL_FILEPATH], ['KEYWORDS', 'USE_QUERY_PLAN'],
+          crawl),
+    Stage('dedup', [ORIGINAL_FILEPATH], [DEDUP_FILEPATH], [], dedup),
+    Stage('count', [DEDUP_FILEPATH, zip_index.ZIP_TABLE_FILEPATH, zip_index.CITY_TABLE_FILEPATH],
+          [GYMS_BY_ZIP_CODE_FILEPATH, GYMS_BY_CITY_FILEPATH], [], count),
+]
+
+
+def read_state(filepath=STATE_FILEPATH):
+    if not os.path.isfile(filepath):
+        return {'stages': {}, 'files': {}}
+    with open(filepath, 'r') as state_file:
+        return json.load(state_file)
+
+
+def write_state(state, filepath=STATE_FILEPATH):
+    tmp_filepath = filepath + '.tmp'
+    with open(tmp_filepath, 'w') as state_file:
+        json.dump(state, state_file, indent=2, sort_keys=True)
+    os.replace(tmp_filepath, filepath)
+
+
+def file_hash(filepath, file_hashes):
+    """sha256 of a file's contents ('' if it is missing), reusing file_hashes while size and mtime match."""
+    if not os.path.isfile(filepath):
+        return ''
+    stat = os.stat(filepath)
+    cached = file_hashes.get(filepath)
+    if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b''):
+            sha.update(chunk)
+    file_hashes[filepath] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return sha.hexdigest()
+
+
+def fingerprint(stage, parameters, file_hashes):
+    content = {
+        'parameters': {name: parameters[name] for name in stage.parameters},
+        'inputs': {filepath: file_hash(filepath, file_hashes) for filepath in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def run(parameters=None, until=None, force=(), state_filepath=STATE_FILEPATH):
+    """Run every out-of-date stage in order, stopping after the stage named until. Returns the names of the stages run."""
+    parameters = {**DEFAULT_PARAMETERS, **(parameters or {})}
+    state = read_state(state_filepath)
+    ran = []
+
+    for stage in STAGES:
+        stage_fingerprint = fingerprint(stage, parameters, state['files'])
+        up_to_date = (state['stages'].get(stage.name) == stage_fingerprint
+                      and all(os.path.isfile(filepath) for filepath in stage.outputs))
+        if up_to_date and stage.name not in force:
+            print(f"{stage.name}: up to date")
+        else:
+            print(f"{stage.name}: running")
+            stage.run(parameters)
+            # Recorded only once the stage succeeds, so a failed stage is retried on the next run
+            state['stages'][stage.name] = stage_fingerprint
+            write_state(state, state_filepath)
+            ran.append(stage.name)
+
+        if stage.name == until:
+            break
+
+    write_state(state, state_filepath)
+    return ran
@@ -0,0 +1,205 @@
+"""
+Pipelined Places text-search crawler.
+
+Many circles are crawled at once on an asyncio loop. Blocking HTTP calls run on a
+small thread pool bounded by `max_in_flight`, and the wait for each next_page_token
+is an asyncio.sleep, so one circle waiting on its token never holds up the others.
+Finished circles are handed to a single writer, so the output file is only ever
+touched from one place.
+
+The global request rate starts at `qps` and is tuned by an AIMD rate limiter: it
+climbs while requests succeed and halves on throttling (OVER_QUERY_LIMIT or HTTP
+429; a 5xx is a server fault, not a rate signal). A throttled or failed
+request (OVER_QUERY_LIMIT, 5xx, timeout) is retried with jittered exponential
+backoff, up to MAX_RETRIES times. A page token that is not valid yet
+(INVALID_REQUEST) is retried every quarter of page_token_delay, up to
+PAGE_TOKEN_RETRIES times, so no page is lost to fetching it early. Sustained
+failures trip a circuit breaker that pauses all requests, and stops the crawl if
+the API does not recover.
+
+Requests are spread over an api_keys.KeyPool (a single key string works too). A
+circle that still fails goes back on the queue and is retried on whichever key is
+free by then, up to MAX_ATTEMPTS times, or MAX_QUOTA_RETRIES times for quota errors.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+from api_keys import MAX_QUOTA_RETRIES, QUOTA_STATUSES, KeyQuotaError, QuotaExhausted, as_key_pool
+from api_metrics import instrumented_get
+from http_client import is_transient
+from rate_limiter import AdaptiveRateLimiter, CircuitBreaker, CircuitOpen, backoff_delay
+
+TEXT_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+SUCCESS_STATUSES = ('OK', 'ZERO_RESULTS')
+PAGE_TOKEN_DELAY = 2.0 # seconds before a next_page_token becomes valid
+PAGE_TOKEN_RETRIES = 8
+MAX_RETRIES = 4 # per request, for throttling and transient errors
+MAX_ATTEMPTS = 3 # per circle
+
+
+def crawl_places(circles, api_key, query, write_gyms, qps=10, max_in_flight=8, max_active_circles=32,
+                 base_url=TEXT_SEARCH_URL, page_token_delay=PAGE_TOKEN_DELAY, cache=None, metrics=None, max_qps=float('inf'),
+                 breaker=None):
+    """
+    Crawl every circle and pass its results to write_gyms(circle_id, gyms).
+
+    circles is an iterable of (circle_id, lat, lng, radius). api_key is a key or a KeyPool.
+    cache is an optional ResponseCache; circles found in it are written without any network calls.
+    metrics is an optional ApiMetrics that records every request, cache hit and the pages each circle took.
+    The request rate starts at qps and adapts up to max_qps. breaker is an optional CircuitBreaker.
+    Returns a stats dict with circle, request, retry and gym counts, the final rate and the elapsed time.
+    """
+    return asyncio.run(_crawl(list(circles), as_key_pool(api_key), query, write_gyms, AdaptiveRateLimiter(qps, max_rate=max_qps),
+                              breaker or CircuitBreaker(), max_in_flight, max_active_circles, base_url, page_token_delay,
+                              cache, metrics))
+
+
+async def _crawl(circles, key_pool, query, write_gyms, limiter, breaker, max_in_flight, max_active_circles,
+                 base_url, page_token_delay, cache, metrics):
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    pending = asyncio.Queue()
+    finished = asyncio.Queue(maxsize=max_active_circles)
+    stats = {'circles': 0, 'requests': 0, 'gyms': 0, 'errors': 0, 'retries': 0, 'request_retries': 0,
+             'page_token_retries': 0, 'stopped': False}
+    failures = {} # circle_id -> (errors, quota errors)
+    start = time.monotonic()
+
+    for circle in circles:
+        pending.put_nowait(circle)
+
+    async def fetch(params, key=None):
+        """
+        Send params with key, or with the pool's best key, retrying throttled requests and early page tokens.
+        Returns (data, the key used).
+        """
+        retries = token_retries = 0
+        while True:
+            # Ask again after every wait, so only the single half-open trial goes out
+            while (delay := breaker.wait_time()) > 0:
+                await asyncio.sleep(delay)
+            request_key, key_delay = key_pool.reserve(key)
+            await asyncio.sleep(max(key_delay, limiter.reserve()))
+            try:
+                async with in_flight:
+                    data = await loop.run_in_executor(executor, partial(instrumented_get, base_url, {**params, 'key': request_key},
+                                                                        'textsearch', metrics))
+            except requests.RequestException as exc:
+                if not is_transient(exc):
+                    raise
+                error = exc
+                if getattr(exc.response, 'status_code', None) == 429:
+                    limiter.on_throttle()
+            else:
+                stats['requests'] += 1
+                status = data.get('status')
+                key_pool.record(request_key, status)
+                if status == 'INVALID_REQUEST' and 'pagetoken' in params and token_retries < PAGE_TOKEN_RETRIES:
+                    # The token is not valid yet
+                    token_retries += 1
+                    stats['page_token_retries'] += 1
+                    await asyncio.sleep(page_token_delay / 4)
+                    continue
+                if status not in QUOTA_STATUSES:
+                    limiter.on_success()
+                    breaker.record_success()
+                    return data, request_key
+                error = KeyQuotaError(f"text search returned {status}")
+                limiter.on_throttle()
+
+            breaker.record_failure()
+            if retries == MAX_RETRIES:
+                raise error
+            stats['request_retries'] += 1
+            await asyncio.sleep(backoff_delay(retries))
+            retries += 1
+
+    async def crawl_circle(lat, lng, radius):
+        search_params = {'query': query, 'location': f"{lat},{lng}", 'radius': radius}
+        gyms = cache.get('textsearch', search_params) if cache else None
+        if gyms is not None:
+            if metrics:
+                metrics.record_cache_hit('textsearch')
+            return gyms
+
+        gyms = []
+        params = search_params
+        key = None
+        pages = 0
+        while True:
+            # Later pages stay on the key that started the search
+            data, key = await fetch(params, key)
+            pages += 1
+            if data.get('status') not in SUCCESS_STATUSES:
+                # An error is not an empty result; fail the circle so it is not cached or journaled
+                raise RuntimeError(f"text search returned {data.get('status')}")
+            gyms.extend(data.get('results', []))
+            next_page_token = data.get('next_page_token')
+            if not next_page_token:
+                break
+            # Other circles keep crawling while this token becomes valid
+            await asyncio.sleep(page_token_delay)
+            params = {'pagetoken': next_page_token}
+
+        if metrics:
+            metrics.record_pages('textsearch', pages)
+        if cache:
+            cache.set('textsearch', search_params, gyms)
+        return gyms
+
+    async def worker():
+        while not pending.empty() and not stats['stopped']:
+            circle = pending.get_nowait()
+            circle_id, lat, lng, radius = circle
+            try:
+                gyms = await crawl_circle(lat, lng, radius)
+            except (QuotaExhausted, CircuitOpen) as exc:
+                if not stats['stopped']:
+                    print(f"Stopping the crawl: {exc}")
+                stats['stopped'] = True
+                stats['errors'] += 1
+                return
+            except Exception as exc:
+                errors, quota_errors = failures.get(circle_id, (0, 0))
+                if isinstance(exc, KeyQuotaError):
+                    quota_errors += 1
+                else:
+                    errors += 1
+                failures[circle_id] = errors, quota_errors
+                if errors < MAX_ATTEMPTS and quota_errors < MAX_QUOTA_RETRIES:
+                    stats['retries'] += 1
+                    pending.put_nowait(circle)
+                else:
+                    stats['errors'] += 1
+                    print(f"An error occurred crawling {circle_id}: {exc}")
+                continue
+            await finished.put((circle_id, gyms))
+
+    async def writer():
+        while True:
+            item = await finished.get()
+            if item is None:
+                return
+            circle_id, gyms = item
+            write_gyms(circle_id, gyms)
+            stats['circles'] += 1
+            stats['gyms'] += len(gyms)
+
+    writer_task = asyncio.create_task(writer())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max_active_circles)))
+        # Circles left after the crawl stopped stay uncrawled for a later run
+        stats['errors'] += pending.qsize()
+        await finished.put(None)
+        await writer_task
+    finally:
+        executor.shutdown()
+
+    stats['elapsed'] = time.monotonic() - start
+    stats['qps'] = limiter.rate
+    return stats
@@ -0,0 +1,137 @@
+"""
+Plans a near-minimal set of search circles covering every target zip code.
+
+Replaces the radius_modifier / remove_excessive_circles / remove_redundant_circles
+chain with a greedy set cover. Every zip centroid is a candidate circle center. A
+candidate covers the zips whose whole circle fits inside MAX_RADIUS. The candidate
+covering the most uncovered zips is picked until nothing is left, and its radius is
+shrunk to the zips it actually picked up.
+
+A zip that is itself larger than MAX_RADIUS keeps a circle of its full radius, so
+every zip is still covered. Those zips are reported; crawl them with --adaptive so
+a saturated search is split into smaller circles.
+
+Input: data/initial_coordinates2.csv
+    - Zip_Code,Latitude,Longitude,Radius,City,State,Population
+Output: data/planned_coordinates.csv (+ planned_coordinates.cols columnar table)
+    - Zip_Code,Latitude,Longitude,Radius,City,State,Population
+"""
+import csv
+import heapq
+import os
+
+import numpy as np
+
+import geodesy
+from api_metrics import PRICES
+from columnar_store import COORDINATES_SCHEMA, read_columns, write_coordinates
+from spatial_index import CircleGridIndex
+
+ZIP_CODE_COORDINATES_FILEPATH = 'data/initial_coordinates2.csv'
+FINALIZED_COORDINATES_FILEPATH = 'data/finalized_coordinates.csv'
+PLANNED_COORDINATES_FILEPATH = 'data/planned_coordinates.csv'
+MAX_RADIUS = 15 * 1609.34 # miles to meters
+
+
+def read_zip_code_coordinates(filepath=ZIP_CODE_COORDINATES_FILEPATH):
+    # The typed columnar table written by the previous stage while it is up to date, its CSV otherwise
+    columns = read_columns(filepath, COORDINATES_SCHEMA)
+    return {**columns, 'Population': np.nan_to_num(columns['Population'])}
+
+
+def build_candidates(lats, lngs, radii):
+    """
+    For every zip, the zips a circle centered on it could cover, as (members, reach).
+    reach is the radius needed to fully contain each member. The center always comes first.
+    """
+    index = CircleGridIndex(list(zip(lats, lngs, radii)), cell_size_meters=MAX_RADIUS)
+    candidates = []
+    for center in range(len(lats)):
+        if radii[center] >= MAX_RADIUS:
+            # Too big for any allowed circle; only its own full circle covers it
+            candidates.append((np.array([center]), np.array([radii[center]])))
+            continue
+
+        neighbors = np.fromiter(index.query(lats[center], lngs[center]), dtype=np.int64)
+        reach = geodesy.haversine_distance(lats[center], lngs[center], lats[neighbors], lngs[neighbors]) + radii[neighbors]
+        within = reach <= MAX_RADIUS
+        neighbors, reach = neighbors[within], reach[within]
+
+        sort_key = np.where(neighbors == center, -1.0, reach)
+        order = np.lexsort((neighbors, sort_key))
+        candidates.append((neighbors[order], reach[order]))
+    return candidates
+
+
+def plan_search_circles(columns):
+    """
+    Greedy set cover over zip codes.
+
+    columns are COORDINATES_SCHEMA columns as arrays, one row per zip code.
+    Returns the same columns for the chosen circles; population is the total of the zips each one covers.
+    """
+    lats, lngs, radii, populations = columns['Latitude'], columns['Longitude'], columns['Radius'], columns['Population']
+
+    candidates = build_candidates(lats, lngs, radii)
+
+    # Lazy greedy: gains only shrink, so a popped candidate whose fresh gain still tops the heap is the best
+    covered = np.zeros(len(lats), dtype=bool)
+    heap = [(-len(members), center) for center, (members, _) in enumerate(candidates)]
+    heapq.heapify(heap)
+    centers, planned_radii, planned_populations = [], [], []
+    while heap:
+        negative_gain, center = heapq.heappop(heap)
+        members, reach = candidates[center]
+        newly_covered = ~covered[members]
+        gain = int(newly_covered.sum())
+        if gain == 0:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, center))
+            continue
+
+        covered[members] = True
+        centers.append(center)
+        planned_radii.append(reach[newly_covered].max())
+        planned_populations.append(populations[members[newly_covered]].sum())
+
+    centers = np.array(centers, dtype=np.int64)
+    return {**{name: values[centers] for name, values in columns.items()},
+            'Radius': np.array(planned_radii, dtype='f8'), 'Population': np.array(planned_populations, dtype='f8')}
+
+
+def count_rows(filepath):
+    with open(filepath, 'r', newline='') as csvfile:
+        return sum(1 for _ in csv.DictReader(csvfile))
+
+
+def report_plan(columns, planned):
+    cost_per_call = PRICES['textsearch']
+    num_planned = len(planned['Zip_Code'])
+    print("Number of target zip codes: ", len(columns['Zip_Code']))
+    print("Number of planned circles: ", num_planned)
+    print(f"Estimated cost (one call per circle): ${num_planned * cost_per_call:.2f}")
+    oversized = columns['Zip_Code'][columns['Radius'] >= MAX_RADIUS].tolist()
+    if oversized:
+        print(f"Number of zip codes larger than MAX_RADIUS, kept at their full radius: {len(oversized)} "
+              f"({', '.join(oversized[:10])}{', ...' if len(oversized) > 10 else ''}); crawl with --adaptive to split them")
+    if os.path.isfile(FINALIZED_COORDINATES_FILEPATH):
+        current = count_rows(FINALIZED_COORDINATES_FILEPATH)
+        print("Number of circles from the current pipeline: ", current)
+        print(f"Estimated cost of the current pipeline: ${current * cost_per_call:.2f}")
+        print(f"Estimated savings: ${(current - num_planned) * cost_per_call:.2f}")
+
+
+def write_planned_coordinates(planned, filepath=PLANNED_COORDINATES_FILEPATH):
+    write_coordinates(planned, filepath)
+
+
+def main():
+    columns = read_zip_code_coordinates()
+    planned = plan_search_circles(columns)
+    report_plan(columns, planned)
+    write_planned_coordinates(planned)
+
+
+if __name__ == '__main__':
+    main()
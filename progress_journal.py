@@ -0,0 +1,73 @@
+"""
+Crash-safe progress journal for the long-running crawl stages.
+
+Rows are written to `<output>.partial`. After each batch the partial file is fsynced
+and the finished unit ids (zip codes, circle ids) are appended to `<output>.journal`
+together with the partial file size at that point. On resume the partial file is
+truncated back to the last journaled size, so rows from a batch that was cut off by
+a crash are dropped and the batch is redone, never duplicated. finalize() renames
+the partial file over the real output in one atomic step.
+"""
+import os
+
+
+class ProgressJournal:
+    def __init__(self, output_filepath, resume=False):
+        self.output_filepath = output_filepath
+        self.partial_filepath = output_filepath + '.partial'
+        self.journal_filepath = output_filepath + '.journal'
+        self.completed = set()
+
+        if not resume:
+            for filepath in (self.partial_filepath, self.journal_filepath):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+
+        offset = 0
+        if os.path.exists(self.journal_filepath):
+            journal_size = 0
+            with open(self.journal_filepath, 'rb') as journal_file:
+                for line in journal_file:
+                    if not line.endswith(b'\n'):
+                        break # torn write from a crash
+                    unit, _, line_offset = line.decode().rstrip('\n').rpartition('\t')
+                    self.completed.add(unit)
+                    offset = int(line_offset)
+                    journal_size += len(line)
+            # Drop the torn line, or the next record would be appended onto it
+            with open(self.journal_filepath, 'r+b') as journal_file:
+                journal_file.truncate(journal_size)
+
+        if os.path.exists(self.partial_filepath):
+            with open(self.partial_filepath, 'r+b') as partial_file:
+                partial_file.truncate(offset)
+
+        self.journal_file = open(self.journal_filepath, 'a')
+
+    def is_done(self, unit):
+        return unit in self.completed
+
+    def record(self, units):
+        """Mark units as finished. Call after their rows have been written to partial_filepath."""
+        fd = os.open(self.partial_filepath, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            offset = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+        for unit in units:
+            self.journal_file.write(f"{unit}\t{offset}\n")
+            self.completed.add(unit)
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def finalize(self):
+        """Atomically publish the finished output and drop the journal."""
+        self.journal_file.close()
+        if os.path.exists(self.partial_filepath):
+            os.replace(self.partial_filepath, self.output_filepath)
+        os.remove(self.journal_filepath)
+
+    def close(self):
+        self.journal_file.close()
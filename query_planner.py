@@ -0,0 +1,134 @@
+"""
+Query planning for the Places text search.
+
+The crawl used to send a single query that packs every keyword into one string. Some
+keywords only pull in MMA, boxing or fitness places that cost pages and are
+filtered out later. The planner searches a sample of circles with several query
+formulations: the packed query and each keyword on its own. It then measures for
+each one the paid calls, the unique place ids and how many of them are relevant.
+A place is relevant when its name matches RELEVANT_PATTERN. Names are the only
+signal Text Search gives; its types are just 'gym' for most places.
+
+choose_queries() picks the set greedily. It keeps adding the query with the most
+new relevant place ids per call, and stops once the best one brings fewer than
+MIN_YIELD_PER_CALL. The chosen queries, in order, and the per-query figures are saved
+as the query plan, together with the keywords they were drawn from. The crawl runs
+every circle once per planned query when it is asked to use the plan. A plan made
+from other keywords is refused, so changing KEYWORDS is never silently overridden.
+
+A circle's calls are the pages its results took, so sampled circles already in the
+response cache are measured without paying for them again. The sampled searches
+are cached too, so the full crawl gets them for free.
+"""
+import json
+import random
+import re
+
+from api_metrics import pages_for
+
+SAMPLE_SIZE = 50 # circles
+SAMPLE_SEED = 0
+MIN_YIELD_PER_CALL = 0.5 # new relevant gyms per paid call, for a query to be worth adding
+RELEVANT_PATTERN = re.compile(r'jiu[\s-]?jitsu|\bbjj\b|gracie|grappling|submission|brazilian', re.IGNORECASE)
+
+
+def candidate_queries(packed_query, keywords):
+    """The packed query first, then one query per keyword, without repeats."""
+    queries = [packed_query] + [f"{keyword} gym" for keyword in keywords]
+    return list(dict.fromkeys(queries))
+
+
+def sample_circles(circles, sample_size=SAMPLE_SIZE, seed=SAMPLE_SEED):
+    """A reproducible sample of circles, (circle_id, lat, lng, radius) tuples, taken from them in circle id order."""
+    circles = sorted(circles)
+    return random.Random(seed).sample(circles, min(sample_size, len(circles)))
+
+
+def is_relevant(place):
+    return bool(RELEVANT_PATTERN.search(place.get('name') or ''))
+
+
+def query_yields(results):
+    """
+    results maps query -> {circle_id: places}. Returns query -> {'calls', 'results', 'place_ids', 'relevant'},
+    with place_ids and relevant as sets of place ids.
+    """
+    yields = {}
+    for query, circle_results in results.items():
+        places = [place for circle_places in circle_results.values() for place in circle_places]
+        yields[query] = {
+            'calls': sum(pages_for(len(circle_places)) for circle_places in circle_results.values()),
+            'results': len(places),
+            'place_ids': {place['place_id'] for place in places},
+            'relevant': {place['place_id'] for place in places if is_relevant(place)},
+        }
+    return yields
+
+
+def choose_queries(yields, min_yield_per_call=MIN_YIELD_PER_CALL):
+    """
+    Greedily pick the queries with the most new relevant place ids per call.
+    Returns [(query, new relevant place ids, calls)] in the order they were picked.
+    """
+    chosen = []
+    found = set()
+    remaining = list(yields)
+    while remaining:
+        # Ties go to the earlier candidate, so the packed query wins when nothing beats it
+        best = max(remaining, key=lambda query: len(yields[query]['relevant'] - found) / max(yields[query]['calls'], 1))
+        new_relevant = len(yields[best]['relevant'] - found)
+        if new_relevant / max(yields[best]['calls'], 1) < min_yield_per_call and chosen:
+            break
+        chosen.append((best, new_relevant, yields[best]['calls']))
+        found |= yields[best]['relevant']
+        remaining.remove(best)
+    return chosen
+
+
+def make_plan(yields, chosen, num_circles, keywords):
+    """The query plan: the chosen queries plus the keywords and figures behind them, ready to save as JSON."""
+    all_relevant = set().union(*(query_yield['relevant'] for query_yield in yields.values()))
+    return {
+        'keywords': list(keywords),
+        'queries': [query for query, _, _ in chosen],
+        'sample_circles': num_circles,
+        'relevant_gyms_found': len(set().union(*(yields[query]['relevant'] for query, _, _ in chosen))),
+        'relevant_gyms_available': len(all_relevant),
+        'calls': sum(calls for _, _, calls in chosen),
+        'candidates': [{
+            'query': query,
+            'calls': query_yield['calls'],
+            'results': query_yield['results'],
+            'unique_places': len(query_yield['place_ids']),
+            'relevant': len(query_yield['relevant']),
+            'relevant_share': len(query_yield['relevant']) / max(len(query_yield['place_ids']), 1),
+            'relevant_per_call': len(query_yield['relevant']) / max(query_yield['calls'], 1),
+            'marginal_relevant': next((new_relevant for chosen_query, new_relevant, _ in chosen if chosen_query == query), None),
+        } for query, query_yield in yields.items()],
+    }
+
+
+def print_plan(plan):
+    print(f"Query yields over {plan['sample_circles']} sample circles:")
+    for candidate in plan['candidates']:
+        marginal = f", {candidate['marginal_relevant']} new when added" if candidate['marginal_relevant'] is not None else ''
+        print(f"  {candidate['query']!r}: {candidate['calls']} calls, {candidate['unique_places']} places, "
+              f"{candidate['relevant']} relevant ({candidate['relevant_share']:.0%}), "
+              f"{candidate['relevant_per_call']:.2f} relevant per call{marginal}")
+    print(f"Chosen: {plan['queries']}")
+    print(f"  {plan['relevant_gyms_found']} of {plan['relevant_gyms_available']} relevant gyms for {plan['calls']} calls")
+
+
+def write_plan(plan, filepath):
+    with open(filepath, 'w') as plan_file:
+        json.dump(plan, plan_file, indent=2)
+
+
+def read_plan_queries(filepath, keywords):
+    """The planned queries saved in filepath. Raises ValueError if the plan was made from other keywords."""
+    with open(filepath, 'r') as plan_file:
+        plan = json.load(plan_file)
+    if plan.get('keywords') != list(keywords):
+        raise ValueError(f"{filepath} was planned for the keywords {plan.get('keywords')}, not {list(keywords)}; "
+                         f"rerun `cli.py queries` to plan for them")
+    return plan['queries']
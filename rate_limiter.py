@@ -0,0 +1,138 @@
+"""
+Rate limiting, retry backoff and circuit breaking shared by the Google API clients.
+"""
+import random
+import threading
+import time
+
+BACKOFF_BASE = 0.5 # seconds
+BACKOFF_CAP = 30.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` calls per second with bursts of up to `capacity`.
+
+    reserve() books the next token and returns how many seconds the caller has to wait
+    before using it, so callers can sleep however suits them (time.sleep, asyncio.sleep).
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going negative queues the caller behind the tokens already booked
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds):
+        """Hold back every token for seconds, so callers waiting it out resume at the rate rather than all at once."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate, -seconds * self.rate)
+            self.updated = now
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    TokenBucket whose rate is found by AIMD (additive increase, multiplicative decrease).
+
+    Every success raises the rate by increase / rate, so a clean second of traffic
+    adds `increase` requests per second. Throttling (a quota error or HTTP 429) cuts
+    the rate by `decrease`, at most once per second, since a burst of in-flight requests
+    failing together is one signal, not many. The rate stays within [min_rate, max_rate].
+    """
+
+    def __init__(self, rate, min_rate=1.0, max_rate=float('inf'), increase=2.0, decrease=0.5, capacity=1):
+        super().__init__(rate, capacity)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.last_decrease = float('-inf')
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.last_decrease = now
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds to wait before retry number attempt (0 based): exponential, capped, with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpen(RuntimeError):
+    """The circuit breaker tripped too many times in a row; the API looks down."""
+
+
+class CircuitBreaker:
+    """
+    Stops requests after sustained failures instead of hammering a failing API.
+
+    failure_threshold failures in a row open the circuit. While it is open, wait_time()
+    holds callers back for reset_timeout seconds, then lets a single trial request
+    through. A success closes the circuit and a failure opens it again. After
+    max_trips openings without a success in between, wait_time() raises CircuitOpen.
+    """
+
+    def __init__(self, failure_threshold=20, reset_timeout=30.0, max_trips=5):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def wait_time(self):
+        """Seconds the caller should wait before asking again, or 0 to go ahead."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            if self.trips >= self.max_trips:
+                raise CircuitOpen(f"{self.trips} circuit breaker trips in a row")
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self.trial_in_flight:
+                return min(1.0, self.reset_timeout)
+            self.trial_in_flight = True
+            return 0.0
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                self.failures = 0
+                self.trial_in_flight = False
+                print(f"Circuit breaker open after repeated failures, pausing requests for {self.reset_timeout:.0f}s")
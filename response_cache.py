@@ -0,0 +1,112 @@
+"""
+Persistent on-disk cache for Google API responses.
+
+Entries live in a SQLite file keyed by the endpoint and its normalized request
+parameters (the API key is never part of the key). Entries expire after `ttl`
+seconds and the least recently used ones are evicted once `max_entries` is hit.
+Eviction runs when the cache is opened and then every EVICT_INTERVAL writes, not
+on every write, so the cache can run over max_entries by at most that many.
+
+Parallel shard crawls share one cache file. It runs in WAL mode, so readers never
+wait on a writer, and writers wait up to BUSY_TIMEOUT for each other. A write that
+still fails only costs the cache entry; it is counted and the crawl goes on.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_FILEPATH = 'data/api_cache.sqlite'
+DEFAULT_TTL = 30 * 24 * 60 * 60 # 30 days
+DEFAULT_MAX_ENTRIES = 200000
+EVICT_INTERVAL = 1000 # writes between evictions
+BUSY_TIMEOUT = 60 # seconds to wait for another process's write lock
+IGNORED_PARAMS = {'key'}
+
+
+def normalize_params(endpoint, params):
+    """Stable cache key: parameter names sorted, values stripped and lowercased, API key dropped."""
+    normalized = {name: str(value).strip().lower() for name, value in params.items() if name not in IGNORED_PARAMS}
+    return endpoint + '?' + json.dumps(normalized, sort_keys=True)
+
+
+class ResponseCache:
+    def __init__(self, filepath=DEFAULT_CACHE_FILEPATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filepath, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                          '(key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_created ON responses (created)')
+        self.conn.commit()
+        with self.lock:
+            self.write(self.evict)
+
+    def get(self, endpoint, params):
+        """Return the cached response, or None on a miss or an expired entry."""
+        key = normalize_params(endpoint, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.write(lambda: self.conn.execute('DELETE FROM responses WHERE key = ?', (key,)))
+                self.misses += 1
+                return None
+            self.write(lambda: self.conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key)))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def peek(self, endpoint, params):
+        """Like get, but leaves the hit/miss counters and LRU order alone (for estimates and reports)."""
+        key = normalize_params(endpoint, params)
+        with self.lock:
+            row = self.conn.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, endpoint, params, value):
+        key = normalize_params(endpoint, params)
+        now = time.time()
+        with self.lock:
+            self.write(lambda: self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                                                 (key, json.dumps(value), now, now)))
+            self.writes += 1
+            if self.writes % EVICT_INTERVAL == 0:
+                self.write(self.evict)
+
+    def write(self, statements):
+        """Run statements and commit. Call with the lock held. Returns False if the database stayed locked."""
+        try:
+            statements()
+            self.conn.commit()
+            return True
+        except sqlite3.OperationalError:
+            # Another process kept the write lock past BUSY_TIMEOUT; losing a cache write is harmless
+            self.conn.rollback()
+            self.write_errors += 1
+            return False
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        self.conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        excess = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute('DELETE FROM responses WHERE key IN '
+                              '(SELECT key FROM responses ORDER BY accessed LIMIT ?)', (excess,))
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'write_errors': self.write_errors}
+
+    def close(self):
+        self.conn.close()
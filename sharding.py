@@ -0,0 +1,259 @@
+"""
+Sharded crawl: split the circles into geohash regions, crawl each shard on its own, merge.
+
+partition() groups the circles by the geohash of their centers. Starting from the
+32 one-character cells, any cell expected to cost more than SHARD_GRANULARITY of a
+shard's share of requests is split into its 32 children, so shards can be balanced
+closely while staying made of a few contiguous regions. The cells are laid out in
+geohash order (a Z-order curve, so neighbouring cells stay together) and the
+sequence is cut into num_shards runs of about equal expected requests. A circle's
+expected requests are the pages its cached search took, or the mean of the cached
+circles when it has not been searched yet. The partition only depends on the
+circles, so rerunning it gives the same shards.
+
+write_shards() writes each shard's circles as a coordinates file, plus a
+manifest listing each shard's geohash prefixes, circle count, expected requests,
+output file and the sha256 of its circles file. Re-sharding deletes the outputs of
+every shard whose circles changed, so a stale crawl is never taken as finished. Each shard is then crawled like the full file, on another machine
+with its own secret.txt or locally with run_shards(), and a shard that failed is
+rerun alone with --resume.
+
+merge_shards() combines the shard outputs into the raw gym CSV, rows sorted by
+place id and circle, then deduplicates it. Both steps only see the sorted rows, so
+the result is the same whatever order the shards are listed or finished in.
+"""
+import csv
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+from api_metrics import cached_pages, mean_pages
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz' # in ASCII order, so geohashes sort like the Z-order curve
+GEOHASH_PRECISION = 9 # characters, cells of about 5 m
+SHARD_GRANULARITY = 0.1 # largest cell, as a share of one shard's expected requests
+SHARD_DIR = 'data/shards'
+MANIFEST_FILENAME = 'manifest.json'
+ORIGINAL_FILEPATH = 'data/jiu_jitsu_gyms.csv'
+DEDUP_FILEPATH = 'data/dedup_jiu_jitsu_gyms.csv'
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    num_bits = 0
+    even = True # bits alternate longitude, latitude
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        num_bits += 1
+        if num_bits == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = num_bits = 0
+    return ''.join(chars)
+
+
+def circle_weights(zip_codes_to_coordinates, query, cache=None):
+    """zip_code -> expected Text Search requests for its circle."""
+    pages = cached_pages(zip_codes_to_coordinates, query, cache)
+    default = mean_pages(pages)
+    return {zip_code: default if count is None else count for zip_code, count in pages.items()}
+
+
+def geohash_cells(circles, max_weight, prefix=''):
+    """
+    Yield (prefix, circles) for the cells covering circles, a list of (geohash, weight, zip_code) sharing prefix,
+    in geohash order. A cell heavier than max_weight is split while its circles are in more than one child.
+    """
+    weight = sum(circle_weight for _, circle_weight, _ in circles)
+    if prefix and (weight <= max_weight or len(prefix) == GEOHASH_PRECISION
+                   or all(circle[0] == circles[0][0] for circle in circles)):
+        yield prefix, circles
+        return
+    children = defaultdict(list)
+    for circle in circles:
+        children[circle[0][len(prefix)]].append(circle)
+    for char in sorted(children):
+        yield from geohash_cells(children[char], max_weight, prefix + char)
+
+
+def partition(zip_codes_to_coordinates, num_shards, weights=None):
+    """
+    Split the circles into at most num_shards shards of contiguous geohash cells with about equal weight.
+    weights maps zip_code -> expected requests (1 each by default).
+    Returns a list of {'prefixes', 'zip_codes', 'weight'} dicts.
+    """
+    import numpy as np
+
+    circles = sorted((geohash(lat, lng), weights[zip_code] if weights else 1, zip_code)
+                     for zip_code, ((lat, lng), *_) in zip_codes_to_coordinates.items())
+    if not circles:
+        return []
+    total = sum(weight for _, weight, _ in circles)
+    cells = list(geohash_cells(circles, total / num_shards * SHARD_GRANULARITY))
+
+    # Cut the cell sequence where the running weight comes closest to each shard boundary
+    ends = np.cumsum([sum(weight for _, weight, _ in cell_circles) for _, cell_circles in cells])
+    cuts = [0]
+    for boundary in np.arange(1, num_shards) * total / num_shards:
+        cut = int(np.argmin(np.abs(ends - boundary))) + 1
+        if cuts[-1] < cut < len(cells):
+            cuts.append(cut)
+    cuts.append(len(cells))
+
+    shards = []
+    for start, stop in zip(cuts, cuts[1:]):
+        shard_cells = cells[start:stop]
+        shards.append({
+            'prefixes': [prefix for prefix, _ in shard_cells],
+            'zip_codes': [zip_code for _, cell_circles in shard_cells for _, _, zip_code in cell_circles],
+            'weight': float(sum(weight for _, cell_circles in shard_cells for _, weight, _ in cell_circles)),
+        })
+    return shards
+
+
+def shard_filepaths(shard_dir, shard):
+    """(circles file, gym output file) of shard number shard."""
+    return os.path.join(shard_dir, f"circles_{shard:02d}.csv"), os.path.join(shard_dir, f"gyms_{shard:02d}.csv")
+
+
+def metrics_filepath(shard_dir, shard):
+    """The API call report of shard number shard's crawl."""
+    return os.path.join(shard_dir, f"api_metrics_{shard:02d}.json")
+
+
+def remove_shard_outputs(shard_dir, shard):
+    """Delete shard number shard's crawl output, partial output, journal and API call report."""
+    _, output_filepath = shard_filepaths(shard_dir, shard)
+    for filepath in (output_filepath, output_filepath + '.partial', output_filepath + '.journal',
+                     metrics_filepath(shard_dir, shard)):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def write_shards(zip_codes_to_coordinates, num_shards, shard_dir=SHARD_DIR, weights=None):
+    """
+    Partition the circles and write each shard's coordinates file and the manifest. Returns the manifest.
+    A shard whose circles changed since the last manifest loses its crawl output, so it is crawled afresh.
+    """
+    from columnar_store import coordinates_to_columns, file_sha256, write_coordinates
+
+    os.makedirs(shard_dir, exist_ok=True)
+    try:
+        previous = {entry['shard']: entry.get('circles_sha256') for entry in read_manifest(shard_dir)['shards']}
+    except FileNotFoundError:
+        previous = {}
+    manifest = {'shards': []}
+    for shard, shard_circles in enumerate(partition(zip_codes_to_coordinates, num_shards, weights)):
+        circles_filepath, output_filepath = shard_filepaths(shard_dir, shard)
+        write_coordinates(coordinates_to_columns({zip_code: zip_codes_to_coordinates[zip_code]
+                                                  for zip_code in shard_circles['zip_codes']}), circles_filepath)
+        circles_sha256 = file_sha256(circles_filepath)
+        if previous.pop(shard, None) != circles_sha256:
+            # Outputs left from different circles would pass for this shard's, or be resumed into it
+            remove_shard_outputs(shard_dir, shard)
+        manifest['shards'].append({
+            'shard': shard,
+            'circles_filepath': circles_filepath,
+            'circles_sha256': circles_sha256,
+            'output_filepath': output_filepath,
+            'prefixes': shard_circles['prefixes'],
+            'circles': len(shard_circles['zip_codes']),
+            'expected_requests': round(shard_circles['weight']),
+        })
+    for shard in previous:
+        remove_shard_outputs(shard_dir, shard)
+    with open(os.path.join(shard_dir, MANIFEST_FILENAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def read_manifest(shard_dir=SHARD_DIR):
+    with open(os.path.join(shard_dir, MANIFEST_FILENAME), 'r') as manifest_file:
+        return json.load(manifest_file)
+
+
+def print_manifest(manifest):
+    for entry in manifest['shards']:
+        prefixes = ', '.join(entry['prefixes'][:4]) + (', ...' if len(entry['prefixes']) > 4 else '')
+        print(f"  shard {entry['shard']}: {entry['circles']} circles, about {entry['expected_requests']} requests, "
+              f"geohash {prefixes}")
+
+
+def shard_done(entry):
+    # The crawl only renames its partial file over the output once every circle is in
+    return os.path.exists(entry['output_filepath']) and not os.path.exists(entry['output_filepath'] + '.partial')
+
+
+def run_shards(shard_dir=SHARD_DIR, shards=None):
+    """
+    Crawl shards in parallel, one `cli.py crawl` process each, splitting the keys in secret.txt between them.
+    The processes share the response cache, and each saves its API call report next to its output.
+    shards is a list of shard numbers (default: every shard not finished yet); unfinished ones resume.
+    Returns the shard numbers still unfinished afterwards.
+    """
+    entries = [entry for entry in read_manifest(shard_dir)['shards']
+               if (entry['shard'] in shards if shards is not None else not shard_done(entry))]
+    cli_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    processes = []
+    for index, entry in enumerate(entries):
+        print(f"Crawling shard {entry['shard']} ({entry['circles']} circles)")
+        processes.append(subprocess.Popen([sys.executable, cli_filepath, 'crawl', '--input', entry['circles_filepath'],
+                                           '--output', entry['output_filepath'], '--resume',
+                                           '--key-share', f"{index}/{len(entries)}",
+                                           '--metrics', metrics_filepath(shard_dir, entry['shard'])]))
+    for process in processes:
+        process.wait()
+    failed = [entry['shard'] for entry in entries if not shard_done(entry)]
+    if failed:
+        print(f"Shards {', '.join(map(str, failed))} did not finish, rerun them to resume")
+    return failed
+
+
+def merge_shards(input_filepaths, output_filepath=ORIGINAL_FILEPATH, dedup_filepath=DEDUP_FILEPATH):
+    """
+    Combine shard gym CSVs into output_filepath, sorted by place id and circle, then deduplicate it into
+    dedup_filepath. The shards' order does not change either file.
+    """
+    from deduplicate_gyms import deduplicate
+
+    fieldnames = None
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_filepath))) as tmpdir:
+        db = sqlite3.connect(os.path.join(tmpdir, 'merge.sqlite'))
+        try:
+            db.execute('CREATE TABLE gyms (key TEXT, circle_id TEXT, row TEXT)')
+            for input_filepath in input_filepaths:
+                with open(input_filepath, 'r', newline='') as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    if fieldnames is None:
+                        fieldnames = reader.fieldnames
+                    elif reader.fieldnames != fieldnames:
+                        raise ValueError(f"{input_filepath} has different columns from {input_filepaths[0]}")
+                    db.executemany('INSERT INTO gyms VALUES (?, ?, ?)', (
+                        (row.get('Place_Id') or f"{row['Name']}|{row['Latitude']}|{row['Longitude']}",
+                         row.get('Circle_Id', ''), json.dumps([row[name] for name in fieldnames]))
+                        for row in reader))
+            db.commit()
+
+            with open(output_filepath, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames or [])
+                for _, _, row in db.execute('SELECT DISTINCT key, circle_id, row FROM gyms ORDER BY key, circle_id, row'):
+                    writer.writerow(json.loads(row))
+        finally:
+            db.close()
+
+    print(f"Merged {len(input_filepaths)} shard outputs into {output_filepath}")
+    deduplicate(output_filepath, dedup_filepath)
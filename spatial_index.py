@@ -0,0 +1,190 @@
+"""
+Grid index over search circles.
+
+Circle centers are converted to 3D unit vectors and bucketed into cubic cells
+whose side is the largest radius in the set (as an angle). Any circle that could
+contain another one has its center within that distance, so it always falls in
+one of the 27 cells around the query point and nothing else needs checking.
+
+PointGridIndex applies the same idea to nearest-neighbour queries over large point
+sets (gyms against zip centroids), vectorized with NumPy.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371000
+
+
+def to_unit_vector(lat, lng):
+    lat = math.radians(lat)
+    lng = math.radians(lng)
+    return math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat)
+
+
+class CircleGridIndex:
+    def __init__(self, circles, cell_size_meters=None):
+        """
+        circles is a list of (lat, lng, radius) with radius in meters.
+        cell_size_meters defaults to the largest radius in circles.
+        """
+        self.circles = list(circles)
+        if cell_size_meters is None:
+            cell_size_meters = max((radius for _, _, radius in self.circles), default=0)
+
+        # Chord length <= arc length, so a cell as wide as the arc is always enough.
+        # The small slack keeps float rounding from pushing a neighbour one cell over.
+        self.cell_size = max(cell_size_meters / EARTH_RADIUS_METERS * (1 + 1e-6), 1e-9)
+
+        self.cells = defaultdict(list)
+        for i, (lat, lng, _) in enumerate(self.circles):
+            self.cells[self._cell(lat, lng)].append(i)
+
+    def _cell(self, lat, lng):
+        x, y, z = to_unit_vector(lat, lng)
+        return (math.floor(x / self.cell_size),
+                math.floor(y / self.cell_size),
+                math.floor(z / self.cell_size))
+
+    def query(self, lat, lng):
+        """Return indices of circles whose centers could be within cell_size of (lat, lng)."""
+        cx, cy, cz = self._cell(lat, lng)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    yield from self.cells.get((cx + dx, cy + dy, cz + dz), ())
+
+
+def to_unit_vectors(lats, lngs):
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    return np.column_stack([np.cos(lats) * np.cos(lngs), np.cos(lats) * np.sin(lngs), np.sin(lats)])
+
+
+class PointGridIndex:
+    """
+    Exact nearest point lookups for many queries at once.
+
+    Points are bucketed into grids of growing cell size (cell_size_meters, then 2x,
+    4x, ...). A query takes the best point in its 27 surrounding cells. That point is
+    provably the nearest once its chord distance is within the cell size. Unresolved
+    queries move to the first coarser grid that the distance found so far guarantees
+    will resolve them. Most queries finish on the first grid. The last grid spans the
+    whole sphere, so every query is resolved.
+    """
+    GROWTH = 2
+
+    def __init__(self, lats, lngs, cell_size_meters=5000):
+        self.vectors = to_unit_vectors(lats, lngs)
+        self.cell_size = cell_size_meters / EARTH_RADIUS_METERS
+        self.num_levels = int(math.ceil(math.log(2.0 / self.cell_size, self.GROWTH))) + 1
+        self.grids = []
+
+    def level_for(self, chords):
+        """Coarsest level needed to resolve a query whose best point so far is chords away."""
+        with np.errstate(divide='ignore'):
+            levels = np.ceil(np.log(np.maximum(chords, 1e-300) / self.cell_size) / math.log(self.GROWTH))
+        # No point found yet (inf) gives no bound; those queries just try the next level
+        return np.clip(np.nan_to_num(levels, posinf=0), 0, self.num_levels - 1).astype(np.int64)
+
+    def _grid(self, level):
+        """(cell size, sorted point order, unique cell keys, start of each cell in the order) for a level."""
+        while len(self.grids) <= level:
+            cell_size = min(self.cell_size * self.GROWTH ** len(self.grids), 2.0)
+            keys = self._keys(np.floor(self.vectors / cell_size).astype(np.int64), cell_size)
+            order = np.argsort(keys, kind='stable')
+            unique_keys, starts = np.unique(keys[order], return_index=True)
+            self.grids.append((cell_size, order, unique_keys, np.append(starts, len(order))))
+        return self.grids[level]
+
+    @staticmethod
+    def _keys(cells, cell_size):
+        span = int(math.ceil(2 / cell_size)) + 4 # cell coordinates lie within +-(1 / cell_size + 2)
+        cells = cells + span // 2
+        return (cells[:, 0] * span + cells[:, 1]) * span + cells[:, 2]
+
+    def nearest(self, lats, lngs, max_candidates=4_000_000, exclude=None):
+        """
+        Index of the nearest point to each (lat, lng) and its distance in meters (-1 and inf if there are no points).
+        exclude optionally gives a point index per query to skip, e.g. the query's own point to find its nearest
+        neighbour. Queries are searched in batches of at most max_candidates point comparisons to bound memory.
+        """
+        queries = to_unit_vectors(lats, lngs)
+        exclude = np.full(len(queries), -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        nearest = np.full(len(queries), -1, dtype=np.int64)
+        chords = np.full(len(queries), np.inf)
+        if len(self.vectors) == 0:
+            return nearest, chords
+
+        levels = np.zeros(len(queries), dtype=np.int64)
+        for level in range(self.num_levels):
+            pending = np.flatnonzero(levels == level)
+            if not len(pending):
+                continue
+            cell_size = self._grid(level)[0]
+            # Nearby queries share cells, so sorting them by cell keeps the lookups cache friendly
+            pending = pending[np.argsort(self._keys(np.floor(queries[pending] / cell_size).astype(np.int64), cell_size))]
+            neighbors = self._neighbors(queries[pending], level)
+
+            # Split the queries wherever the running candidate count passes max_candidates
+            totals = np.cumsum(sum(counts for _, counts in neighbors))
+            bounds = np.searchsorted(totals, np.arange(max_candidates, totals[-1], max_candidates), side='right')
+            for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(pending)]])):
+                if start == end:
+                    continue
+                rows = pending[start:end]
+                batch = [(firsts[start:end], counts[start:end]) for firsts, counts in neighbors]
+                nearest[rows], chords[rows] = self._search(queries[rows], level, batch, exclude[rows])
+
+            # The best point so far bounds the distance, so an unresolved query can skip
+            # straight to the first grid whose cells are at least that wide
+            unresolved = pending[~(chords[pending] <= cell_size)]
+            levels[unresolved] = np.maximum(level + 1, self.level_for(chords[unresolved]))
+
+        distances = 2 * np.arcsin(np.minimum(chords / 2, 1.0)) * EARTH_RADIUS_METERS
+        return nearest, distances
+
+    def _neighbors(self, queries, level):
+        """
+        The points around every query as 9 runs, one per (dx, dy) column of the 27 cells.
+        Cells stacked along z have consecutive keys, so each column is one contiguous run
+        of the sorted points. Returns a list of (first point of the run, run length) arrays.
+        """
+        cell_size, _, unique_keys, starts = self._grid(level)
+        cells = np.floor(queries / cell_size).astype(np.int64)
+        neighbors = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._keys(cells + (dx, dy, 0), cell_size)
+                first = starts[np.searchsorted(unique_keys, keys - 1, side='left')]
+                last = starts[np.searchsorted(unique_keys, keys + 1, side='right')]
+                neighbors.append((first, last - first))
+        return neighbors
+
+    def _search(self, queries, level, neighbors, exclude):
+        """Best point other than exclude among the neighbouring cells of each query, as (indices, chord distances)."""
+        order = self._grid(level)[1]
+        best = np.full(len(queries), -1, dtype=np.int64)
+        best_chords = np.full(len(queries), np.inf)
+
+        for firsts, counts in neighbors:
+            if not counts.any():
+                continue
+
+            # Expand each query into one row per point in the run
+            query_rows = np.repeat(np.arange(len(queries)), counts)
+            group_starts = np.repeat(np.cumsum(counts) - counts, counts)
+            candidates = order[np.repeat(firsts, counts) + np.arange(len(query_rows)) - group_starts]
+            candidate_chords = np.linalg.norm(self.vectors[candidates] - queries[query_rows], axis=1)
+            candidate_chords[candidates == exclude[query_rows]] = np.inf
+
+            closest = np.full(len(queries), np.inf)
+            np.minimum.at(closest, query_rows, candidate_chords)
+            is_closest = candidate_chords == closest[query_rows]
+            improved = closest < best_chords
+            winners = query_rows[is_closest]
+            keep = improved[winners]
+            best[winners[keep]] = candidates[is_closest][keep]
+            best_chords[improved] = closest[improved]
+        return best, best_chords
@@ -0,0 +1,103 @@
+"""
+Seeded synthetic datasets for benchmarking the pipeline without real data or API calls.
+
+Zips are grouped into metros scattered over the continental US, as the real data is.
+The zip circle dictionaries, gym CSVs and zip reference tables match the shapes the
+pipeline stages read and write.
+
+    zip_codes_to_coordinates = make_zip_circles(10000)
+    write_gym_csv('gyms.csv', make_gym_rows(10000))
+"""
+import csv
+import math
+import random
+
+from mock_google_api import US_BOUNDS
+
+ZIPS_PER_METRO = 100
+METRO_SPREAD = 15000 # meters, standard deviation of zip centers around their metro
+MIN_RADIUS = 1000
+MAX_RADIUS = 24000
+DUPLICATE_RATE = 0.3 # share of gym rows that repeat an earlier gym (overlapping circles)
+
+
+def offset(lat, lng, north_meters, east_meters):
+    return (lat + north_meters / 111320,
+            lng + east_meters / (111320 * math.cos(math.radians(lat))))
+
+
+def make_metros(count, seed=0):
+    rng = random.Random(seed)
+    (south, west), (north, east) = US_BOUNDS
+    return [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(max(1, count))]
+
+
+def make_zip_circles(count, seed=0):
+    """zip_code -> [(lat, lng), radius, city, state, population] for count zips, like finalized_coordinates.csv."""
+    rng = random.Random(seed)
+    metros = make_metros(count // ZIPS_PER_METRO, seed)
+    zip_codes_to_coordinates = {}
+    for i in range(count):
+        metro = rng.randrange(len(metros))
+        lat, lng = offset(*metros[metro], rng.gauss(0, METRO_SPREAD), rng.gauss(0, METRO_SPREAD))
+        radius = math.exp(rng.uniform(math.log(MIN_RADIUS), math.log(MAX_RADIUS)))
+        zip_codes_to_coordinates[str(10000 + i)] = [(lat, lng), radius, f"City {metro}", f"State {metro % 50}",
+                                                   rng.randint(1000, 60000)]
+    return zip_codes_to_coordinates
+
+
+def make_gym_rows(count, seed=0, duplicate_rate=DUPLICATE_RATE):
+    """
+    count gym rows (Place_Id, Name, Latitude, Longitude) as the crawl writes them. About
+    duplicate_rate of them repeat an earlier gym, some with the same place id and some
+    as a near-identical name a few meters away.
+    """
+    rng = random.Random(seed)
+    metros = make_metros(max(1, count // ZIPS_PER_METRO), seed)
+    rows = []
+    for i in range(count):
+        if rows and rng.random() < duplicate_rate:
+            place_id, name, lat, lng = rng.choice(rows)
+            if rng.random() < 0.5:
+                rows.append((place_id, name, lat, lng))
+            else:
+                rows.append((f"synthetic-{seed}-{i}", name + '.', *offset(lat, lng, rng.uniform(-10, 10), rng.uniform(-10, 10))))
+            continue
+        lat, lng = offset(*rng.choice(metros), rng.gauss(0, METRO_SPREAD), rng.gauss(0, METRO_SPREAD))
+        rows.append((f"synthetic-{seed}-{i}", f"Synthetic Jiu Jitsu Academy {i}", lat, lng))
+    return rows
+
+
+def make_places_gyms(count, seed=0):
+    """count distinct gyms shaped like Places results, for the mock server."""
+    rng = random.Random(seed)
+    return [{'place_id': place_id, 'name': name, 'geometry': {'location': {'lat': lat, 'lng': lng}},
+             'formatted_address': f"{i} Synthetic St", 'rating': round(rng.uniform(3, 5), 1),
+             'user_ratings_total': rng.randint(0, 500), 'types': ['gym', 'health', 'point_of_interest', 'establishment'],
+             'business_status': 'OPERATIONAL'}
+            for i, (place_id, name, lat, lng) in enumerate(make_gym_rows(count, seed, duplicate_rate=0))]
+
+
+def write_gym_csv(filepath, rows):
+    with open(filepath, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Place_Id', 'Name', 'Latitude', 'Longitude'])
+        writer.writerows(rows)
+
+
+def write_zip_tables(zip_codes_to_coordinates, zip_table, city_table):
+    """uszips.csv and uscities.csv shaped reference tables for the given zips."""
+    city_zips = {}
+    with open(zip_table, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['zip', 'lat', 'lng', 'city', 'state_name', 'population', 'density'])
+        for zip_code, ((lat, lng), radius, city, state, population) in zip_codes_to_coordinates.items():
+            density = population / (2 * radius ** 2 / 1e6) # the area offline_geocoder.py would turn back into radius
+            writer.writerow([zip_code, lat, lng, city, state, population, density])
+            city_zips.setdefault((city, state), []).append((zip_code, population))
+
+    with open(city_table, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['city', 'state_name', 'population', 'zips'])
+        for (city, state), zips in city_zips.items():
+            writer.writerow([city, state, sum(population for _, population in zips), ' '.join(zip_code for zip_code, _ in zips)])
@@ -0,0 +1,75 @@
+"""Adaptive quadtree search against the local mock API's clustered gyms."""
+import functools
+import os
+
+import pytest
+
+import GymFinder
+import adaptive_search
+from adaptive_search import adaptive_search as search, crawl_round
+from api_keys import KeyPool
+from mock_google_api import TEXT_SEARCH_PATH, make_clustered_gyms, start_mock_server
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def mock_places():
+    """Start the mock server with the given options; returns (server, text search url)."""
+    def start(**server_options):
+        server, base_url = start_mock_server(**server_options)
+        servers.append(server)
+        return server, base_url + TEXT_SEARCH_PATH
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_dense_clusters_are_split_until_every_gym_is_found(mock_places):
+    # A dense metro of 200 gyms and a sparse town of 15
+    gyms = make_clustered_gyms([(40.7, -74.0, 200, 1500), (41.5, -73.0, 15, 3000)], seed=1)
+    _, url = mock_places(gyms=gyms)
+    circles = [('metro', 40.7, -74.0, 12000.0), ('town', 41.5, -73.0, 12000.0)]
+
+    results, stats = search(circles, crawl_round('test-key', 'jiu jitsu', base_url=url, page_token_delay=0, qps=1000))
+
+    assert stats['failed'] == []
+    assert stats['truncated'] == 0
+    assert stats['saturated'] >= 3
+    assert len(results['town']) == 15
+    assert all(circle_id.startswith('metro.') for circle_id in results if circle_id.count('.') > 1)
+    found = {gym['place_id'] for circle_gyms in results.values() for gym in circle_gyms}
+    assert found == {gym['place_id'] for gym in gyms}
+
+
+def test_failed_circles_are_not_treated_as_empty():
+    def search_round(circles):
+        # 'down' fails every time; the others are saturated once, then empty
+        return {circle_id: [{}] * (60 if '.' not in circle_id else 0)
+                for circle_id, *_ in circles if not circle_id.startswith('down')}
+
+    results, stats = search([('up', 40.0, -74.0, 4000.0), ('down', 40.0, -74.0, 8000.0)], search_round)
+
+    assert [circle[0] for circle in stats['failed']] == ['down']
+    assert 'down' not in results
+    # Taken as an empty search, 'down' would cover the children of 'up' and they would be skipped
+    assert stats['skipped'] == 0
+    assert sorted(results) == ['up', 'up.0', 'up.1', 'up.2', 'up.3']
+
+
+def test_failed_adaptive_crawl_leaves_the_output_unfinished(mock_places, monkeypatch, tmp_path):
+    _, url = mock_places(gyms=make_clustered_gyms([(40.7, -74.0, 30, 2000)]), keys=['good-key'])
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(GymFinder, 'response_cache', lambda: cache)
+    monkeypatch.setattr(GymFinder, 'key_pool', lambda endpoint: KeyPool(['denied-key']))
+    monkeypatch.setattr(adaptive_search, 'crawl_round', functools.partial(crawl_round, base_url=url, page_token_delay=0))
+    output = str(tmp_path / 'gyms.csv')
+
+    stats = GymFinder.make_adaptive_google_places_requests({'10001': ((40.7, -74.0), 20000.0)}, output_filepath=output)
+
+    cache.close()
+    assert stats['errors'] == 1
+    assert not os.path.exists(output)
+    assert os.path.exists(output + '.partial')
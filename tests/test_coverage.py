@@ -0,0 +1,26 @@
+"""Coverage grid behaviour the redundant circle removal depends on."""
+import numpy as np
+
+from coverage import CoverageGrid, remove_covered_circles, unwrap_longitudes
+
+
+def test_circles_across_the_antimeridian_share_cells():
+    # Two 5 km circles 1.4 km apart, one on each side of 180 degrees
+    grid = CoverageGrid([0.0, 0.0], [179.994, -179.9934], [5000.0, 5000.0])
+    assert grid.covered_fraction(0) > 0.8
+    assert grid.union_area() < 1.3 * np.pi * 5000 ** 2
+
+
+def test_antimeridian_matches_the_same_circles_elsewhere():
+    lats = [10.0, 10.01, 10.02]
+    offsets = np.array([-0.02, 0.0, 0.03])
+    radii = [3000.0, 2000.0, 4000.0]
+    crossing = remove_covered_circles(lats, (180.0 + offsets + 180) % 360 - 180, radii, 0.8)
+    inland = remove_covered_circles(lats, -100.0 + offsets, radii, 0.8)
+    assert crossing[0].tolist() == inland[0].tolist()
+    assert abs(crossing[1] - inland[1]) <= 0.02 * inland[1]
+
+
+def test_unwrap_longitudes_keeps_ordinary_longitudes():
+    lngs = np.radians([-120.0, -100.0, -80.0])
+    assert np.allclose(unwrap_longitudes(lngs), lngs)
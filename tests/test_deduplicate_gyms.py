@@ -0,0 +1,56 @@
+"""deduplicate_gyms: exact and near duplicate removal."""
+import csv
+
+import pytest
+
+from deduplicate_gyms import MERGE_DISTANCE, deduplicate
+
+METERS_PER_DEGREE = 111320
+
+
+def gym(place_id, name, lat, lng, circle_id='10001'):
+    return {'Place_Id': place_id, 'Name': name, 'Latitude': lat, 'Longitude': lng, 'Circle_Id': circle_id}
+
+
+@pytest.fixture
+def dedup(tmp_path):
+    """Run deduplicate on rows and return the place ids kept, in order."""
+    def run(rows):
+        input_filepath, output_filepath = tmp_path / 'gyms.csv', tmp_path / 'dedup.csv'
+        with open(input_filepath, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        deduplicate(str(input_filepath), str(output_filepath))
+        with open(output_filepath, 'r', newline='') as csvfile:
+            return [row['Place_Id'] for row in csv.DictReader(csvfile)]
+    return run
+
+
+def test_repeated_place_id_keeps_the_first_row(dedup):
+    rows = [gym('p1', 'Gracie Barra Austin', 30.2672, -97.7431, circle_id)
+            for circle_id in ('78701', '78702', '78703')]
+    rows.append(gym('p2', 'Austin Jiu Jitsu', 30.3, -97.7))
+    assert dedup(rows) == ['p1', 'p2']
+
+
+def test_near_identical_names_within_the_merge_radius_merge(dedup):
+    offset = (MERGE_DISTANCE - 1) / METERS_PER_DEGREE
+    rows = [gym('p1', 'Gracie Barra Austin', 30.2672, -97.7431),
+            gym('p2', 'Gracie Barra - Austin!', 30.2672 + offset, -97.7431),
+            gym('p3', 'gracie barra austn', 30.2672, -97.7431 + offset / 2)]
+    assert dedup(rows) == ['p1']
+
+
+def test_same_name_far_apart_is_kept(dedup):
+    offset = (MERGE_DISTANCE + 1) / METERS_PER_DEGREE
+    rows = [gym('p1', 'Gracie Barra', 30.2672, -97.7431),
+            gym('p2', 'Gracie Barra', 30.2672 + offset, -97.7431),
+            gym('p3', 'Gracie Barra', 32.7767, -96.7970)]
+    assert dedup(rows) == ['p1', 'p2', 'p3']
+
+
+def test_different_gyms_at_the_same_point_are_kept(dedup):
+    rows = [gym('p1', 'Gracie Barra Austin', 30.2672, -97.7431),
+            gym('p2', '10th Planet Austin', 30.2672, -97.7431)]
+    assert dedup(rows) == ['p1', 'p2']
@@ -0,0 +1,80 @@
+"""Geocoding stage against the local mock API: journaling, failures and resume."""
+import csv
+import functools
+import os
+
+import pytest
+
+import GymFinder
+import offline_geocoder
+from api_keys import KeyPool
+from mock_google_api import GEOCODE_PATH, start_mock_server
+from response_cache import ResponseCache
+
+
+class NoOfflineGeocoder:
+    def __init__(self, zip_index):
+        pass
+
+    def geocode(self, zip_code):
+        return None
+
+
+@pytest.fixture
+def mock_api(monkeypatch, tmp_path):
+    """GymFinder's geocoding pointed at the mock server, with a fresh cache and no offline zip table."""
+    def start(**server_options):
+        server, base_url = start_mock_server(**server_options)
+        servers.append(server)
+        monkeypatch.setattr(GymFinder, 'geocode_zip_codes',
+                            functools.partial(GymFinder.geocode_zip_codes, base_url=base_url + GEOCODE_PATH))
+        return server
+
+    servers = []
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(offline_geocoder, 'OfflineGeocoder', NoOfflineGeocoder)
+    monkeypatch.setattr(GymFinder, 'zip_index', lambda: None)
+    monkeypatch.setattr(GymFinder, 'response_cache', lambda: cache)
+    yield start
+    cache.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def read_zip_codes(filepath):
+    with open(filepath, 'r', newline='') as csvfile:
+        return [row['Zip_Code'] for row in csv.DictReader(csvfile)]
+
+
+def test_zero_results_zip_is_skipped_and_the_output_finalized(mock_api, monkeypatch, tmp_path):
+    mock_api()
+    monkeypatch.setattr(GymFinder, 'key_pool', lambda endpoint: KeyPool(['test-key']))
+    output = str(tmp_path / 'coordinates.csv')
+
+    # 'ABCDE' has no results in the mock, like a retired zip the real API answers with ZERO_RESULTS
+    coordinates, failed = GymFinder.get_city_name_to_zip_codes_coordinates({'City': ['10001', 'ABCDE', '10002']},
+                                                                           output_filepath=output)
+    assert failed == 0
+    assert sorted(coordinates) == ['10001', '10002']
+    assert read_zip_codes(output) == ['10001', '10002']
+    assert not os.path.exists(output + '.partial') and not os.path.exists(output + '.journal')
+
+
+def test_failed_zips_keep_the_journal_open_until_resumed(mock_api, monkeypatch, tmp_path):
+    server = mock_api(keys=['good-key'])
+    output = str(tmp_path / 'coordinates.csv')
+
+    # A denied key is a failure, not an answer about the zips
+    monkeypatch.setattr(GymFinder, 'key_pool', lambda endpoint: KeyPool(['bad-key']))
+    monkeypatch.setattr('geocoding_client.backoff_delay', lambda attempt: 0)
+    _, failed = GymFinder.get_city_name_to_zip_codes_coordinates({'City': ['10001', '10002']}, output_filepath=output)
+    assert failed == 2
+    assert not os.path.exists(output) and os.path.exists(output + '.journal')
+
+    monkeypatch.setattr(GymFinder, 'key_pool', lambda endpoint: KeyPool(['good-key']))
+    coordinates, failed = GymFinder.get_city_name_to_zip_codes_coordinates({'City': ['10001', '10002']}, resume=True,
+                                                                           output_filepath=output)
+    assert failed == 0
+    assert read_zip_codes(output) == ['10001', '10002']
+    assert server.key_requests['good-key'] == 2
@@ -0,0 +1,117 @@
+"""Parity of the vectorized geodesy kernels with the scalar math-based helpers they replaced."""
+import math
+import random
+
+import numpy as np
+import pytest
+
+import geodesy
+
+
+# The scalar helpers as they were in GymFinder.py before geodesy.py
+def scalar_distance(coord1, coord2):
+    lat1, lng1 = coord1
+    lat2, lng2 = coord2
+    R = 6371  # kilometers
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def scalar_radius(northeast, southwest):
+    center_lat = (northeast['lat'] + southwest['lat']) / 2
+    center_lng = (northeast['lng'] + southwest['lng']) / 2
+    R = 6371000
+    lat1 = math.radians(center_lat)
+    lon1 = math.radians(center_lng)
+    lat2 = math.radians(northeast['lat'])
+    lon2 = math.radians(northeast['lng'])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def scalar_overlap_area(r1, r2, d):
+    if d >= r1 + r2:
+        return 0
+    if d <= abs(r1 - r2):
+        return math.pi * min(r1, r2) ** 2
+    r1_sq = r1 ** 2
+    r2_sq = r2 ** 2
+    d_sq = d ** 2
+    part1 = r1_sq * math.acos((d_sq + r1_sq - r2_sq) / (2 * d * r1))
+    part2 = r2_sq * math.acos((d_sq + r2_sq - r1_sq) / (2 * d * r2))
+    part3 = 0.5 * math.sqrt((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2))
+    return part1 + part2 - part3
+
+
+def random_points(rng, count):
+    # US-like coordinates plus some far apart pairs
+    return [(rng.uniform(18, 72), rng.uniform(-180, -65), rng.uniform(18, 72), rng.uniform(-180, -65)) for _ in range(count)]
+
+
+def test_haversine_distance_matches_scalar():
+    points = random_points(random.Random(0), 5000)
+    points += [(40.0, -75.0, 40.0, -75.0), (40.0, -75.0, 40.0 + 1e-9, -75.0), (0.0, 0.0, 0.0, 180.0)]
+    lat1, lng1, lat2, lng2 = map(np.array, zip(*points))
+    vectorized = geodesy.haversine_distance(lat1, lng1, lat2, lng2, radius=geodesy.EARTH_RADIUS_KILOMETERS)
+    expected = [scalar_distance((a, b), (c, d)) for a, b, c, d in points]
+    np.testing.assert_allclose(vectorized, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_distance_matrix_matches_scalar():
+    rng = random.Random(1)
+    lats = [rng.uniform(25, 49) for _ in range(40)]
+    lngs = [rng.uniform(-124, -67) for _ in range(40)]
+    matrix = geodesy.distance_matrix(lats, lngs, radius=geodesy.EARTH_RADIUS_KILOMETERS)
+    expected = [[scalar_distance((lat1, lng1), (lat2, lng2)) for lat2, lng2 in zip(lats, lngs)] for lat1, lng1 in zip(lats, lngs)]
+    np.testing.assert_allclose(matrix, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_radii_from_viewports_matches_scalar():
+    rng = random.Random(2)
+    viewports = []
+    for _ in range(2000):
+        lat, lng = rng.uniform(18, 72), rng.uniform(-170, -65)
+        dlat, dlng = rng.uniform(0, 0.5), rng.uniform(0, 0.5)
+        viewports.append(({'lat': lat + dlat, 'lng': lng + dlng}, {'lat': lat - dlat, 'lng': lng - dlng}))
+    radii = geodesy.radii_from_viewports([ne['lat'] for ne, _ in viewports], [ne['lng'] for ne, _ in viewports],
+                                         [sw['lat'] for _, sw in viewports], [sw['lng'] for _, sw in viewports])
+    np.testing.assert_allclose(radii, [scalar_radius(ne, sw) for ne, sw in viewports], rtol=1e-12, atol=1e-9)
+
+
+@pytest.mark.parametrize('r1, r2, d', [
+    (1000, 1000, 0), (1000, 1000, 2000), (1000, 1000, 2000.0001), (1000, 1000, 1999.9999),
+    (500, 1500, 1000), (500, 1500, 999.9999), (500, 1500, 1000.0001), (1500, 500, 1000),
+    (1000, 2000, 1500), (3000, 10, 2995), (1, 1, 1e-6),
+])
+def test_overlap_areas_matches_scalar_at_the_boundaries(r1, r2, d):
+    assert geodesy.overlap_areas(r1, r2, d) == pytest.approx(scalar_overlap_area(r1, r2, d), rel=1e-9, abs=1e-6)
+
+
+def test_overlap_areas_matches_scalar():
+    rng = random.Random(3)
+    cases = [(rng.uniform(100, 20000), rng.uniform(100, 20000), rng.uniform(0, 40000)) for _ in range(5000)]
+    r1, r2, d = map(np.array, zip(*cases))
+    expected = [scalar_overlap_area(*case) for case in cases]
+    np.testing.assert_allclose(geodesy.overlap_areas(r1, r2, d), expected, rtol=1e-9, atol=1e-6)
+
+
+def test_containment_decisions_match_scalar_on_the_boundary():
+    # distance + r1 <= r2 is the test remove_redundant_circles used; circles exactly on the edge, and a hair
+    # either side of it, must be classified the same way by both implementations
+    rng = random.Random(4)
+    for _ in range(2000):
+        lat1, lng1 = rng.uniform(25, 49), rng.uniform(-124, -67)
+        lat2, lng2 = lat1 + rng.uniform(-0.05, 0.05), lng1 + rng.uniform(-0.05, 0.05)
+        distance = scalar_distance((lat1, lng1), (lat2, lng2)) * 1000
+        r1 = rng.uniform(100, 5000)
+        vectorized_distance = float(geodesy.haversine_distance(lat1, lng1, lat2, lng2,
+                                                                radius=geodesy.EARTH_RADIUS_KILOMETERS)) * 1000
+        for r2 in (distance + r1, math.nextafter(distance + r1, 0), math.nextafter(distance + r1, math.inf),
+                   distance + r1 - 1e-6, distance + r1 + 1e-6):
+            assert (vectorized_distance + r1 <= r2) == (distance + r1 <= r2)
@@ -0,0 +1,31 @@
+"""OfflineGeocoder's nearest neighbour radii against a brute force search."""
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+import geodesy
+from offline_geocoder import OfflineGeocoder
+
+
+def test_unknown_areas_use_the_nearest_other_zip():
+    rng = np.random.default_rng(0)
+    lats, lngs = rng.uniform(25, 49, 2000), rng.uniform(-124, -67, 2000)
+    lats[1], lngs[1] = lats[0], lngs[0] # two zips sharing a centroid
+    populations = np.where(rng.random(2000) < 0.2, 0.0, 1000.0)
+    populations[:2] = 0
+    zip_index = SimpleNamespace(lats=lats, lngs=lngs, populations=populations, densities=np.full(2000, 50.0))
+
+    radii = OfflineGeocoder(zip_index).radii
+
+    for i in np.flatnonzero(populations == 0):
+        distances = geodesy.haversine_distance(lats[i], lngs[i], lats, lngs)
+        distances[i] = np.inf
+        assert math.isclose(radii[i], distances.min() / math.sqrt(2), abs_tol=1e-6)
+    assert radii[0] == radii[1] == 0
+
+
+def test_a_lone_zip_gets_no_radius():
+    zip_index = SimpleNamespace(lats=np.array([40.0]), lngs=np.array([-74.0]),
+                                populations=np.zeros(1), densities=np.zeros(1))
+    assert OfflineGeocoder(zip_index).radii.tolist() == [0.0]
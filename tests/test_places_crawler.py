@@ -0,0 +1,25 @@
+"""Places crawler against the local mock API: key pool failover."""
+from api_keys import KeyPool
+from mock_google_api import TEXT_SEARCH_PATH, make_synthetic_gyms, start_mock_server
+from places_crawler import crawl_places
+
+
+def test_crawl_fails_over_from_a_rate_limited_key():
+    gyms = make_synthetic_gyms(300, seed=2, bounds=((40.0, -75.0), (41.0, -74.0)))
+    server, base_url = start_mock_server(gyms=gyms, key_qps={'key-slow': 2})
+    try:
+        circles = [(f"c{i}", 40.05 + 0.1 * (i // 10), -74.95 + 0.1 * (i % 10), 6000.0) for i in range(100)]
+        key_pool = KeyPool(['key-slow', 'key-fast'])
+        written = []
+
+        stats = crawl_places(circles, key_pool, 'jiu jitsu', lambda circle_id, gyms: written.append(circle_id),
+                             qps=200, base_url=base_url + TEXT_SEARCH_PATH, page_token_delay=0)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert stats['errors'] == 0
+    assert sorted(written) == sorted(circle_id for circle_id, *_ in circles)
+    assert server.key_requests['key-slow'] > 0 and server.key_requests['key-fast'] > 0
+    # The slow key really was throttled, and its circles went through on the other key
+    assert key_pool.report()['...slow']['quota_errors'] > 0
@@ -0,0 +1,56 @@
+"""ProgressJournal: a crashed run resumes without duplicate or missing rows."""
+import os
+
+from progress_journal import ProgressJournal
+
+
+def write_rows(journal, units):
+    with open(journal.partial_filepath, 'a') as partial_file:
+        for unit in units:
+            partial_file.write(f"{unit},row\n")
+
+
+def test_resume_after_a_crash_mid_batch(tmp_path):
+    output = str(tmp_path / 'gyms.csv')
+    journal = ProgressJournal(output)
+    write_rows(journal, ['header'])
+    journal.record([])
+    write_rows(journal, ['a', 'b'])
+    journal.record(['a', 'b'])
+    # Crash: c's rows reached the partial file but it was never journaled, and the journal line for d is torn
+    write_rows(journal, ['c'])
+    journal.journal_file.write('d\t9')
+    journal.close()
+
+    journal = ProgressJournal(output, resume=True)
+    assert [unit for unit in 'abcd' if journal.is_done(unit)] == ['a', 'b']
+    with open(journal.partial_filepath, 'r') as partial_file:
+        assert partial_file.read() == 'header,row\na,row\nb,row\n'
+    write_rows(journal, ['c'])
+    journal.record(['c'])
+    journal.close()
+
+    # A second crash must not lose c to the torn line the first one left
+    journal = ProgressJournal(output, resume=True)
+    assert [unit for unit in 'abcd' if journal.is_done(unit)] == ['a', 'b', 'c']
+    write_rows(journal, ['d'])
+    journal.record(['d'])
+    journal.finalize()
+
+    with open(output, 'r') as output_file:
+        assert output_file.read().splitlines() == ['header,row', 'a,row', 'b,row', 'c,row', 'd,row']
+    assert not os.path.exists(output + '.partial')
+    assert not os.path.exists(output + '.journal')
+
+
+def test_a_fresh_run_discards_an_old_partial(tmp_path):
+    output = str(tmp_path / 'gyms.csv')
+    journal = ProgressJournal(output)
+    write_rows(journal, ['a'])
+    journal.record(['a'])
+    journal.close()
+
+    journal = ProgressJournal(output)
+    assert not journal.is_done('a')
+    assert not os.path.exists(journal.partial_filepath)
+    journal.close()
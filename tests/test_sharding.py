@@ -0,0 +1,31 @@
+"""Re-sharding must not leave outputs crawled from other circles looking finished."""
+import os
+
+import sharding
+
+
+def make_circles(count):
+    return {f"{10000 + i}": [(30.0 + i * 0.5, -100.0 + i * 0.5), 5000.0, "Town", "TX", 1000] for i in range(count)}
+
+
+def crawl(entry):
+    with open(entry['output_filepath'], 'w') as output_file:
+        output_file.write('Name\n')
+
+
+def test_resharding_drops_the_outputs_of_changed_shards(tmp_path):
+    shard_dir = str(tmp_path)
+    for entry in sharding.write_shards(make_circles(8), 2, shard_dir)['shards']:
+        crawl(entry)
+    # An interrupted crawl of a third shard from some earlier split
+    _, stale_filepath = sharding.shard_filepaths(shard_dir, 2)
+    for filepath in (stale_filepath + '.partial', stale_filepath + '.journal'):
+        open(filepath, 'w').close()
+
+    # The same circles give the same shards, which keep their outputs
+    manifest = sharding.write_shards(make_circles(8), 2, shard_dir)
+    assert all(sharding.shard_done(entry) for entry in manifest['shards'])
+
+    manifest = sharding.write_shards(make_circles(9), 3, shard_dir)
+    assert not any(sharding.shard_done(entry) for entry in manifest['shards'])
+    assert [name for name in os.listdir(shard_dir) if name.startswith('gyms_')] == []
@@ -0,0 +1,155 @@
+"""
+Zip code reference index shared by the pipeline scripts.
+
+uszips.csv and uscities.csv are each parsed once into NumPy columns and saved to
+data/zip_index.npz; later runs load that file instead of re-reading the CSVs, and
+rebuild it only when a source CSV is newer. City and state names are stored once
+and referenced by integer codes, and each city's zip list is a slice of one flat
+array, so the whole index is a handful of compact arrays.
+
+    index = ZipIndex.load()
+    rows = index.lookup(['10001', '99999'])   # -> array([row, -1])
+    index.state_names[index.state_codes[rows[0]]]
+"""
+import csv
+import os
+
+import numpy as np
+
+ZIP_TABLE_FILEPATH = 'data/uszips.csv'
+CITY_TABLE_FILEPATH = 'data/uscities.csv'
+INDEX_FILEPATH = 'data/zip_index.npz'
+COLUMNS = ['zip_codes', 'lats', 'lngs', 'populations', 'densities', 'city_codes', 'state_codes',
+           'city_names', 'state_names', 'city_table_names', 'city_table_states', 'city_table_populations',
+           'city_zip_offsets', 'city_zip_codes']
+
+
+def zip_code_to_int(zip_code):
+    return int(zip_code) if zip_code.strip().isdigit() else -1
+
+
+def format_zip_code(zip_code):
+    return str(int(zip_code)).zfill(5)
+
+
+def encode(values, names):
+    """Integer codes for values, adding unseen values to names (a dict of name -> code)."""
+    return [names.setdefault(value, len(names)) for value in values]
+
+
+class ZipIndex:
+    def __init__(self, **columns):
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def load(cls, zip_table=ZIP_TABLE_FILEPATH, city_table=CITY_TABLE_FILEPATH, index_filepath=INDEX_FILEPATH):
+        """Load the saved index, building it first if it is missing or older than a source table."""
+        sources = [path for path in (zip_table, city_table) if os.path.isfile(path)]
+        if os.path.isfile(index_filepath) and all(os.path.getmtime(index_filepath) >= os.path.getmtime(path) for path in sources):
+            with np.load(index_filepath, allow_pickle=False) as data:
+                index = cls(**{name: data[name] for name in COLUMNS})
+            if len(index) and len(index.city_table_names):
+                return index
+
+        index = cls.build(zip_table, city_table)
+        np.savez(index_filepath, **{name: getattr(index, name) for name in COLUMNS})
+        return index
+
+    @classmethod
+    def build(cls, zip_table=ZIP_TABLE_FILEPATH, city_table=CITY_TABLE_FILEPATH):
+        """Parse both tables in one pass each. Raises FileNotFoundError when either table is missing."""
+        for path in (zip_table, city_table):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Zip reference table {path} not found (simplemaps uszips.csv / uscities.csv)")
+        city_names = {}
+        state_names = {}
+
+        with open(zip_table, 'r', newline='') as csvfile:
+            rows = [(zip_code_to_int(row['zip']), float(row['lat']), float(row['lng']),
+                     float(row.get('population') or 0), float(row.get('density') or 0),
+                     row.get('city', ''), row.get('state_name', ''))
+                    for row in csv.DictReader(csvfile)]
+        rows.sort()
+        zip_codes, lats, lngs, populations, densities, cities, states = zip(*rows) if rows else [()] * 7
+
+        table_names, table_states, table_populations, offsets, city_zip_codes = [], [], [], [0], []
+        with open(city_table, 'r', newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                table_names.append(row['city'])
+                table_states.append(row.get('state_name', ''))
+                table_populations.append(int(float(row['population'] or 0)))
+                city_zip_codes.extend(int(zip_code) for zip_code in row['zips'].split() if zip_code.isdigit())
+                offsets.append(len(city_zip_codes))
+
+        return cls(
+            zip_codes=np.array(zip_codes, dtype=np.int32),
+            lats=np.array(lats, dtype=np.float64),
+            lngs=np.array(lngs, dtype=np.float64),
+            populations=np.array(populations, dtype=np.float64),
+            densities=np.array(densities, dtype=np.float64),
+            city_codes=np.array(encode(cities, city_names), dtype=np.int32),
+            state_codes=np.array(encode(states, state_names), dtype=np.int32),
+            city_table_names=np.array(encode(table_names, city_names), dtype=np.int32),
+            city_table_states=np.array(encode(table_states, state_names), dtype=np.int32),
+            city_table_populations=np.array(table_populations, dtype=np.int64),
+            city_zip_offsets=np.array(offsets, dtype=np.int64),
+            city_zip_codes=np.array(city_zip_codes, dtype=np.int32),
+            city_names=np.array(list(city_names), dtype=str),
+            state_names=np.array(list(state_names), dtype=str),
+        )
+
+    def __len__(self):
+        return len(self.zip_codes)
+
+    def lookup(self, zip_codes):
+        """Row index of each zip code (strings or ints), -1 where the zip is not in the table."""
+        if isinstance(zip_codes, str):
+            zip_codes = [zip_codes]
+        keys = np.array([zip_code_to_int(zip_code) if isinstance(zip_code, str) else zip_code for zip_code in zip_codes],
+                        dtype=np.int64)
+        if len(self.zip_codes) == 0:
+            return np.full(len(keys), -1)
+        rows = np.minimum(np.searchsorted(self.zip_codes, keys), len(self.zip_codes) - 1)
+        return np.where(self.zip_codes[rows] == keys, rows, -1)
+
+    def zip_code(self, row):
+        return format_zip_code(self.zip_codes[row])
+
+    def city(self, row):
+        return str(self.city_names[self.city_codes[row]])
+
+    def state(self, row):
+        return str(self.state_names[self.state_codes[row]])
+
+    def rows_for_city(self, city, state=None):
+        """Rows of every zip whose city (and state, if given) matches."""
+        mask = self.city_codes == self.name_code(self.city_names, city)
+        if state is not None:
+            mask &= self.state_codes == self.name_code(self.state_names, state)
+        return np.flatnonzero(mask)
+
+    def rows_for_state(self, state):
+        return np.flatnonzero(self.state_codes == self.name_code(self.state_names, state))
+
+    @staticmethod
+    def name_code(names, name):
+        matches = np.flatnonzero(names == name)
+        return matches[0] if len(matches) else -1
+
+    def city_name_to_zip_codes(self, min_population=0, max_population=None):
+        """
+        city name -> zip codes for uscities.csv cities with min_population <= population < max_population.
+        Cities sharing a name across states are merged, as the scripts have always done.
+        """
+        mask = self.city_table_populations >= min_population
+        if max_population is not None:
+            mask &= self.city_table_populations < max_population
+
+        city_name_to_zip_codes = {}
+        for i in np.flatnonzero(mask):
+            city = str(self.city_names[self.city_table_names[i]])
+            zip_codes = [format_zip_code(zip_code)
+                         for zip_code in self.city_zip_codes[self.city_zip_offsets[i]:self.city_zip_offsets[i + 1]]]
+            city_name_to_zip_codes.setdefault(city, []).extend(zip_codes)
+        return city_name_to_zip_codes